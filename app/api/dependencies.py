@@ -1,40 +1,110 @@
-"""Dependency injection for API routes"""
-from functools import lru_cache
-from pathlib import Path
+"""Dependency injection for API routes
+
+Each process (e.g. every ``uvicorn --workers N`` worker) holds one instance
+of each service. State shared between processes lives on disk: the SQLite
+catalogs, job records and upload session files, all of which are safe for
+concurrent writers.
+"""
+import threading
+
 from app.services.csv_handler import CSVHandler
 from app.services.database_service import DatabaseService
 from app.services.llm_service import LLMService
+from app.services.job_manager import JobManager
+from app.services.upload_sessions import UploadSessionManager
+from app.services.query_service import QueryService
+from app.config import settings
 
 
 # Singleton instances
 _csv_handler = None
 _db_service = None
 _llm_service = None
+_job_manager = None
+_upload_sessions = None
+_query_service = None
+# Guards creation, so requests racing on first use share one instance
+_lock = threading.Lock()
 
 
 def get_csv_handler() -> CSVHandler:
     """Get CSV handler singleton"""
     global _csv_handler
-    if _csv_handler is None:
-        upload_dir = Path("uploads")
-        upload_dir.mkdir(exist_ok=True)
-        _csv_handler = CSVHandler(upload_dir=upload_dir)
-    return _csv_handler
+    with _lock:
+        if _csv_handler is None:
+            _csv_handler = CSVHandler(upload_dir=settings.upload_dir)
+        return _csv_handler
 
 
 def get_db_service() -> DatabaseService:
     """Get database service singleton"""
     global _db_service
-    if _db_service is None:
-        db_dir = Path("databases")
-        db_dir.mkdir(exist_ok=True)
-        _db_service = DatabaseService(db_dir=db_dir)
-    return _db_service
+    with _lock:
+        if _db_service is None:
+            _db_service = DatabaseService(db_dir=settings.db_dir)
+        return _db_service
 
 
 def get_llm_service() -> LLMService:
     """Get LLM service singleton"""
     global _llm_service
-    if _llm_service is None:
-        _llm_service = LLMService()
-    return _llm_service
+    with _lock:
+        if _llm_service is None:
+            _llm_service = LLMService()
+        return _llm_service
+
+
+def get_job_manager() -> JobManager:
+    """Get background job manager singleton"""
+    global _job_manager
+    with _lock:
+        if _job_manager is None:
+            _job_manager = JobManager(
+                jobs_dir=settings.jobs_dir,
+                max_workers=settings.job_workers,
+            )
+        return _job_manager
+
+
+def get_upload_sessions() -> UploadSessionManager:
+    """Get chunked upload session manager singleton"""
+    global _upload_sessions
+    with _lock:
+        if _upload_sessions is None:
+            _upload_sessions = UploadSessionManager(sessions_dir=settings.upload_dir / "sessions")
+        return _upload_sessions
+
+
+def get_query_service() -> QueryService:
+    """Get read-only query service singleton"""
+    global _query_service
+    with _lock:
+        if _query_service is None:
+            _query_service = QueryService(
+                max_workers=settings.query_workers,
+                max_connections=settings.query_max_connections,
+                max_databases=settings.query_max_databases,
+                idle_timeout=settings.query_idle_timeout,
+                mmap_size=settings.query_mmap_size,
+                cache_size_kb=settings.query_cache_size_kb,
+                result_cache_bytes=settings.query_result_cache_size,
+                result_cache_ttl=settings.query_result_cache_ttl,
+                timeout=settings.query_timeout,
+                max_steps=settings.query_max_steps,
+                stream_timeout=settings.query_stream_timeout,
+                max_queued=settings.query_max_queued,
+                max_per_database=settings.query_max_per_database,
+                queue_timeout=settings.query_queue_timeout,
+                slow_query_threshold=settings.query_slow_threshold,
+                slow_query_log_size=settings.query_slow_log_size,
+            )
+        return _query_service
+
+
+def shutdown_services():
+    """Stop the services this process created; never creates one"""
+    with _lock:
+        if _job_manager is not None:
+            _job_manager.shutdown()
+        if _query_service is not None:
+            _query_service.shutdown()
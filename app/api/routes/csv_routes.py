@@ -1,53 +1,436 @@
 """Routes for CSV file operations"""
-from fastapi import APIRouter, UploadFile, File, HTTPException
-from app.models import UploadResponse
-from app.services.csv_handler import CSVHandler
+from fastapi import APIRouter, Depends, UploadFile, File, HTTPException, Query, Request, Response
+from fastapi.concurrency import run_in_threadpool
+from app.models import (
+    UploadResponse,
+    JobAcceptedResponse,
+    RowsResponse,
+    FileListResponse,
+    FileSummary,
+    UploadSessionRequest,
+    UploadSessionResponse,
+)
+from app.services.csv_handler import CSVHandler, UploadTooLargeError
+from app.services.ingest import ingest_csv
+from app.services.upload_sessions import UploadSessionManager, UploadSessionError, UploadSessionExpiredError
+from app.services.job_manager import JobManager
+from app.services.compression import (
+    CorruptCompressionError,
+    UnsupportedCompressionError,
+    strip_compression_suffix,
+)
+from app.api.dependencies import get_csv_handler, get_job_manager, get_upload_sessions
+from app.config import settings
 from pathlib import Path
+from typing import Optional, Union
 
 router = APIRouter(prefix="/api", tags=["csv"])
 
-# Initialize CSV handler
-UPLOAD_DIR = Path("uploads")
-UPLOAD_DIR.mkdir(exist_ok=True)
-csv_handler = CSVHandler(upload_dir=UPLOAD_DIR)
 
-
-@router.post("/upload-csv", response_model=UploadResponse)
-async def upload_csv(file: UploadFile = File(...)):
+@router.post("/upload-csv", response_model=Union[UploadResponse, JobAcceptedResponse])
+async def upload_csv(
+    response: Response,
+    file: UploadFile = File(...),
+    async_mode: bool = Query(
+        False,
+        description="Return immediately and profile the file in a background job",
+    ),
+    keep_compressed: Optional[bool] = Query(
+        None,
+        description="Store compressed uploads as-is instead of decompressed",
+    ),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+    job_manager: JobManager = Depends(get_job_manager),
+):
     """
     Upload a CSV file for processing.
     
+    With ``async_mode=true`` the file is only streamed to disk here; parsing
+    and profiling run in the background job pool and the response carries a
+    job ID to poll at ``GET /api/jobs/{job_id}``.
+    
+    Gzip, bzip2 and zstd files (``.csv.gz``, ``.csv.bz2``, ``.csv.zst`` or a
+    matching Content-Encoding on the file part) are decompressed as they stream in.
+    
     Args:
         file: CSV file to upload
-        
+        async_mode: Whether to ingest the file in a background job
+        keep_compressed: Whether to store compressed uploads as-is
+    
     Returns:
-        UploadResponse with file_id, preview data, and metadata
+        UploadResponse with file_id, preview data, and metadata, or
+        JobAcceptedResponse with file_id and job_id in async mode
     """
     try:
         # Validate file type
-        if not file.filename.endswith('.csv'):
+        if not strip_compression_suffix(file.filename).endswith('.csv'):
             raise HTTPException(
                 status_code=400,
                 detail="Only CSV files are supported"
             )
         
-        # Save and process the file
-        result = await csv_handler.save_csv(file)
-        
-        return UploadResponse(
-            success=True,
-            message="CSV file uploaded successfully",
-            file_id=result["file_id"],
-            filename=result["filename"],
-            row_count=result["row_count"],
-            column_count=result["column_count"],
-            columns=result["columns"],
-            preview=result["preview"],
-            column_types=result["column_types"],
+        upload = await csv_handler.receive_upload(file, keep_compressed)
+        return await _ingest(csv_handler, job_manager, upload, async_mode, response)
+    
+    except HTTPException:
+        raise
+    except CorruptCompressionError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except UnsupportedCompressionError as e:
+        raise HTTPException(
+            status_code=415,
+            detail=str(e)
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
         )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error uploading file: {str(e)}"
+        )
+
+
+async def _ingest(
+    csv_handler: CSVHandler,
+    job_manager: JobManager,
+    upload: dict,
+    async_mode: bool,
+    response: Response,
+):
+    """Ingest a received upload now, or in a background job in async mode"""
+    if not async_mode:
+        return _upload_response(await csv_handler.ingest_upload(upload))
+    
+    # Identical content is answered right away, no job needed
+    original = csv_handler.find_ingested(upload["content_hash"])
+    if original:
+        return _upload_response(csv_handler.register_alias(upload, original))
+    
+    job = job_manager.submit(
+        "ingest",
+        ingest_csv,
+        Path(upload["file_path"]),
+        on_success=lambda profile: csv_handler.register_upload(upload, profile),
+        on_failure=lambda error: csv_handler.discard_upload(upload),
+    )
+    response.status_code = 202
+    return JobAcceptedResponse(
+        success=True,
+        message="CSV file accepted for background processing",
+        job_id=job["job_id"],
+        status=job["status"],
+        file_id=upload["file_id"],
+    )
+
+
+@router.post("/uploads", response_model=UploadSessionResponse, status_code=201)
+async def create_upload_session(
+    request: UploadSessionRequest,
+    upload_sessions: UploadSessionManager = Depends(get_upload_sessions),
+):
+    """
+    Start a resumable chunked upload.
+    
+    Send the file in chunks with ``PUT /api/uploads/{session_id}?offset=N``,
+    in any order and over any number of connections, then finalize it.
+    
+    Args:
+        request: File name and total size of the upload
+    
+    Returns:
+        UploadSessionResponse with the session ID
+    """
+    try:
+        if not strip_compression_suffix(request.filename).endswith('.csv'):
+            raise HTTPException(
+                status_code=400,
+                detail="Only CSV files are supported"
+            )
         
+        session = upload_sessions.create(
+            request.filename,
+            request.total_size,
+            request.content_encoding,
+        )
+        return UploadSessionResponse(**session)
+    
+    except HTTPException:
+        raise
+    except UnsupportedCompressionError as e:
+        raise HTTPException(
+            status_code=415,
+            detail=str(e)
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating upload session: {str(e)}"
+        )
+
+
+@router.put("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def upload_chunk(
+    session_id: str,
+    request: Request,
+    offset: int = Query(..., ge=0, description="Byte offset of this chunk in the file"),
+    upload_sessions: UploadSessionManager = Depends(get_upload_sessions),
+):
+    """
+    Upload one chunk of a file; the raw request body is the chunk.
+    
+    A chunk interrupted by a dropped connection is not recorded and can be
+    sent again; chunks already received may be re-sent safely.
+    
+    Args:
+        session_id: ID of the upload session
+        request: Request whose body holds the chunk bytes
+        offset: Byte offset of the chunk
+    
+    Returns:
+        UploadSessionResponse with the byte ranges received so far
+    """
+    try:
+        session = await upload_sessions.receive_chunk(session_id, offset, request.stream())
+        return UploadSessionResponse(**session)
+    
+    except KeyError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload session with ID {session_id} not found"
+        )
+    except UploadSessionExpiredError as e:
+        raise HTTPException(
+            status_code=410,
+            detail=str(e)
+        )
+    except UploadSessionError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error uploading chunk: {str(e)}"
+        )
+
+
+@router.get("/uploads/{session_id}", response_model=UploadSessionResponse)
+async def get_upload_session(
+    session_id: str,
+    upload_sessions: UploadSessionManager = Depends(get_upload_sessions),
+):
+    """
+    Get the byte ranges received so far, e.g. to resume after a failure.
+    
+    Args:
+        session_id: ID of the upload session
+    
+    Returns:
+        UploadSessionResponse with the received ranges
+    """
+    session = upload_sessions.get(session_id)
+    if not session:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload session with ID {session_id} not found"
+        )
+    
+    return UploadSessionResponse(**session)
+
+
+@router.post(
+    "/uploads/{session_id}/finalize",
+    response_model=Union[UploadResponse, JobAcceptedResponse],
+)
+async def finalize_upload_session(
+    session_id: str,
+    response: Response,
+    async_mode: bool = Query(
+        False,
+        description="Return immediately and profile the file in a background job",
+    ),
+    keep_compressed: Optional[bool] = Query(
+        None,
+        description="Store compressed uploads as-is instead of decompressed",
+    ),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+    job_manager: JobManager = Depends(get_job_manager),
+    upload_sessions: UploadSessionManager = Depends(get_upload_sessions),
+):
+    """
+    Finish a chunked upload and ingest it like ``POST /api/upload-csv``.
+    
+    Args:
+        session_id: ID of the upload session
+        async_mode: Whether to ingest the file in a background job
+        keep_compressed: Whether to store compressed uploads as-is
+    
+    Returns:
+        UploadResponse, or JobAcceptedResponse in async mode
+    """
+    try:
+        session = await run_in_threadpool(upload_sessions.finalize, session_id)
+        try:
+            upload = await csv_handler.receive_assembled(session, keep_compressed)
+        except BaseException:
+            await run_in_threadpool(upload_sessions.release, session_id)
+            raise
+        upload_sessions.delete(session_id)
+        return await _ingest(csv_handler, job_manager, upload, async_mode, response)
+    
+    except KeyError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload session with ID {session_id} not found"
+        )
+    except UploadSessionExpiredError as e:
+        raise HTTPException(
+            status_code=410,
+            detail=str(e)
+        )
+    except UploadSessionError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=str(e)
+        )
+    except CorruptCompressionError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except UnsupportedCompressionError as e:
+        raise HTTPException(
+            status_code=415,
+            detail=str(e)
+        )
+    except UploadTooLargeError as e:
+        raise HTTPException(
+            status_code=413,
+            detail=str(e)
+        )
     except Exception as e:
         raise HTTPException(
             status_code=500,
             detail=f"Error uploading file: {str(e)}"
         )
+
+
+@router.delete("/uploads/{session_id}")
+async def delete_upload_session(
+    session_id: str,
+    upload_sessions: UploadSessionManager = Depends(get_upload_sessions),
+):
+    """
+    Abandon a chunked upload and delete the data received.
+    
+    Args:
+        session_id: ID of the upload session
+    
+    Returns:
+        Confirmation message
+    """
+    try:
+        deleted = upload_sessions.delete(session_id)
+    except KeyError:
+        deleted = False
+    if not deleted:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Upload session with ID {session_id} not found"
+        )
+    
+    return {"success": True, "message": "Upload session deleted"}
+
+
+@router.get("/files", response_model=FileListResponse)
+async def list_files(
+    filename: Optional[str] = Query(None, description="Only uploads with this file name"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of uploads"),
+    offset: int = Query(0, ge=0, description="Number of uploads to skip"),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+):
+    """
+    List uploaded CSV files, oldest first.
+    
+    Args:
+        filename: Optional file name filter
+        limit: Maximum number of uploads to return
+        offset: Number of uploads to skip
+    
+    Returns:
+        FileListResponse with one page of uploads and the total count
+    """
+    items, total = csv_handler.list_files(filename, limit, offset)
+    return FileListResponse(
+        items=[FileSummary(**item) for item in items],
+        total=total,
+        limit=limit,
+        offset=offset,
+    )
+
+
+@router.get("/files/{file_id}/rows", response_model=RowsResponse)
+async def get_file_rows(
+    file_id: str,
+    offset: int = Query(0, ge=0, description="First row to return (0-based)"),
+    limit: int = Query(100, ge=1, le=settings.max_page_rows, description="Number of rows"),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+):
+    """
+    Page through the rows of an uploaded CSV.
+    
+    Only the requested rows are parsed, using the byte-offset index built at
+    upload time, so deep pages are as fast as the first one.
+    
+    Args:
+        file_id: ID of the uploaded file
+        offset: First row to return
+        limit: Maximum number of rows to return
+    
+    Returns:
+        RowsResponse with the rows of the page and the total row count
+    """
+    try:
+        result = await run_in_threadpool(csv_handler.get_rows, file_id, offset, limit)
+        if result is None:
+            raise HTTPException(
+                status_code=404,
+                detail=f"File with ID {file_id} not found"
+            )
+        return RowsResponse(**result)
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading rows: {str(e)}"
+        )
+
+
+def _upload_response(result: dict) -> UploadResponse:
+    """Build the upload response from a CSV handler result"""
+    return UploadResponse(
+        success=True,
+        message="CSV file uploaded successfully",
+        file_id=result["file_id"],
+        filename=result["filename"],
+        row_count=result["row_count"],
+        column_count=result["column_count"],
+        columns=result["columns"],
+        preview=result["preview"],
+        column_types=result["column_types"],
+        deduplicated=result["deduplicated"],
+    )
@@ -1,32 +1,67 @@
 """Routes for database creation and management"""
-from fastapi import APIRouter, HTTPException
-from app.models import DatabaseCreationRequest, DatabaseCreationResponse
-from app.services.csv_handler import CSVHandler
-from app.services.database_service import DatabaseService
+import sqlite3
 from pathlib import Path
+from fastapi import APIRouter, Depends, HTTPException, Query, Response
+from fastapi.concurrency import run_in_threadpool
+from app.models import (
+    DatabaseCreationRequest,
+    DatabaseCreationResponse,
+    DatabaseAppendRequest,
+    DatabaseAppendResponse,
+    JobAcceptedResponse,
+    DatabaseInfo,
+    DatabaseListResponse,
+    SlowQueriesResponse,
+)
+from app.services.csv_handler import CSVHandler
+from app.services.database_service import (
+    DatabaseService,
+    DatabaseExistsError,
+    DatabaseNotFoundError,
+    build_database,
+    build_key,
+    append_database,
+)
+from app.services.bulk_loader import split_schema
+from app.services.index_advisor import suggest_indexes
+from app.services.job_manager import JobManager
+from app.services.query_service import QueryService
+from app.api.dependencies import get_csv_handler, get_db_service, get_job_manager, get_query_service
+from typing import Optional, Union
 
 router = APIRouter(prefix="/api", tags=["database"])
 
-# Initialize services
-UPLOAD_DIR = Path("uploads")
-DB_DIR = Path("databases")
-UPLOAD_DIR.mkdir(exist_ok=True)
-DB_DIR.mkdir(exist_ok=True)
-
-csv_handler = CSVHandler(upload_dir=UPLOAD_DIR)
-db_service = DatabaseService(db_dir=DB_DIR)
-
 
-@router.post("/create-database", response_model=DatabaseCreationResponse)
-async def create_database(request: DatabaseCreationRequest):
+@router.post("/create-database", response_model=Union[DatabaseCreationResponse, JobAcceptedResponse])
+async def create_database(
+    request: DatabaseCreationRequest,
+    response: Response,
+    async_mode: bool = Query(
+        False,
+        description="Return immediately and load the database in a background job",
+    ),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+    db_service: DatabaseService = Depends(get_db_service),
+    job_manager: JobManager = Depends(get_job_manager),
+):
     """
     Create a SQLite database using the provided schema and CSV data.
     
+    With ``async_mode=true`` the load runs in the background job pool. The
+    response carries the database ID and a job ID; follow the load at
+    ``GET /api/jobs/{job_id}`` or ``GET /api/jobs/{job_id}/events``.
+    
+    A build with the same CSV content, schema and options as an existing
+    database is answered from that database (``cached`` is true), copying
+    it if a different path was requested, in either mode.
+    
     Args:
         request: DatabaseCreationRequest containing file_id, schema, and optional db_name
-        
+        async_mode: Whether to build the database in a background job
+    
     Returns:
-        DatabaseCreationResponse with database file path and metadata
+        DatabaseCreationResponse with database file path and metadata, or
+        JobAcceptedResponse with database_id and job_id in async mode
     """
     try:
         # Validate that the file exists
@@ -36,29 +71,335 @@ async def create_database(request: DatabaseCreationRequest):
                 status_code=404,
                 detail=f"File with ID {request.file_id} not found"
             )
+        sources = _table_sources(request, csv_handler)
+        
+        if async_mode:
+            key = build_key(
+                csv_info,
+                request.sql_schema,
+                optimize=request.optimize,
+                index_columns=request.index_columns,
+                max_indexes=request.max_indexes,
+                sources=sources,
+                coerce_types=request.coerce_types,
+            )
+            # Identical builds are answered right away, no job needed
+            cached = await run_in_threadpool(db_service.reuse_build, key, request.file_id, request.db_name)
+            if cached:
+                return _database_response(request.file_id, cached)
+            
+            build = db_service.plan_build(request.file_id, request.sql_schema, request.db_name, key, sources)
+            job = job_manager.submit(
+                "build_database",
+                build_database,
+                build,
+                request.sql_schema,
+                csv_info,
+                optimize=request.optimize,
+                index_columns=request.index_columns,
+                max_indexes=request.max_indexes,
+                sources=sources,
+                coerce_types=request.coerce_types,
+                on_success=lambda result: db_service.register_database(build, result),
+                on_failure=lambda error: db_service.discard_build(build),
+            )
+            response.status_code = 202
+            return JobAcceptedResponse(
+                success=True,
+                message="Database build accepted for background processing",
+                job_id=job["job_id"],
+                status=job["status"],
+                file_id=request.file_id,
+                database_id=build["database_id"],
+            )
         
-        # Create database from CSV and schema
-        result = db_service.create_database(
+        # Create database from CSV and schema, off the event loop
+        result = await run_in_threadpool(
+            db_service.create_database,
             file_id=request.file_id,
             csv_info=csv_info,
             schema=request.sql_schema,
             db_name=request.db_name,
+            optimize=request.optimize,
+            index_columns=request.index_columns,
+            max_indexes=request.max_indexes,
+            sources=sources,
+            coerce_types=request.coerce_types,
+        )
+        
+        return _database_response(request.file_id, result)
+    
+    except HTTPException:
+        raise
+    except DatabaseExistsError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=str(e)
         )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error creating database: {str(e)}"
+        )
+
+
+@router.post(
+    "/databases/{database_id}/append",
+    response_model=Union[DatabaseAppendResponse, JobAcceptedResponse],
+)
+async def append_to_database(
+    database_id: str,
+    request: DatabaseAppendRequest,
+    response: Response,
+    async_mode: bool = Query(
+        False,
+        description="Return immediately and load the rows in a background job",
+    ),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+    db_service: DatabaseService = Depends(get_db_service),
+    job_manager: JobManager = Depends(get_job_manager),
+    query_service: QueryService = Depends(get_query_service),
+):
+    """
+    Add the rows of another upload to an existing database.
+    
+    The CSV columns are matched to the table like in a build. All rows go
+    in as one transaction, so a failed append changes nothing. With
+    ``key_columns`` rows whose key already exists update that row instead
+    (an upsert). Statistics are refreshed afterwards, and query results
+    cached for the database are dropped.
+    
+    Args:
+        database_id: ID of the database to extend
+        request: DatabaseAppendRequest with the file_id and optional key_columns
+        async_mode: Whether to load the rows in a background job
+    
+    Returns:
+        DatabaseAppendResponse with the row counts, or JobAcceptedResponse
+        with database_id and job_id in async mode
+    """
+    try:
+        csv_info = csv_handler.get_csv_info(request.file_id)
+        if not csv_info:
+            raise HTTPException(
+                status_code=404,
+                detail=f"File with ID {request.file_id} not found"
+            )
         
-        return DatabaseCreationResponse(
+        if async_mode:
+            database = db_service.prepare_append(database_id)
+            
+            def appended(result: dict) -> dict:
+                query_service.invalidate(database_id, database["database_path"])
+                return db_service.register_append(database_id, request.file_id, result)
+            
+            job = job_manager.submit(
+                "append_database",
+                append_database,
+                database,
+                csv_info,
+                key_columns=request.key_columns,
+                on_success=appended,
+            )
+            response.status_code = 202
+            return JobAcceptedResponse(
+                success=True,
+                message="Append accepted for background processing",
+                job_id=job["job_id"],
+                status=job["status"],
+                file_id=request.file_id,
+                database_id=database_id,
+            )
+        
+        result = await run_in_threadpool(
+            db_service.append_rows,
+            database_id,
+            request.file_id,
+            csv_info,
+            key_columns=request.key_columns,
+        )
+        query_service.invalidate(database_id, result["database_path"])
+        return DatabaseAppendResponse(
             success=True,
-            message="Database created successfully",
-            file_id=request.file_id,
-            database_id=result["database_id"],
-            database_path=result["database_path"],
-            table_name=result["table_name"],
-            row_count=result["row_count"],
+            message="Rows appended successfully",
+            **result,
         )
+    
+    except HTTPException:
+        raise
+    except DatabaseNotFoundError:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Database with ID {database_id} not found"
+        )
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except sqlite3.IntegrityError as e:
+        raise HTTPException(
+            status_code=409,
+            detail=f"Rows conflict with existing data: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error appending to database: {str(e)}"
+        )
+
+
+@router.get("/databases", response_model=DatabaseListResponse)
+async def list_databases(
+    file_id: Optional[str] = Query(None, description="Only databases built from this upload"),
+    limit: int = Query(100, ge=1, le=1000, description="Number of databases"),
+    offset: int = Query(0, ge=0, description="Number of databases to skip"),
+    db_service: DatabaseService = Depends(get_db_service),
+):
+    """
+    List created databases, oldest first.
+    
+    Args:
+        file_id: Optional upload filter
+        limit: Maximum number of databases to return
+        offset: Number of databases to skip
+    
+    Returns:
+        DatabaseListResponse with one page of databases and the total count
+    """
+    items, total = db_service.list_databases(file_id, limit, offset)
+    return DatabaseListResponse(
+        items=[DatabaseInfo(**item) for item in items],
+        total=total,
+        limit=limit,
+        offset=offset,
+    )
+
+
+@router.get("/databases/{database_id}/slow-queries", response_model=SlowQueriesResponse)
+async def get_slow_queries(
+    database_id: str,
+    limit: int = Query(50, ge=1, le=1000, description="Number of entries"),
+    full_scan_only: bool = Query(False, description="Only queries that read a whole table"),
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+    db_service: DatabaseService = Depends(get_db_service),
+    query_service: QueryService = Depends(get_query_service),
+):
+    """
+    Slow queries of a database with their query plans, and the indexes they lack.
+    
+    Queries that spend QUERY_SLOW_THRESHOLD seconds or more in SQLite are
+    kept, newest first, in a ring buffer of QUERY_SLOW_LOG_SIZE entries per
+    database and server process, with their EXPLAIN QUERY PLAN output.
+    Entries whose plan reads a whole table are flagged ``full_scan``. For
+    those tables, the columns the queries filter, join or sort on are
+    checked against the existing indexes and the column profile of the
+    upload, and suggested for indexing.
+    
+    Args:
+        database_id: ID of the database
+        limit: Maximum number of entries to return
+        full_scan_only: Only return entries with a full table scan
+    
+    Returns:
+        SlowQueriesResponse with the entries and index suggestions
+    """
+    try:
+        database = db_service.get_database_info(database_id)
+        if not database or not Path(database["database_path"]).exists():
+            raise HTTPException(
+                status_code=404,
+                detail=f"Database with ID {database_id} not found"
+            )
         
+        entries = query_service.slow_queries(database["database_path"])
+        if full_scan_only:
+            entries = [entry for entry in entries if entry["full_scan"]]
+        
+        tables = database.get("tables") or [
+            {"table_name": database["table_name"], "file_id": database["file_id"]}
+        ]
+        profiles = {}
+        for table in tables:
+            info = csv_handler.get_csv_info(table["file_id"])
+            if info:
+                profiles[table["table_name"].lower()] = info
+        suggestions = await run_in_threadpool(suggest_indexes, database["database_path"], entries, profiles)
+        
+        return SlowQueriesResponse(
+            database_id=database_id,
+            threshold=query_service.slow_log.threshold,
+            entries=entries[:limit],
+            total=len(entries),
+            index_suggestions=suggestions,
+        )
+    
     except HTTPException:
         raise
     except Exception as e:
         raise HTTPException(
             status_code=500,
-            detail=f"Error creating database: {str(e)}"
+            detail=f"Error reading slow queries: {str(e)}"
         )
+
+
+def _table_sources(request: DatabaseCreationRequest, csv_handler: CSVHandler) -> Optional[dict]:
+    """
+    Resolve the uploads of a multi-table build
+    
+    Returns:
+        Table name -> upload metadata, or None for a single-table build
+    
+    Raises:
+        HTTPException: If an upload is missing or the tables are inconsistent
+    """
+    if not request.tables:
+        return None
+    
+    if request.file_id not in {table.file_id for table in request.tables}:
+        raise HTTPException(
+            status_code=400,
+            detail="file_id must be one of the uploads in tables"
+        )
+    names = [table.table_name.lower() for table in request.tables]
+    if len(set(names)) != len(names):
+        raise HTTPException(
+            status_code=400,
+            detail="Each table can be loaded from only one upload"
+        )
+    declared = {name.lower() for name, _ in split_schema(request.sql_schema)[0]}
+    missing = [table.table_name for table in request.tables if table.table_name.lower() not in declared]
+    if missing:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Schema has no CREATE TABLE for: {missing}"
+        )
+    
+    sources = {}
+    for table in request.tables:
+        info = csv_handler.get_csv_info(table.file_id)
+        if not info:
+            raise HTTPException(
+                status_code=404,
+                detail=f"File with ID {table.file_id} not found"
+            )
+        sources[table.table_name] = info
+    return sources
+
+
+def _database_response(file_id: str, result: dict) -> DatabaseCreationResponse:
+    """Build the creation response from a database service result"""
+    return DatabaseCreationResponse(
+        success=True,
+        message="Database created successfully",
+        file_id=file_id,
+        database_id=result["database_id"],
+        database_path=result["database_path"],
+        table_name=result["table_name"],
+        row_count=result["row_count"],
+        optimization=result["optimization"],
+        tables=result.get("tables"),
+        foreign_key_violations=result.get("foreign_key_violations"),
+        invalid_values=result.get("invalid_values"),
+        cached=result["cached"],
+    )
@@ -13,8 +13,21 @@ async def root():
         "version": "0.1.0",
         "endpoints": {
             "upload_csv": "/api/upload-csv",
+            "upload_session": "/api/uploads",
+            "list_files": "/api/files",
+            "file_rows": "/api/files/{file_id}/rows",
             "generate_schema": "/api/generate-schema",
+            "validate_schema": "/api/validate-schema",
             "create_database": "/api/create-database",
+            "list_databases": "/api/databases",
+            "append_database": "/api/databases/{database_id}/append",
+            "slow_queries": "/api/databases/{database_id}/slow-queries",
+            "job_status": "/api/jobs/{job_id}",
+            "job_events": "/api/jobs/{job_id}/events",
+            "execute_query": "/api/query/execute",
+            "stream_query": "/api/query/stream",
+            "table_rows": "/api/query/{database_id}/tables/{table_name}/rows",
+            "query_stats": "/api/query/stats",
             "health": "/health",
         },
     }
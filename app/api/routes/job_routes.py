@@ -0,0 +1,85 @@
+"""Routes for background job status"""
+import json
+import asyncio
+from fastapi import APIRouter, Depends, HTTPException, Request
+from fastapi.responses import StreamingResponse
+from app.models import JobStatusResponse
+from app.services.job_manager import JobManager, COMPLETED, FAILED
+from app.api.dependencies import get_job_manager
+from app.config import settings
+
+router = APIRouter(prefix="/api", tags=["jobs"])
+
+
+@router.get("/jobs/{job_id}", response_model=JobStatusResponse)
+async def get_job(job_id: str, job_manager: JobManager = Depends(get_job_manager)):
+    """
+    Get the status, progress and result of a background job.
+    
+    Args:
+        job_id: ID returned when the job was accepted
+    
+    Returns:
+        JobStatusResponse with the current job record
+    """
+    job = job_manager.get_job(job_id)
+    if not job:
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job with ID {job_id} not found"
+        )
+    
+    return JobStatusResponse(**job)
+
+
+@router.get("/jobs/{job_id}/events")
+async def job_events(
+    job_id: str,
+    request: Request,
+    job_manager: JobManager = Depends(get_job_manager),
+):
+    """
+    Stream the progress of a background job as server-sent events.
+    
+    A ``progress`` event carrying the job record is sent whenever the record
+    changes, then one ``completed`` or ``failed`` event, after which the
+    stream ends.
+    
+    Args:
+        job_id: ID returned when the job was accepted
+    
+    Returns:
+        text/event-stream response
+    """
+    if not job_manager.get_job(job_id):
+        raise HTTPException(
+            status_code=404,
+            detail=f"Job with ID {job_id} not found"
+        )
+    
+    async def events():
+        last_update = None
+        while True:
+            job = job_manager.get_job(job_id)
+            if job is None:
+                return
+            if job["status"] in (COMPLETED, FAILED):
+                yield _event(job["status"], job)
+                return
+            if job["updated_at"] != last_update:
+                last_update = job["updated_at"]
+                yield _event("progress", job)
+            if await request.is_disconnected():
+                return
+            await asyncio.sleep(settings.job_event_interval)
+    
+    return StreamingResponse(
+        events(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+def _event(name: str, job: dict) -> str:
+    """Format one server-sent event"""
+    return f"event: {name}\ndata: {json.dumps(JobStatusResponse(**job).model_dump())}\n\n"
@@ -0,0 +1,303 @@
+"""Routes for querying created databases"""
+import asyncio
+import sqlite3
+from contextlib import suppress
+from pathlib import Path
+from typing import Any, AsyncIterator, Awaitable, Optional, Union
+from fastapi import APIRouter, Depends, HTTPException, Query, Request
+from fastapi.responses import StreamingResponse
+from app.models import QueryRequest, QueryResponse, QueryStreamRequest, TableRowsResponse
+from app.services.database_service import DatabaseService
+from app.services.admission import DatabaseBusyError, QueryQueueFullError
+from app.services.query_service import (
+    QueryService,
+    QueryInterruptedError,
+    TIMEOUT,
+    STEP_LIMIT,
+    decode_cursor,
+)
+from app.services.result_formats import MEDIA_TYPES, UnsupportedFormatError, get_encoder
+from app.api.dependencies import get_db_service, get_query_service
+from app.config import settings
+
+router = APIRouter(prefix="/api/query", tags=["query"])
+
+
+@router.post("/execute", response_model=QueryResponse)
+async def execute_query(
+    request: QueryRequest,
+    http_request: Request,
+    db_service: DatabaseService = Depends(get_db_service),
+    query_service: QueryService = Depends(get_query_service),
+):
+    """
+    Run a read-only SQL statement against a created database.
+    
+    Connections are opened read-only and pooled per database, and the
+    statement runs on the query thread pool, so the event loop is never
+    blocked. Statements that would write, ATTACH other files or change
+    connection settings are refused. Results are cached per database
+    version; a repeated query is answered from memory (``cached`` is true).
+    
+    Queries are stopped when they exceed their time or step budget, and
+    cancelled when the client disconnects. Under overload they are refused
+    with 429 (too many on one database) or 503 (server at capacity).
+    
+    Args:
+        request: QueryRequest with database_id, query, optional params,
+            max_rows and timeout
+    
+    Returns:
+        QueryResponse with the columns, up to max_rows rows and the execution time
+    """
+    try:
+        if request.max_rows > settings.query_max_rows:
+            raise HTTPException(
+                status_code=400,
+                detail=f"max_rows cannot exceed {settings.query_max_rows}"
+            )
+        database = _get_database(db_service, request.database_id)
+        
+        result = await _unless_disconnected(http_request, query_service.run(
+            database["database_path"],
+            request.query,
+            request.params,
+            request.max_rows,
+            database_id=request.database_id,
+            version=database.get("version", 0),
+            budget=query_service.budget(request.timeout),
+        ))
+        return QueryResponse(
+            success=True,
+            database_id=request.database_id,
+            **result,
+        )
+    
+    except HTTPException:
+        raise
+    except (DatabaseBusyError, QueryQueueFullError, QueryInterruptedError) as e:
+        raise _refusal(e)
+    except sqlite3.Error as e:
+        # Invalid SQL, several statements, writes and refused operations
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query failed: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error executing query: {str(e)}"
+        )
+
+
+@router.post("/stream")
+async def stream_query(
+    request: QueryStreamRequest,
+    db_service: DatabaseService = Depends(get_db_service),
+    query_service: QueryService = Depends(get_query_service),
+):
+    """
+    Stream every row of a read-only SQL statement as NDJSON, CSV or Arrow IPC.
+    
+    Rows are read from the SQLite cursor in ``batch_size`` batches and
+    encoded as they are read, so exports of any size use constant memory.
+    There is no row limit. Errors in the statement are reported before
+    streaming starts. A stream holds its admission slot until it ends and
+    is stopped when the client disconnects; time spent in SQLite is
+    limited by QUERY_STREAM_TIMEOUT.
+    
+    The ``arrow`` format needs pyarrow (the ``arrow`` extra); without it
+    the request is refused with 406.
+    
+    Args:
+        request: QueryStreamRequest with database_id, query, optional params,
+            format and batch_size
+    
+    Returns:
+        StreamingResponse with the encoded rows
+    """
+    try:
+        encoder = get_encoder(request.format)
+        database = _get_database(db_service, request.database_id)
+        chunks = query_service.stream(
+            database["database_path"],
+            request.query,
+            encoder,
+            request.params,
+            request.batch_size or settings.query_stream_batch_size,
+        )
+        try:
+            header = await chunks.__anext__()
+        except BaseException:
+            await chunks.aclose()
+            raise
+    
+    except HTTPException:
+        raise
+    except UnsupportedFormatError as e:
+        raise HTTPException(
+            status_code=406,
+            detail=str(e)
+        )
+    except (DatabaseBusyError, QueryQueueFullError, QueryInterruptedError) as e:
+        raise _refusal(e)
+    except sqlite3.Error as e:
+        raise HTTPException(
+            status_code=400,
+            detail=f"Query failed: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error executing query: {str(e)}"
+        )
+    
+    return StreamingResponse(
+        _after(header, chunks),
+        media_type=MEDIA_TYPES[request.format],
+    )
+
+
+@router.get("/{database_id}/tables/{table_name}/rows", response_model=TableRowsResponse)
+async def get_table_rows(
+    database_id: str,
+    table_name: str,
+    http_request: Request,
+    limit: int = Query(100, ge=1, le=settings.query_max_rows, description="Number of rows"),
+    cursor: Optional[str] = Query(None, description="next_cursor of the previous page"),
+    db_service: DatabaseService = Depends(get_db_service),
+    query_service: QueryService = Depends(get_query_service),
+):
+    """
+    Page through the rows of a table in rowid order.
+    
+    Pages are addressed by cursor tokens holding the last rowid read
+    (keyset pagination), so every page costs one index seek, however far
+    into the table it is.
+    
+    Args:
+        database_id: ID of the database
+        table_name: Table to read
+        limit: Maximum number of rows to return
+        cursor: Token returned as next_cursor by the previous page
+    
+    Returns:
+        TableRowsResponse with the rows and the cursor of the next page
+    """
+    try:
+        after = decode_cursor(cursor, table_name) if cursor else None
+        database = _get_database(db_service, database_id)
+        result = await _unless_disconnected(
+            http_request,
+            query_service.run_page(database["database_path"], table_name, after, limit),
+        )
+        return TableRowsResponse(
+            database_id=database_id,
+            table_name=table_name,
+            **result,
+        )
+    
+    except HTTPException:
+        raise
+    except (DatabaseBusyError, QueryQueueFullError, QueryInterruptedError) as e:
+        raise _refusal(e)
+    except ValueError as e:
+        raise HTTPException(
+            status_code=400,
+            detail=str(e)
+        )
+    except sqlite3.Error as e:
+        # Unknown table, or a WITHOUT ROWID table
+        raise HTTPException(
+            status_code=400,
+            detail=f"Cannot page table {table_name}: {str(e)}"
+        )
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error reading rows: {str(e)}"
+        )
+
+
+@router.get("/stats")
+async def query_stats(query_service: QueryService = Depends(get_query_service)):
+    """
+    Result cache counters, connections and admission state of this process.
+    
+    Returns:
+        Dictionary with "cache" (hits, misses, hit_ratio, evictions,
+        entries, bytes, max_bytes), "connections" (open_databases,
+        idle_connections) and "admission" (active, queued, rejected)
+    """
+    return query_service.stats()
+
+
+def _get_database(db_service: DatabaseService, database_id: str) -> dict:
+    """
+    Catalog record of a database whose file exists
+    
+    Raises:
+        HTTPException: 404 if the database is unknown or its file is gone
+    """
+    database = db_service.get_database_info(database_id)
+    if not database or not Path(database["database_path"]).exists():
+        raise HTTPException(
+            status_code=404,
+            detail=f"Database with ID {database_id} not found"
+        )
+    return database
+
+
+async def _after(first: bytes, rest: AsyncIterator[bytes]) -> AsyncIterator[bytes]:
+    """Send a chunk already read, then the rest; the rest is closed when sending stops"""
+    try:
+        yield first
+        async for chunk in rest:
+            yield chunk
+    finally:
+        await rest.aclose()
+
+
+def _refusal(e: Union[DatabaseBusyError, QueryQueueFullError, QueryInterruptedError]) -> HTTPException:
+    """HTTP error for a query that was not admitted or did not finish"""
+    if isinstance(e, DatabaseBusyError):
+        return HTTPException(status_code=429, detail=str(e), headers={"Retry-After": "1"})
+    if isinstance(e, QueryQueueFullError):
+        return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+    if e.reason == TIMEOUT:
+        return HTTPException(status_code=504, detail=str(e))
+    if e.reason == STEP_LIMIT:
+        return HTTPException(status_code=400, detail=str(e))
+    # Client disconnects are answered by _unless_disconnected; a query
+    # cancelled otherwise (e.g. the server shutting down) may be retried
+    return HTTPException(status_code=503, detail=str(e), headers={"Retry-After": "1"})
+
+
+async def _unless_disconnected(request: Request, work: Awaitable[Any]) -> Any:
+    """
+    Await work, cancelling it if the client disconnects first
+    
+    Raises:
+        HTTPException: 499 if the client went away (nobody receives it)
+    """
+    task = asyncio.ensure_future(work)
+    watcher = asyncio.ensure_future(_disconnected(request))
+    try:
+        await asyncio.wait({task, watcher}, return_when=asyncio.FIRST_COMPLETED)
+    finally:
+        watcher.cancel()
+        if not task.done():
+            task.cancel()
+            with suppress(asyncio.CancelledError):
+                await task
+    if task.cancelled():
+        raise HTTPException(status_code=499, detail="Client closed the request")
+    return task.result()
+
+
+async def _disconnected(request: Request):
+    """Return once the client has disconnected"""
+    while True:
+        message = await request.receive()
+        if message["type"] == "http.disconnect":
+            return
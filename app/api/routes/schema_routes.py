@@ -1,35 +1,41 @@
 """Routes for database schema generation"""
-from fastapi import APIRouter, HTTPException
-from app.models import SchemaGenerationRequest, SchemaGenerationResponse
+from fastapi import APIRouter, Depends, HTTPException
+from fastapi.concurrency import run_in_threadpool
+from app.models import (
+    SchemaGenerationRequest,
+    SchemaGenerationResponse,
+    SchemaValidationRequest,
+    SchemaValidationResponse,
+)
 from app.services.csv_handler import CSVHandler
 from app.services.database_service import DatabaseService
 from app.services.llm_service import LLMService
-from pathlib import Path
+from app.services.schema_validator import validate_schema
+from app.api.dependencies import get_csv_handler, get_db_service, get_llm_service
 
 router = APIRouter(prefix="/api", tags=["schema"])
 
-# Initialize services
-UPLOAD_DIR = Path("uploads")
-DB_DIR = Path("databases")
-UPLOAD_DIR.mkdir(exist_ok=True)
-DB_DIR.mkdir(exist_ok=True)
-
-csv_handler = CSVHandler(upload_dir=UPLOAD_DIR)
-db_service = DatabaseService(db_dir=DB_DIR)
-llm_service = LLMService()
-
 
 @router.post("/generate-schema", response_model=SchemaGenerationResponse)
-async def generate_schema(request: SchemaGenerationRequest):
+async def generate_schema(
+    request: SchemaGenerationRequest,
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+    db_service: DatabaseService = Depends(get_db_service),
+    llm_service: LLMService = Depends(get_llm_service),
+):
     """
     Generate a database schema based on the uploaded CSV.
     
     This endpoint calls an external LLM service to generate an intelligent schema
     based on the CSV structure and sample data.
     
+    With ``validate`` the schema is also dry-run against a sample of the
+    upload (see ``POST /api/validate-schema``) and the report is returned
+    as ``validation``.
+    
     Args:
         request: SchemaGenerationRequest containing file_id and optional pre-generated schema
-        
+    
     Returns:
         SchemaGenerationResponse with the generated schema
     """
@@ -60,13 +66,18 @@ async def generate_schema(request: SchemaGenerationRequest):
                 print(f"LLM service error: {llm_error}. Using fallback schema generation.")
                 schema = db_service.generate_basic_schema(csv_info)
         
+        validation = None
+        if request.validate_schema:
+            validation = await run_in_threadpool(validate_schema, schema, csv_info)
+        
         return SchemaGenerationResponse(
             success=True,
             message="Database schema generated successfully",
             file_id=request.file_id,
             sql_schema=schema,
+            validation=validation,
         )
-        
+    
     except HTTPException:
         raise
     except Exception as e:
@@ -74,3 +85,53 @@ async def generate_schema(request: SchemaGenerationRequest):
             status_code=500,
             detail=f"Error generating schema: {str(e)}"
         )
+
+
+@router.post("/validate-schema", response_model=SchemaValidationResponse)
+async def validate_schema_for_upload(
+    request: SchemaValidationRequest,
+    csv_handler: CSVHandler = Depends(get_csv_handler),
+):
+    """
+    Dry-run a schema against a sample of the uploaded CSV.
+    
+    The schema is applied to an in-memory database and the stored preview
+    rows plus a sample streamed from the file are inserted. Column
+    mismatches, values that do not fit their declared type and constraint
+    violations are reported without building the database. A problem in
+    the schema is reported, not raised.
+    
+    Args:
+        request: SchemaValidationRequest with file_id, the schema and an optional table
+    
+    Returns:
+        SchemaValidationResponse with the validation report
+    """
+    try:
+        csv_info = csv_handler.get_csv_info(request.file_id)
+        if not csv_info:
+            raise HTTPException(
+                status_code=404,
+                detail=f"File with ID {request.file_id} not found"
+            )
+        
+        validation = await run_in_threadpool(
+            validate_schema,
+            request.sql_schema,
+            csv_info,
+            table_name=request.table_name,
+        )
+        return SchemaValidationResponse(
+            success=True,
+            message="Schema is valid" if validation["valid"] else "Schema does not fit the data",
+            file_id=request.file_id,
+            validation=validation,
+        )
+    
+    except HTTPException:
+        raise
+    except Exception as e:
+        raise HTTPException(
+            status_code=500,
+            detail=f"Error validating schema: {str(e)}"
+        )
@@ -1,6 +1,7 @@
 """Configuration settings for the application"""
 from pydantic_settings import BaseSettings, SettingsConfigDict
 from pathlib import Path
+import os
 
 
 class Settings(BaseSettings):
@@ -15,11 +16,65 @@ class Settings(BaseSettings):
     # Directory settings
     upload_dir: Path = Path("uploads")
     db_dir: Path = Path("databases")
+    jobs_dir: Path = Path("jobs")
     
     # File settings
     max_upload_size: int = 100 * 1024 * 1024  # 100MB
+    upload_chunk_size: int = 1024 * 1024  # 1MB read/write block for streaming uploads
+    max_content_size: int = 1024 * 1024 * 1024  # 1GB limit on decompressed CSV size
+    store_compressed_uploads: bool = False  # Keep .gz/.bz2/.zst uploads compressed on disk
+    upload_session_ttl: int = 24 * 60 * 60  # Seconds an idle chunked upload session is kept
+    profile_chunk_size: int = 50_000  # Rows parsed per chunk when profiling a CSV
+    row_index_stride: int = 1024  # Rows between byte offsets in the paging index
+    max_page_rows: int = 10_000  # Largest page served by GET /api/files/{file_id}/rows
+    
+    # Parallel parsing settings
+    # Parse and load pools are also started inside job workers, where each
+    # gets PARSE_WORKERS // JOB_WORKERS (LOAD_WORKERS // JOB_WORKERS) processes;
+    # a share of 1 runs without a pool, so concurrent jobs share one budget
+    parse_workers: int = os.cpu_count() or 1  # Processes parsing one large CSV
+    parallel_parse_min_size: int = 256 * 1024 * 1024  # Files from 256MB are parsed in parallel
+    parallel_parse_part_size: int = 64 * 1024 * 1024  # 64MB record-aligned range per task
     allowed_extensions: list = [".csv"]
     
+    # Database build settings
+    load_chunk_size: int = 100_000  # Rows read and inserted per executemany batch
+    load_transaction_rows: int = 1_000_000  # Rows per load transaction
+    load_page_size: int = 8192  # Page size of created databases
+    load_cache_size_kb: int = 64 * 1024  # SQLite page cache while loading (64MB)
+    load_workers: int = os.cpu_count() or 1  # Processes loading the tables of a multi-table build
+    index_max_count: int = 5  # Indexes the advisor adds to each table of a new database
+    index_min_rows: int = 10_000  # Smaller tables are scanned quickly and get no advised indexes
+    analysis_limit: int = 1000  # Rows per index sampled by ANALYZE (0 = all)
+    validation_sample_rows: int = 1000  # Rows read from the file, besides the preview, to dry-run a schema
+    
+    # Query settings
+    query_workers: int = 8  # Threads running read-only queries
+    query_max_connections: int = 4  # Idle read-only connections kept per database
+    query_max_databases: int = 64  # Databases with idle connections kept open
+    query_idle_timeout: float = 300.0  # Seconds before an unused database's connections are closed
+    query_mmap_size: int = 256 * 1024 * 1024  # Bytes of each database memory-mapped for reads
+    query_cache_size_kb: int = 16 * 1024  # SQLite page cache per query connection (16MB)
+    query_max_rows: int = 10_000  # Largest max_rows a query may ask for
+    query_timeout: float = 10.0  # Seconds a query may run in SQLite (0 = no limit)
+    query_max_steps: int = 0  # SQLite VM instructions a query may run (0 = no limit)
+    query_stream_timeout: float = 300.0  # Seconds a streamed query may run in SQLite (0 = no limit)
+    query_max_queued: int = 64  # Queries waiting for a free query thread before 503s
+    query_queue_timeout: float = 5.0  # Seconds a query waits for a thread before a 503
+    query_max_per_database: int = 32  # Queries running or waiting per database before 429s
+    query_stream_batch_size: int = 1000  # Rows fetched per batch when streaming a query
+    query_result_cache_size: int = 64 * 1024 * 1024  # Bytes of query results cached (0 = off)
+    query_result_cache_ttl: float = 0  # Seconds a cached result is served (0 = until evicted)
+    query_slow_threshold: float = 1.0  # Seconds in SQLite after which a query is logged as slow
+    query_slow_log_size: int = 100  # Slow queries kept per database (0 = off)
+    
+    # Server settings
+    workers: int = 1  # Server processes; state is shared through the on-disk catalogs
+    
+    # Background job settings
+    job_workers: int = 2  # Size of the process pool running ingest and build jobs
+    job_event_interval: float = 0.5  # Seconds between job record checks for event streams
+    
     # CORS settings
     allowed_origins: list = ["*"]
     
@@ -1,6 +1,6 @@
 """Pydantic models for request and response validation"""
 from pydantic import BaseModel, Field, ConfigDict
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Literal, Optional, Any, Union
 from datetime import datetime
 
 
@@ -15,10 +15,90 @@ class UploadResponse(BaseModel):
     columns: List[str]
     preview: List[Dict[str, Any]]
     column_types: Dict[str, str]
+    deduplicated: bool = Field(
+        False,
+        description="True when identical content was already uploaded and its analysis was reused"
+    )
+
+
+class UploadSessionRequest(BaseModel):
+    """Request model for starting a chunked upload"""
+    filename: str = Field(..., description="Name of the CSV file, e.g. data.csv or data.csv.gz")
+    total_size: int = Field(..., ge=0, description="Size of the complete file in bytes")
+    content_encoding: Optional[str] = Field(
+        None,
+        description="Compression of the uploaded bytes (gzip, bzip2 or zstd) if not implied by the filename"
+    )
+
+
+class UploadSessionResponse(BaseModel):
+    """Response model for the state of a chunked upload"""
+    session_id: str
+    filename: str
+    total_size: int
+    received: List[List[int]] = Field(..., description="Received [start, end) byte ranges")
+    bytes_received: int
+    complete: bool
+    expires_at: float = Field(..., description="Unix time after which an idle session is removed")
+
+
+class FileSummary(BaseModel):
+    """Catalog entry of an uploaded CSV file"""
+    file_id: str
+    filename: str
+    row_count: int
+    column_count: int
+    columns: List[str]
+    column_types: Dict[str, str]
+    file_size: int
+    aliased_from: Optional[str] = Field(None, description="file_id whose stored data this duplicate upload shares")
+    created_at: Optional[str] = None
+
+
+class FileListResponse(BaseModel):
+    """Response model for a page of uploaded files"""
+    items: List[FileSummary]
+    total: int
+    limit: int
+    offset: int
+
+
+class RowsResponse(BaseModel):
+    """Response model for a page of rows from an uploaded CSV"""
+    file_id: str
+    offset: int
+    limit: int
+    total_rows: int
+    columns: List[str]
+    rows: List[Dict[str, Any]]
+
+
+class JobAcceptedResponse(BaseModel):
+    """Response model for work accepted as a background job"""
+    success: bool
+    message: str
+    job_id: str
+    status: str
+    file_id: Optional[str] = None
+    database_id: Optional[str] = None
+
+
+class JobStatusResponse(BaseModel):
+    """Response model for background job status"""
+    job_id: str
+    kind: str
+    status: str = Field(..., description="queued, running, completed or failed")
+    progress: Dict[str, Any] = Field(default_factory=dict)
+    result: Optional[Dict[str, Any]] = None
+    error: Optional[str] = None
+    created_at: str
+    updated_at: str
 
 
 class SchemaGenerationRequest(BaseModel):
     """Request model for schema generation"""
+    model_config = ConfigDict(populate_by_name=True)
+    
     file_id: str = Field(..., description="ID of the uploaded CSV file")
     sql_schema: Optional[str] = Field(
         None,
@@ -28,6 +108,26 @@ class SchemaGenerationRequest(BaseModel):
         None,
         description="Optional: User instructions for schema generation"
     )
+    validate_schema: bool = Field(
+        False,
+        alias="validate",
+        description="Dry-run the schema against a sample of the upload and report problems"
+    )
+
+
+class SchemaValidation(BaseModel):
+    """Result of a schema dry run against a sample of an upload"""
+    valid: bool = Field(..., description="True if no problem was found in the sample")
+    table_name: Optional[str] = Field(None, description="Table the sample was loaded into")
+    rows_checked: int
+    elapsed_ms: float
+    schema_error: Optional[str] = Field(None, description="Why SQLite rejected the schema itself")
+    unmatched_columns: List[str] = Field(..., description="CSV columns the table has no column for")
+    missing_columns: List[str] = Field(..., description="NOT NULL table columns without default or CSV data")
+    type_errors: List[Dict[str, Any]] = Field(..., description="Values that do not fit the declared column type")
+    type_error_count: int
+    constraint_violations: List[Dict[str, Any]] = Field(..., description="Rows refused by a constraint")
+    constraint_violation_count: int
 
 
 class SchemaGenerationResponse(BaseModel):
@@ -36,6 +136,28 @@ class SchemaGenerationResponse(BaseModel):
     message: str
     file_id: str
     sql_schema: str = Field(..., description="SQL CREATE TABLE statement")
+    validation: Optional[SchemaValidation] = Field(None, description="Dry-run result when validate was requested")
+
+
+class SchemaValidationRequest(BaseModel):
+    """Request model for a schema dry run"""
+    file_id: str = Field(..., description="ID of the uploaded CSV file")
+    sql_schema: str = Field(..., description="SQL schema to check")
+    table_name: Optional[str] = Field(None, description="Optional: Table the upload goes into (default: first table)")
+
+
+class SchemaValidationResponse(BaseModel):
+    """Response model for a schema dry run"""
+    success: bool
+    message: str
+    file_id: str
+    validation: SchemaValidation
+
+
+class TableSource(BaseModel):
+    """Upload loaded into one table of a multi-table database"""
+    file_id: str = Field(..., description="ID of the uploaded CSV file")
+    table_name: str = Field(..., description="Table of the schema the rows go into")
 
 
 class DatabaseCreationRequest(BaseModel):
@@ -43,6 +165,20 @@ class DatabaseCreationRequest(BaseModel):
     file_id: str = Field(..., description="ID of the uploaded CSV file")
     sql_schema: str = Field(..., description="SQL CREATE TABLE statement")
     db_name: Optional[str] = Field(None, description="Optional: Custom database name")
+    tables: Optional[List[TableSource]] = Field(
+        None,
+        description="Optional: Uploads to load, one per table; file_id must be one of them"
+    )
+    optimize: bool = Field(True, description="Add indexes and run ANALYZE after loading")
+    index_columns: Optional[List[str]] = Field(
+        None,
+        description="Optional: Columns to index instead of those chosen from the column profile"
+    )
+    max_indexes: Optional[int] = Field(None, ge=0, description="Optional: Most indexes to add automatically")
+    coerce_types: bool = Field(
+        True,
+        description="Convert values to the declared column types; values that do not convert are stored as NULL"
+    )
 
 
 class DatabaseCreationResponse(BaseModel):
@@ -54,6 +190,108 @@ class DatabaseCreationResponse(BaseModel):
     database_path: str
     table_name: str
     row_count: int
+    optimization: Optional[Dict[str, Any]] = Field(
+        None,
+        description="Indexes created and whether ANALYZE ran; null when optimize was false"
+    )
+    tables: Optional[List[Dict[str, Any]]] = Field(
+        None,
+        description="Table name, file_id and row_count of each table of a multi-table build"
+    )
+    foreign_key_violations: Optional[Dict[str, int]] = Field(
+        None,
+        description="Rows without a parent row per table of a multi-table build"
+    )
+    invalid_values: Optional[Dict[str, Dict[str, Any]]] = Field(
+        None,
+        description="Per column: declared_type, count and examples of values that did not convert"
+    )
+    cached: bool = Field(
+        False,
+        description="True if an existing database built from the same inputs was reused"
+    )
+
+
+class DatabaseAppendRequest(BaseModel):
+    """Request model for adding an upload's rows to an existing database"""
+    file_id: str = Field(..., description="ID of the uploaded CSV file with the new rows")
+    key_columns: Optional[List[str]] = Field(
+        None,
+        description="Optional: PRIMARY KEY or UNIQUE columns; rows with an existing key update that row"
+    )
+
+
+class DatabaseAppendResponse(BaseModel):
+    """Response model for rows added to an existing database"""
+    success: bool
+    message: str
+    database_id: str
+    file_id: str
+    table_name: str
+    rows_loaded: int = Field(..., description="Rows read from the upload")
+    rows_inserted: int = Field(..., description="Rows added to the table")
+    rows_updated: int = Field(..., description="Rows that matched an existing key and updated it")
+    rows_skipped: int = Field(0, description="Rows that matched an existing key and had nothing to update")
+    invalid_values: Dict[str, Dict[str, Any]] = Field(
+        default_factory=dict,
+        description="Per column: declared_type, count and examples of values that did not convert"
+    )
+    row_count: int = Field(..., description="Rows in the table after the append")
+
+
+class QueryRequest(BaseModel):
+    """Request model for running a read-only SQL query"""
+    database_id: str = Field(..., description="ID of the database to query")
+    query: str = Field(..., description="A single SQL statement, e.g. a SELECT")
+    params: Optional[Union[List[Any], Dict[str, Any]]] = Field(
+        None,
+        description="Optional: Values bound to ? (list) or :name (object) placeholders",
+    )
+    max_rows: int = Field(100, ge=1, description="Most rows to return")
+    timeout: Optional[float] = Field(
+        None,
+        gt=0,
+        description="Optional: Seconds the query may run, at most QUERY_TIMEOUT",
+    )
+
+
+class QueryResponse(BaseModel):
+    """Response model for a read-only SQL query"""
+    success: bool
+    database_id: str
+    columns: List[str]
+    rows: List[List[Any]]
+    row_count: int = Field(..., description="Rows returned")
+    truncated: bool = Field(..., description="Whether the query had more rows than max_rows")
+    execution_time: float = Field(..., description="Seconds spent running the query")
+    cached: bool = Field(False, description="Whether the result was served from the result cache")
+
+
+class QueryStreamRequest(BaseModel):
+    """Request model for streaming all rows of a read-only SQL query"""
+    database_id: str = Field(..., description="ID of the database to query")
+    query: str = Field(..., description="A single SQL statement, e.g. a SELECT")
+    params: Optional[Union[List[Any], Dict[str, Any]]] = Field(
+        None,
+        description="Optional: Values bound to ? (list) or :name (object) placeholders",
+    )
+    format: Literal["ndjson", "csv", "arrow"] = Field("ndjson", description="Encoding of the streamed rows")
+    batch_size: Optional[int] = Field(
+        None,
+        ge=1,
+        le=100_000,
+        description="Optional: Rows read from the cursor at a time",
+    )
+
+
+class TableRowsResponse(BaseModel):
+    """Response model for a keyset-paginated page of table rows"""
+    database_id: str
+    table_name: str
+    columns: List[str]
+    rows: List[List[Any]]
+    row_count: int
+    next_cursor: Optional[str] = Field(None, description="Token of the next page; null on the last page")
 
 
 class ErrorResponse(BaseModel):
@@ -61,3 +299,40 @@ class ErrorResponse(BaseModel):
     success: bool = False
     error: str
     detail: Optional[str] = None
+
+
+class DatabaseInfo(BaseModel):
+    """Catalog entry of a created database"""
+    database_id: str
+    file_id: str
+    database_path: str
+    table_name: str
+    row_count: int
+    optimization: Optional[Dict[str, Any]] = None
+    tables: Optional[List[Dict[str, Any]]] = Field(None, description="Tables of a multi-table build")
+    foreign_key_violations: Optional[Dict[str, int]] = None
+    invalid_values: Optional[Dict[str, Dict[str, Any]]] = None
+    cloned_from: Optional[str] = Field(None, description="Database this one was copied from")
+    appends: List[Dict[str, Any]] = Field(default_factory=list, description="Uploads appended since the build")
+    version: int = Field(0, description="Increases whenever rows are appended")
+    created_at: Optional[str] = None
+
+
+class SlowQueriesResponse(BaseModel):
+    """Response model for the slow query log of a database"""
+    database_id: str
+    threshold: float = Field(..., description="Seconds after which a query is logged")
+    entries: List[Dict[str, Any]] = Field(..., description="Slow queries with their plans, newest first")
+    total: int = Field(..., description="Slow queries logged for the database")
+    index_suggestions: List[Dict[str, Any]] = Field(
+        ...,
+        description="Indexes that would spare the logged queries their full table scans",
+    )
+
+
+class DatabaseListResponse(BaseModel):
+    """Response model for a page of created databases"""
+    items: List[DatabaseInfo]
+    total: int
+    limit: int
+    offset: int
@@ -0,0 +1,123 @@
+"""Admission control for queries: bounded concurrency, queueing and per-database limits"""
+import asyncio
+from collections import deque
+from contextlib import asynccontextmanager
+from typing import AsyncIterator, Deque, Dict
+
+
+class DatabaseBusyError(Exception):
+    """Raised when a database already has as many queries in flight as it may"""
+
+
+class QueryQueueFullError(Exception):
+    """Raised when the server cannot take on another query in time"""
+
+
+class AdmissionController:
+    """
+    Admits at most ``max_active`` queries at once, first come first served
+    
+    Further queries wait in a queue of at most ``max_queued`` for up to
+    ``queue_timeout`` seconds. A query that finds the queue full, or does
+    not get its turn in time, is refused, as is one for a database that
+    already has ``max_per_database`` queries running or waiting. Refusing
+    early keeps the latency of admitted queries stable under overload
+    instead of letting every request slow down.
+    
+    Runs on the event loop; it is not thread-safe.
+    """
+    
+    def __init__(self, max_active: int, max_queued: int, max_per_database: int, queue_timeout: float):
+        self.max_active = max_active
+        self.max_queued = max_queued
+        self.max_per_database = max_per_database
+        self.queue_timeout = queue_timeout
+        self._active = 0
+        self._waiters: Deque[asyncio.Future] = deque()
+        self._in_flight: Dict[str, int] = {}
+        self.rejected = 0
+    
+    async def acquire(self, database: str):
+        """
+        Wait for a turn to query a database
+        
+        Raises:
+            DatabaseBusyError: If the database has too many queries in flight
+            QueryQueueFullError: If the queue is full or the wait timed out
+        """
+        if self._in_flight.get(database, 0) >= self.max_per_database:
+            self.rejected += 1
+            raise DatabaseBusyError(
+                f"Too many concurrent queries on this database (limit {self.max_per_database})"
+            )
+        if self._active >= self.max_active and len(self._waiters) >= self.max_queued:
+            self.rejected += 1
+            raise QueryQueueFullError("Server is at capacity, try again shortly")
+        
+        self._in_flight[database] = self._in_flight.get(database, 0) + 1
+        try:
+            await self._take_slot()
+        except BaseException:
+            self._leave(database)
+            raise
+    
+    def release(self, database: str):
+        """End a turn taken with acquire"""
+        self._leave(database)
+        self._release_slot()
+    
+    @asynccontextmanager
+    async def admit(self, database: str) -> AsyncIterator[None]:
+        """Hold a turn to query a database for the duration of a block"""
+        await self.acquire(database)
+        try:
+            yield
+        finally:
+            self.release(database)
+    
+    async def _take_slot(self):
+        if self._active < self.max_active and not self._waiters:
+            self._active += 1
+            return
+        waiter = asyncio.get_running_loop().create_future()
+        self._waiters.append(waiter)
+        try:
+            await asyncio.wait_for(asyncio.shield(waiter), self.queue_timeout)
+        except BaseException as e:
+            if waiter.done() and not waiter.cancelled():
+                # The slot arrived just as the wait ended; pass it on
+                self._release_slot()
+            else:
+                waiter.cancel()
+                try:
+                    self._waiters.remove(waiter)
+                except ValueError:
+                    pass
+            if isinstance(e, asyncio.TimeoutError):
+                self.rejected += 1
+                raise QueryQueueFullError("Timed out waiting for a query slot, try again shortly")
+            raise
+    
+    def _release_slot(self):
+        """Hand a slot straight to the longest waiting query, or free it"""
+        while self._waiters:
+            waiter = self._waiters.popleft()
+            if not waiter.done():
+                waiter.set_result(None)
+                return
+        self._active -= 1
+    
+    def _leave(self, database: str):
+        count = self._in_flight.get(database, 0) - 1
+        if count > 0:
+            self._in_flight[database] = count
+        else:
+            self._in_flight.pop(database, None)
+    
+    def stats(self) -> Dict[str, int]:
+        """Queries running and waiting, and how many were refused"""
+        return {
+            "active": self._active,
+            "queued": sum(1 for waiter in self._waiters if not waiter.done()),
+            "rejected": self.rejected,
+        }
@@ -0,0 +1,432 @@
+"""Fast bulk loading of DataFrame chunks into SQLite"""
+import re
+import sqlite3
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, Iterable, List, Optional, Callable, Tuple
+from app.config import settings
+from app.services.type_coercion import TypeCoercer
+
+
+# Applied while loading; durability does not matter until the load succeeds,
+# because a failed build deletes the database file
+LOAD_PRAGMAS = [
+    "PRAGMA journal_mode=OFF",
+    "PRAGMA synchronous=OFF",
+    "PRAGMA locking_mode=EXCLUSIVE",
+    "PRAGMA temp_store=MEMORY",
+]
+
+# Restored once the data is in
+DURABLE_PRAGMAS = [
+    "PRAGMA journal_mode=DELETE",
+    "PRAGMA synchronous=FULL",
+    "PRAGMA locking_mode=NORMAL",
+]
+
+
+# CREATE TABLE statement, after any leading comments; group 1 is the table name
+CREATE_TABLE = re.compile(
+    r"^\s*(?:(?:--[^\n]*(?:\n|$)|/\*.*?\*/)\s*)*"
+    r"CREATE\s+(?:TEMP(?:ORARY)?\s+)?TABLE\s+(?:IF\s+NOT\s+EXISTS\s+)?([^\s(]+)",
+    re.IGNORECASE | re.DOTALL,
+)
+
+
+def split_schema(schema: str) -> Tuple[List[Tuple[str, str]], List[str]]:
+    """
+    Separate the CREATE TABLE statements of a schema from everything else
+    
+    Tables are created before loading; indexes, views and triggers are
+    deferred until the rows are in, which is much faster than maintaining
+    indexes row by row.
+    
+    Args:
+        schema: SQL schema (may hold several statements)
+    
+    Returns:
+        Tuple of ((table name, statement) pairs, deferred statements), both
+        in schema order
+    """
+    tables, deferred = [], []
+    current = ""
+    for piece in schema.split(";"):
+        current += piece + ";"
+        # A ';' inside a string, comment or trigger body does not end the statement
+        if not sqlite3.complete_statement(current):
+            continue
+        statement = current.strip()
+        current = ""
+        if not statement.strip(";").strip():
+            continue
+        match = CREATE_TABLE.match(statement)
+        if match:
+            tables.append((match.group(1).strip('`"[]'), statement))
+        else:
+            deferred.append(statement)
+    if current.strip(" \t\n;"):
+        # Incomplete trailing statement: let SQLite report the syntax error
+        deferred.append(current)
+    return tables, deferred
+
+
+def quote_identifier(name: str) -> str:
+    """Quote a table or column name for SQLite"""
+    return '"' + name.replace('"', '""') + '"'
+
+
+def table_columns(conn: sqlite3.Connection, table_name: str) -> List[str]:
+    """Column names of a table, in declaration order"""
+    rows = conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})").fetchall()
+    if not rows:
+        raise ValueError(f"Table '{table_name}' was not created by the schema")
+    return [row[1] for row in rows]
+
+
+def match_columns(frame_columns: List[str], columns: List[str]) -> Tuple[Dict[str, str], List[str]]:
+    """
+    Match CSV columns to table columns
+    
+    SQLite compares column names case-insensitively. The basic schema
+    replaces spaces and dashes with underscores, so that spelling is
+    accepted as well.
+    
+    Args:
+        frame_columns: Column names of the CSV
+        columns: Column names of the table
+    
+    Returns:
+        Tuple of (CSV column -> table column, CSV columns without a match)
+    """
+    by_name = {column.lower(): column for column in columns}
+    mapping = {}
+    missing = []
+    for name in frame_columns:
+        key = name.lower()
+        if key not in by_name:
+            key = key.replace(' ', '_').replace('-', '_')
+        if key in by_name:
+            mapping[name] = by_name[key]
+        else:
+            missing.append(name)
+    return mapping, missing
+
+
+def map_columns(frame_columns: List[str], columns: List[str]) -> Dict[str, str]:
+    """
+    Match CSV columns to table columns, see match_columns
+    
+    Raises:
+        ValueError: If a CSV column has no table column
+    """
+    mapping, missing = match_columns(frame_columns, columns)
+    if missing:
+        raise ValueError(f"Table has no columns for CSV columns: {missing}")
+    return mapping
+
+
+def unique_keys(conn: sqlite3.Connection, table_name: str) -> List[List[str]]:
+    """
+    Column sets declared unique on a table
+    
+    Covers PRIMARY KEY and UNIQUE constraints and full unique indexes, the
+    targets ``INSERT ... ON CONFLICT`` accepts.
+    
+    Args:
+        conn: Database connection
+        table_name: Table name
+    
+    Returns:
+        Column names of each key, in key order
+    """
+    table = quote_identifier(table_name)
+    keys = []
+    primary = sorted(
+        (row[5], row[1]) for row in conn.execute(f"PRAGMA table_info({table})") if row[5] > 0
+    )
+    if primary:
+        keys.append([name for _, name in primary])
+    for _, name, unique, _, partial in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        if unique and not partial:
+            info = conn.execute(f"PRAGMA index_info({quote_identifier(name)})").fetchall()
+            keys.append([row[2] for row in sorted(info)])
+    return keys
+
+
+def insert_statement(
+    table_name: str,
+    frame_columns: List[str],
+    mapping: Dict[str, str],
+    key_columns: Optional[List[str]] = None,
+) -> str:
+    """
+    Prepared INSERT for rows with the given CSV columns
+    
+    With ``key_columns`` rows whose key already exists update the existing
+    row instead (an upsert).
+    
+    Args:
+        table_name: Target table
+        frame_columns: CSV columns, in the order values are bound
+        mapping: CSV column -> table column
+        key_columns: Table columns of a unique key to upsert on
+    
+    Returns:
+        SQL statement with one placeholder per column
+    """
+    targets = [mapping[name] for name in frame_columns]
+    sql = (
+        f"INSERT INTO {quote_identifier(table_name)} "
+        f"({', '.join(quote_identifier(column) for column in targets)}) "
+        f"VALUES ({', '.join('?' for _ in targets)})"
+    )
+    if key_columns:
+        keys = {column.lower() for column in key_columns}
+        updates = [
+            f"{quote_identifier(column)} = excluded.{quote_identifier(column)}"
+            for column in targets if column.lower() not in keys
+        ]
+        action = f"DO UPDATE SET {', '.join(updates)}" if updates else "DO NOTHING"
+        sql += f" ON CONFLICT ({', '.join(quote_identifier(column) for column in key_columns)}) {action}"
+    return sql
+
+
+def insert_chunks(
+    conn: sqlite3.Connection,
+    table_name: str,
+    chunks: Iterable[pd.DataFrame],
+    key_columns: Optional[List[str]] = None,
+    commit_rows: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+    db_path: Optional[Path] = None,
+    coercer: Optional[TypeCoercer] = None,
+) -> int:
+    """
+    Insert DataFrame chunks with one prepared ``executemany`` per chunk
+    
+    Must be called inside a transaction. Only one chunk is in memory at a
+    time.
+    
+    Args:
+        conn: Database connection
+        table_name: Table receiving the rows
+        chunks: DataFrames whose columns match the table columns by name
+        key_columns: Table columns of a unique key to upsert on
+        commit_rows: Commit and start a new transaction after this many
+            rows; None keeps everything in the caller's transaction
+        progress: Optional callback receiving rows loaded and bytes written
+        db_path: Database file, for reporting bytes written
+        coercer: Converts each chunk to the declared column types first
+    
+    Returns:
+        Number of rows inserted or upserted
+    """
+    columns = table_columns(conn, table_name)
+    rows_loaded = 0
+    rows_in_transaction = 0
+    insert_sql = None
+    for chunk in chunks:
+        if insert_sql is None:
+            mapping = map_columns(list(chunk.columns), columns)
+            insert_sql = insert_statement(table_name, list(chunk.columns), mapping, key_columns)
+        if coercer is not None:
+            chunk = coercer.coerce(chunk, mapping)
+        
+        # tolist() yields Python scalars sqlite3 can bind; NaN is stored as NULL
+        values = [chunk[name].tolist() for name in chunk.columns]
+        conn.executemany(insert_sql, zip(*values))
+        rows_loaded += len(chunk)
+        rows_in_transaction += len(chunk)
+        
+        if commit_rows and rows_in_transaction >= commit_rows:
+            conn.execute("COMMIT")
+            conn.execute("BEGIN")
+            rows_in_transaction = 0
+        if progress:
+            progress(
+                rows_loaded=rows_loaded,
+                bytes_written=db_path.stat().st_size if db_path else None,
+            )
+    return rows_loaded
+
+
+def bulk_load(
+    db_path: Path,
+    schema: str,
+    table_name: str,
+    chunks: Iterable[pd.DataFrame],
+    rows_total: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+    coerce_types: bool = True,
+) -> Dict[str, Any]:
+    """
+    Create a database from a schema and stream rows into one of its tables
+    
+    Rows are inserted with one prepared ``executemany`` per chunk, inside
+    transactions of settings.load_transaction_rows rows, with journaling and
+    syncing turned off. The page size is set before the schema is created.
+    Only one chunk is in memory at a time. Statements other than CREATE
+    TABLE (indexes, views, triggers) run after the rows are loaded.
+    
+    Args:
+        db_path: Path of the database to create
+        schema: SQL schema (may hold several statements)
+        table_name: Table receiving the rows
+        chunks: DataFrames whose columns match the table columns by name
+        rows_total: Expected number of rows, for progress reporting
+        progress: Optional callback receiving phase, rows loaded and
+            database bytes written
+        coerce_types: Whether to convert values to the declared column
+            types (see TypeCoercer) instead of binding them as parsed
+    
+    Returns:
+        Dictionary with rows_loaded and the invalid_values per column
+    """
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        # page_size only takes effect before the first table is created
+        conn.execute(f"PRAGMA page_size={int(settings.load_page_size)}")
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f"PRAGMA cache_size={-int(settings.load_cache_size_kb)}")
+        
+        tables, deferred = split_schema(schema)
+        conn.executescript("\n".join(statement for _, statement in tables))
+        table_columns(conn, table_name)
+        
+        if progress:
+            progress(phase="loading", rows_loaded=0, rows_total=rows_total, bytes_written=0)
+        
+        coercer = TypeCoercer(conn, table_name) if coerce_types else None
+        conn.execute("BEGIN")
+        rows_loaded = insert_chunks(
+            conn,
+            table_name,
+            chunks,
+            commit_rows=settings.load_transaction_rows,
+            progress=progress,
+            db_path=db_path,
+            coercer=coercer,
+        )
+        conn.execute("COMMIT")
+        
+        if progress:
+            progress(phase="finalizing")
+        finish_load(conn, deferred)
+        return {
+            "rows_loaded": rows_loaded,
+            "invalid_values": coercer.report() if coercer else {},
+        }
+    finally:
+        conn.close()
+
+
+def finish_load(conn: sqlite3.Connection, deferred: List[str]):
+    """Run the deferred schema statements and make the database durable"""
+    conn.executescript("\n".join(deferred))
+    for pragma in DURABLE_PRAGMAS:
+        conn.execute(pragma)
+    # locking_mode=NORMAL only releases the exclusive lock on the next access
+    conn.execute("SELECT 1 FROM sqlite_master LIMIT 1").fetchall()
+
+
+def bulk_append(
+    db_path: Path,
+    table_name: str,
+    chunks: Iterable[pd.DataFrame],
+    key_columns: Optional[List[str]] = None,
+    rows_total: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, int]:
+    """
+    Stream rows into a table of an existing database
+    
+    Unlike a fresh build, the database already holds data that must
+    survive a failure, so journaling stays on and all rows go in as one
+    transaction: a failed append leaves the database as it was.
+    
+    With ``key_columns``, which must be a PRIMARY KEY or UNIQUE constraint
+    of the table, rows whose key exists replace that row's other columns.
+    Temporary triggers count the rows that were new and those that were
+    updated; when the upload has no columns besides the key, a row whose
+    key exists is skipped. Values are converted to the declared column
+    types as in bulk_load.
+    
+    Args:
+        db_path: Path of the database
+        table_name: Table receiving the rows
+        chunks: DataFrames whose columns match the table columns by name
+        key_columns: Unique key to upsert on; None appends every row
+        rows_total: Expected number of rows, for progress reporting
+        progress: Optional callback receiving phase, rows loaded and
+            database bytes written
+    
+    Returns:
+        Dictionary with rows_loaded, rows_inserted, rows_updated,
+        rows_skipped and the invalid_values per column
+    """
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    try:
+        conn.execute("PRAGMA synchronous=NORMAL")
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size={-int(settings.load_cache_size_kb)}")
+        columns = table_columns(conn, table_name)
+        
+        if key_columns:
+            by_name = {column.lower(): column for column in columns}
+            unknown = [name for name in key_columns if name.lower() not in by_name]
+            if unknown:
+                raise ValueError(f"Table has no key columns: {unknown}")
+            key_columns = [by_name[name.lower()] for name in key_columns]
+            declared = [{column.lower() for column in key} for key in unique_keys(conn, table_name)]
+            if {column.lower() for column in key_columns} not in declared:
+                raise ValueError(
+                    f"Columns {key_columns} are not a PRIMARY KEY or UNIQUE constraint of '{table_name}'"
+                )
+            conn.execute("CREATE TEMP TABLE load_counts (inserted INTEGER NOT NULL, updated INTEGER NOT NULL)")
+            conn.execute("INSERT INTO load_counts VALUES (0, 0)")
+            conn.execute(
+                f"CREATE TEMP TRIGGER count_inserts AFTER INSERT ON main.{quote_identifier(table_name)} "
+                f"BEGIN UPDATE load_counts SET inserted = inserted + 1; END"
+            )
+            conn.execute(
+                f"CREATE TEMP TRIGGER count_updates AFTER UPDATE ON main.{quote_identifier(table_name)} "
+                f"BEGIN UPDATE load_counts SET updated = updated + 1; END"
+            )
+        
+        if progress:
+            progress(phase="loading", rows_loaded=0, rows_total=rows_total)
+        
+        # Take the write lock up front so concurrent appends queue on the busy timeout
+        conn.execute("BEGIN IMMEDIATE")
+        coercer = TypeCoercer(conn, table_name)
+        try:
+            rows_loaded = insert_chunks(
+                conn,
+                table_name,
+                chunks,
+                key_columns=key_columns,
+                progress=progress,
+                db_path=db_path,
+                coercer=coercer,
+            )
+            rows_inserted, rows_updated = (
+                conn.execute("SELECT inserted, updated FROM load_counts").fetchone()
+                if key_columns else (rows_loaded, 0)
+            )
+            conn.execute("COMMIT")
+        except BaseException:
+            # Some errors (e.g. a full disk) have rolled back already
+            if conn.in_transaction:
+                conn.execute("ROLLBACK")
+            raise
+        
+        return {
+            "rows_loaded": rows_loaded,
+            "rows_inserted": rows_inserted,
+            "rows_updated": rows_updated,
+            "rows_skipped": rows_loaded - rows_inserted - rows_updated,
+            "invalid_values": coercer.report(),
+        }
+    finally:
+        conn.close()
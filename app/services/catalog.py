@@ -0,0 +1,287 @@
+"""SQLite-backed catalog of uploads and databases"""
+import json
+import sqlite3
+import threading
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Sequence, Tuple, Callable
+
+
+class Catalog:
+    """
+    Indexed store of JSON records keyed by ID
+    
+    Each record is one row, so lookups and inserts cost the same no matter
+    how many records exist. Fields named in ``indexed`` are also kept in
+    their own indexed columns for filtering.
+    
+    Parsed records are cached in-process. Every write bumps a version
+    counter stored in the catalog itself, so a reader only has to compare
+    one integer to know whether its cache is still valid, including after
+    writes by other processes.
+    """
+    
+    def __init__(self, path: Path, indexed: Sequence[str] = ()):
+        self.path = path
+        self.indexed = list(indexed)
+        self._local = threading.local()
+        self._cache: Dict[str, Dict[str, Any]] = {}
+        self._cache_version: Optional[int] = None
+        self._cache_lock = threading.Lock()
+        self._create_schema()
+    
+    def _connect(self) -> sqlite3.Connection:
+        """One connection per thread; sqlite3 connections are not thread safe"""
+        conn = getattr(self._local, "conn", None)
+        if conn is None:
+            conn = sqlite3.connect(str(self.path), timeout=30, isolation_level=None)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=NORMAL")
+            self._local.conn = conn
+        return conn
+    
+    def _create_schema(self):
+        conn = self._connect()
+        field_columns = "".join(f", {_column(field)} TEXT" for field in self.indexed)
+        conn.execute(
+            f"CREATE TABLE IF NOT EXISTS records ("
+            f"id TEXT PRIMARY KEY, data TEXT NOT NULL, created_at TEXT NOT NULL{field_columns})"
+        )
+        conn.execute("CREATE TABLE IF NOT EXISTS version (value INTEGER NOT NULL)")
+        conn.execute("INSERT INTO version SELECT 0 WHERE NOT EXISTS (SELECT 1 FROM version)")
+        if self._missing_columns(conn):
+            # Fields indexed since the catalog was created are added and backfilled
+            with self._transaction() as conn:
+                for field in self._missing_columns(conn):
+                    conn.execute(f"ALTER TABLE records ADD COLUMN {_column(field)} TEXT")
+                    conn.execute(
+                        f"UPDATE records SET {_column(field)} = json_extract(data, ?)",
+                        (f"$.{field}",),
+                    )
+        for field in self.indexed:
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS idx_{field} ON records ({_column(field)})"
+            )
+    
+    def _missing_columns(self, conn: sqlite3.Connection) -> List[str]:
+        """Indexed fields without a column in the records table"""
+        present = {row[1] for row in conn.execute("PRAGMA table_info(records)")}
+        return [field for field in self.indexed if _column(field) not in present]
+    
+    @property
+    def version(self) -> int:
+        """Counter incremented by every write"""
+        return self._connect().execute("SELECT value FROM version").fetchone()[0]
+    
+    def _check_cache(self):
+        """Drop cached records if the catalog changed since they were read"""
+        version = self.version
+        with self._cache_lock:
+            if version != self._cache_version:
+                self._cache = {}
+                self._cache_version = version
+    
+    def get(self, record_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Look up one record
+        
+        Args:
+            record_id: Record ID
+        
+        Returns:
+            A copy of the record, or None if not found
+        """
+        self._check_cache()
+        record = self._cache.get(record_id)
+        if record is None:
+            row = self._connect().execute(
+                "SELECT data FROM records WHERE id = ?", (record_id,)
+            ).fetchone()
+            if row is None:
+                return None
+            record = json.loads(row[0])
+            self._cache[record_id] = record
+        return dict(record)
+    
+    def put(self, record_id: str, record: Dict[str, Any]):
+        """
+        Insert or replace a record
+        
+        Args:
+            record_id: Record ID
+            record: JSON-serializable record
+        """
+        self.put_many([(record_id, record)])
+    
+    def put_many(self, records: Sequence[Tuple[str, Dict[str, Any]]]):
+        """Insert or replace several records in one transaction"""
+        fields = ["id", "data", "created_at"] + [_column(field) for field in self.indexed]
+        placeholders = ", ".join("?" for _ in fields)
+        rows = [
+            (
+                record_id,
+                json.dumps(record),
+                record.get("created_at") or _now(),
+                *(_indexed_value(record.get(field)) for field in self.indexed),
+            )
+            for record_id, record in records
+        ]
+        # created_at of an existing record is kept when it is replaced
+        updates = ", ".join(f"{field} = excluded.{field}" for field in fields if field not in ("id", "created_at"))
+        with self._transaction() as conn:
+            conn.executemany(
+                f"INSERT INTO records ({', '.join(fields)}) VALUES ({placeholders}) "
+                f"ON CONFLICT(id) DO UPDATE SET {updates}",
+                rows,
+            )
+    
+    def update(
+        self,
+        record_id: str,
+        change: Callable[[Dict[str, Any]], Dict[str, Any]],
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Read, change and write back one record in a single transaction
+        
+        Concurrent updates of the same record, also from other processes,
+        are applied one after the other instead of overwriting each other.
+        
+        Args:
+            record_id: Record ID
+            change: Called with the current record; returns the new record
+        
+        Returns:
+            The new record, or None if not found
+        """
+        assignments = ", ".join(["data = ?"] + [f"{_column(field)} = ?" for field in self.indexed])
+        with self._transaction() as conn:
+            row = conn.execute("SELECT data FROM records WHERE id = ?", (record_id,)).fetchone()
+            if row is None:
+                return None
+            record = change(json.loads(row[0]))
+            conn.execute(
+                f"UPDATE records SET {assignments} WHERE id = ?",
+                [json.dumps(record)]
+                + [_indexed_value(record.get(field)) for field in self.indexed]
+                + [record_id],
+            )
+        return record
+    
+    def delete(self, record_id: str) -> bool:
+        """
+        Remove a record
+        
+        Args:
+            record_id: Record ID
+        
+        Returns:
+            True if the record existed
+        """
+        with self._transaction() as conn:
+            deleted = conn.execute("DELETE FROM records WHERE id = ?", (record_id,)).rowcount
+        return deleted > 0
+    
+    def list(
+        self,
+        filters: Optional[Dict[str, Any]] = None,
+        limit: Optional[int] = None,
+        offset: int = 0,
+    ) -> List[Dict[str, Any]]:
+        """
+        List records in insertion order
+        
+        Args:
+            filters: Indexed field -> required value (None matches missing values)
+            limit: Maximum number of records (default: all)
+            offset: Number of matching records to skip
+        
+        Returns:
+            Matching records
+        """
+        where, params = self._where(filters)
+        rows = self._connect().execute(
+            f"SELECT data FROM records{where} ORDER BY rowid LIMIT ? OFFSET ?",
+            params + [-1 if limit is None else limit, offset],
+        ).fetchall()
+        return [json.loads(row[0]) for row in rows]
+    
+    def count(self, filters: Optional[Dict[str, Any]] = None) -> int:
+        """Number of records matching the filters"""
+        where, params = self._where(filters)
+        return self._connect().execute(
+            f"SELECT COUNT(*) FROM records{where}", params
+        ).fetchone()[0]
+    
+    def _where(self, filters: Optional[Dict[str, Any]]) -> Tuple[str, List[Any]]:
+        clauses, params = [], []
+        for field, value in (filters or {}).items():
+            if field not in self.indexed:
+                raise KeyError(f"Field '{field}' is not indexed")
+            if value is None:
+                clauses.append(f"{_column(field)} IS NULL")
+            else:
+                clauses.append(f"{_column(field)} = ?")
+                params.append(_indexed_value(value))
+        if not clauses:
+            return "", params
+        return " WHERE " + " AND ".join(clauses), params
+    
+    def _transaction(self):
+        return _Transaction(self._connect())
+    
+    def migrate_json(self, json_path: Path):
+        """
+        Import records from a legacy JSON metadata file
+        
+        The file is renamed afterwards so the import happens once.
+        
+        Args:
+            json_path: Path to a JSON object of ID -> record
+        """
+        if not json_path.exists():
+            return
+        with open(json_path, "r") as f:
+            records = json.load(f)
+        existing = {record_id for record_id in records if self.get(record_id) is not None}
+        self.put_many([
+            (record_id, record)
+            for record_id, record in records.items()
+            if record_id not in existing
+        ])
+        json_path.rename(json_path.with_name(f"{json_path.name}.migrated"))
+
+
+class _Transaction:
+    """Write transaction that also bumps the catalog version"""
+    
+    def __init__(self, conn: sqlite3.Connection):
+        self.conn = conn
+    
+    def __enter__(self) -> sqlite3.Connection:
+        # Take the write lock up front so concurrent writers queue on busy_timeout
+        self.conn.execute("BEGIN IMMEDIATE")
+        return self.conn
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.conn.execute("UPDATE version SET value = value + 1")
+            self.conn.execute("COMMIT")
+        else:
+            self.conn.execute("ROLLBACK")
+
+
+def _column(field: str) -> str:
+    """Column holding an indexed field"""
+    if not field.isidentifier():
+        raise ValueError(f"Invalid catalog field name: {field}")
+    return f"f_{field}"
+
+
+def _indexed_value(value: Any) -> Optional[str]:
+    if value is None:
+        return None
+    return value if isinstance(value, str) else json.dumps(value)
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
@@ -0,0 +1,460 @@
+"""Typed columnar cache for uploaded CSV files
+
+Every column is stored as raw NumPy data in its own file so that reloading
+an upload is a memory map instead of a CSV parse. Layout of a store
+directory (``uploads/<file_id>.columns/``)::
+
+    manifest.json   column names, storage kinds and row count
+    c<i>.values     int64 / float64 / bool values, or UTF-8 text bytes
+    c<i>.offsets    int64 end offset of each text value (text columns)
+    c<i>.mask       uint8 1 = present, 0 = missing (bool and text columns)
+"""
+import json
+import shutil
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Iterator, Iterable, Callable
+
+
+MANIFEST_FILE = "manifest.json"
+FORMAT_VERSION = 1
+
+# Storage kinds
+INT64 = "int64"
+FLOAT64 = "float64"
+BOOL = "bool"
+TEXT = "text"
+# Chunk-local kind for a segment in which every value is missing
+NULL = "null"
+
+# Rows rewritten per block when a column has to change kind
+_CONVERT_BLOCK_ROWS = 1_000_000
+
+# Reads columns of the source CSV again, by position, as text chunks in row order
+TextSource = Callable[[List[int]], Iterable[pd.DataFrame]]
+
+
+def csv_text_source(file_path: Path, chunksize: int, compression: Optional[str] = None) -> TextSource:
+    """
+    Text source re-reading columns of a CSV file as pd.read_csv would keep them as text
+    
+    Args:
+        file_path: CSV file the store is built from
+        chunksize: Rows per chunk
+        compression: Compression of the file, as understood by pd.read_csv
+    """
+    def read(indices: List[int]) -> Iterator[pd.DataFrame]:
+        with pd.read_csv(
+            file_path,
+            usecols=indices,
+            dtype=str,
+            chunksize=chunksize,
+            compression=compression,
+        ) as reader:
+            yield from reader
+    return read
+
+
+def _segment_kind(series: pd.Series) -> str:
+    """Classify the values of one column in one parsed chunk"""
+    if series.isna().all():
+        return NULL
+    if pd.api.types.is_bool_dtype(series.dtype):
+        return BOOL
+    if pd.api.types.is_integer_dtype(series.dtype):
+        return INT64
+    if pd.api.types.is_float_dtype(series.dtype):
+        return FLOAT64
+    if pd.api.types.infer_dtype(series, skipna=True) == "boolean":
+        return BOOL
+    return TEXT
+
+
+def _target_kind(current: Optional[str], has_values: bool, new: str) -> str:
+    """
+    Pick the storage kind that can hold both the stored and the new values
+    
+    Follows pandas' own rules so a reloaded frame matches ``pd.read_csv``:
+    integers with missing values become float64, mixed kinds become text.
+    """
+    if new == NULL:
+        if current is None or current == INT64:
+            return FLOAT64
+        return current
+    if current is None or not has_values:
+        # Only missing values so far; integers cannot represent them
+        if new == INT64 and current is not None:
+            return FLOAT64
+        return new
+    if current == new:
+        return current
+    if {current, new} == {INT64, FLOAT64}:
+        return FLOAT64
+    return TEXT
+
+
+def _memmap(path: Path, dtype: str, length: int) -> np.ndarray:
+    """Map a raw column file copy-on-write; empty files cannot be mapped"""
+    if length == 0:
+        return np.empty(0, dtype=dtype)
+    # Plain ndarray view so the memmap subclass does not leak into pandas
+    return np.asarray(np.memmap(path, dtype=dtype, mode="c", shape=(length,)))
+
+
+class _ColumnWriter:
+    """
+    Appends one column's chunks to its files, widening the kind as needed
+    
+    Numbers and booleans written to a text column no longer have their
+    original spelling (``007`` was parsed as 7), so the column is marked
+    ``lossy`` and rewritten from the source text before the store is published.
+    """
+    
+    def __init__(self, directory: Path, index: int, name: str):
+        self.directory = directory
+        self.index = index
+        self.name = name
+        self.file = f"c{index}"
+        self.kind: Optional[str] = None
+        self.length = 0
+        self.has_values = False
+        self.lossy = False
+        self._text_bytes = 0
+        self._handles: Dict[str, Any] = {}
+    
+    def _path(self, suffix: str) -> Path:
+        return self.directory / f"{self.file}.{suffix}"
+    
+    def _handle(self, suffix: str):
+        if suffix not in self._handles:
+            self._handles[suffix] = open(self._path(suffix), "ab")
+        return self._handles[suffix]
+    
+    def close(self):
+        for handle in self._handles.values():
+            handle.close()
+        self._handles = {}
+    
+    def append(self, series: pd.Series):
+        """Append a chunk of values for this column"""
+        segment = _segment_kind(series)
+        target = _target_kind(self.kind, self.has_values, segment)
+        if self.kind is not None and target != self.kind and self.length:
+            self._convert(target)
+        if target == TEXT and segment not in (TEXT, NULL):
+            self.lossy = True
+        self.kind = target
+        self._write(series, target)
+        self.has_values = self.has_values or segment != NULL
+    
+    def _write(self, series: pd.Series, kind: str):
+        present = series.notna().to_numpy()
+        if kind == INT64:
+            series.to_numpy(dtype="int64").tofile(self._handle("values"))
+        elif kind == FLOAT64:
+            values = pd.to_numeric(series, errors="coerce")
+            values.to_numpy(dtype="float64", na_value=np.nan).tofile(self._handle("values"))
+        elif kind == BOOL:
+            values = np.zeros(len(series), dtype=bool)
+            values[present] = series.to_numpy()[present].astype(bool)
+            values.tofile(self._handle("values"))
+            present.astype(np.uint8).tofile(self._handle("mask"))
+        else:
+            encoded = [str(value).encode("utf-8") if ok else b"" for value, ok in zip(series, present)]
+            lengths = np.fromiter((len(item) for item in encoded), dtype=np.int64, count=len(encoded))
+            ends = self._text_bytes + np.cumsum(lengths)
+            self._handle("values").write(b"".join(encoded))
+            ends.tofile(self._handle("offsets"))
+            present.astype(np.uint8).tofile(self._handle("mask"))
+            if len(ends):
+                self._text_bytes = int(ends[-1])
+        self.length += len(series)
+    
+    def append_reader(self, reader: 'ColumnReader'):
+        """Append a column stored by another writer, copying raw files when kinds match"""
+        if reader.length == 0:
+            return
+        self.lossy = self.lossy or reader.lossy
+        if self.kind is not None and self.kind != reader.kind:
+            # Kinds differ: go through the regular widening path block by block
+            for start in range(0, reader.length, _CONVERT_BLOCK_ROWS):
+                stop = min(start + _CONVERT_BLOCK_ROWS, reader.length)
+                self.append(pd.Series(reader.read(start, stop)))
+            return
+        
+        self.kind = reader.kind
+        with open(reader._path("values"), "rb") as f:
+            shutil.copyfileobj(f, self._handle("values"))
+        if self.kind in (BOOL, TEXT):
+            with open(reader._path("mask"), "rb") as f:
+                shutil.copyfileobj(f, self._handle("mask"))
+        if self.kind == TEXT:
+            ends = _memmap(reader._path("offsets"), "int64", reader.length)
+            for start in range(0, reader.length, _CONVERT_BLOCK_ROWS):
+                block = ends[start:start + _CONVERT_BLOCK_ROWS] + self._text_bytes
+                block.tofile(self._handle("offsets"))
+            self._text_bytes += int(ends[-1])
+        self.length += reader.length
+        self.has_values = self.has_values or reader.has_values()
+    
+    def _convert(self, target: str):
+        """Rewrite the values stored so far in a wider kind"""
+        if target == TEXT and self.has_values:
+            self.lossy = True
+        self.close()
+        staged = f"{self.file}.old"
+        for suffix in ("values", "offsets", "mask"):
+            if self._path(suffix).exists():
+                self._path(suffix).rename(self.directory / f"{staged}.{suffix}")
+        old = ColumnReader(self.directory / staged, self.kind, self.length)
+        
+        length = self.length
+        self.length = 0
+        self._text_bytes = 0
+        for start in range(0, length, _CONVERT_BLOCK_ROWS):
+            stop = min(start + _CONVERT_BLOCK_ROWS, length)
+            self._write(pd.Series(old.read(start, stop)), target)
+        self.close()
+        for path in self.directory.glob(f"{staged}.*"):
+            path.unlink()
+    
+    def clear(self):
+        """Drop the stored values, keeping the kind, to write them again"""
+        self.close()
+        for suffix in ("values", "offsets", "mask"):
+            self._path(suffix).unlink(missing_ok=True)
+        self.length = 0
+        self._text_bytes = 0
+    
+    def manifest_entry(self) -> Dict[str, Any]:
+        entry = {"name": self.name, "kind": self.kind or FLOAT64, "file": self.file}
+        if self.lossy:
+            entry["lossy"] = True
+        return entry
+
+
+class ColumnarWriter:
+    """
+    Builds a columnar store from parsed CSV chunks
+    
+    The store is written to a temporary directory and only renamed into
+    place by close(), so readers never see a half-written cache. With a
+    text ``source``, close() first rewrites the columns that turned into
+    text after numbers were stored in them, so they keep the spelling of
+    the CSV. Without one (partial stores of a parallel parse), such
+    columns are marked lossy in the manifest and fixed by the store they
+    are appended to.
+    """
+    
+    def __init__(self, path: Path, source: Optional[TextSource] = None):
+        self.path = path
+        self.source = source
+        self.tmp_path = path.with_name(path.name + ".tmp")
+        if self.tmp_path.exists():
+            shutil.rmtree(self.tmp_path)
+        self.tmp_path.mkdir(parents=True)
+        self.row_count = 0
+        self._columns: List[_ColumnWriter] = []
+    
+    def __enter__(self):
+        return self
+    
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.close()
+        else:
+            self.abort()
+    
+    def append(self, chunk: pd.DataFrame):
+        """Append a parsed chunk; the first chunk fixes the column list"""
+        if not self._columns:
+            self._columns = [
+                _ColumnWriter(self.tmp_path, index, str(name))
+                for index, name in enumerate(chunk.columns)
+            ]
+        for column, (_, series) in zip(self._columns, chunk.items()):
+            column.append(series)
+        self.row_count += len(chunk)
+    
+    def append_store(self, store: 'ColumnarStore'):
+        """
+        Append all rows of another store, e.g. one built for a later part
+        of the same file by a parallel worker
+        """
+        if not self._columns:
+            self._columns = [
+                _ColumnWriter(self.tmp_path, index, name)
+                for index, name in enumerate(store.columns)
+            ]
+        elif [column.name for column in self._columns] != store.columns:
+            raise ValueError("Cannot append a store with different columns")
+        for column in self._columns:
+            column.append_reader(store.reader(column.name))
+        self.row_count += store.row_count
+    
+    def close(self):
+        """Write the manifest and publish the store"""
+        for column in self._columns:
+            column.close()
+        lossy = [column for column in self._columns if column.lossy and column.kind == TEXT]
+        if lossy and self.source is not None:
+            self._rewrite_text(lossy)
+        manifest = {
+            "format_version": FORMAT_VERSION,
+            "row_count": self.row_count,
+            "columns": [column.manifest_entry() for column in self._columns],
+        }
+        with open(self.tmp_path / MANIFEST_FILE, "w") as f:
+            json.dump(manifest, f)
+        if self.path.exists():
+            shutil.rmtree(self.path)
+        self.tmp_path.rename(self.path)
+    
+    def _rewrite_text(self, columns: List[_ColumnWriter]):
+        """Rewrite text columns from the source, reading it once for all of them"""
+        for column in columns:
+            column.clear()
+        # pd.read_csv returns the selected columns in file order, like self._columns
+        for frame in self.source([column.index for column in columns]):
+            for column, (_, series) in zip(columns, frame.items()):
+                column._write(series, TEXT)
+        for column in columns:
+            column.close()
+            if column.length != self.row_count:
+                raise ValueError(
+                    f"Source of column '{column.name}' has {column.length} rows, expected {self.row_count}"
+                )
+            column.lossy = False
+    
+    def abort(self):
+        """Discard a partially written store"""
+        for column in self._columns:
+            column.close()
+        shutil.rmtree(self.tmp_path, ignore_errors=True)
+
+
+class ColumnReader:
+    """Reads row ranges of a single stored column"""
+    
+    def __init__(self, base: Path, kind: str, length: int, lossy: bool = False):
+        self.base = base
+        self.kind = kind
+        self.length = length
+        self.lossy = lossy
+    
+    def _path(self, suffix: str) -> Path:
+        return self.base.with_name(f"{self.base.name}.{suffix}")
+    
+    def has_values(self) -> bool:
+        """Check whether the column holds at least one non-missing value"""
+        if self.length == 0:
+            return False
+        if self.kind == INT64:
+            return True
+        if self.kind == FLOAT64:
+            return not np.isnan(_memmap(self._path("values"), FLOAT64, self.length)).all()
+        return bool(_memmap(self._path("mask"), "uint8", self.length).any())
+    
+    def read(self, start: int, stop: int) -> np.ndarray:
+        """
+        Return values for rows [start, stop)
+        
+        Numeric columns come back as copy-on-write views of the memory map;
+        missing bool and text values are returned as NaN like pd.read_csv.
+        """
+        if self.kind in (INT64, FLOAT64):
+            return _memmap(self._path("values"), self.kind, self.length)[start:stop]
+        
+        present = _memmap(self._path("mask"), "uint8", self.length)[start:stop].astype(bool)
+        if self.kind == BOOL:
+            values = _memmap(self._path("values"), "bool", self.length)[start:stop]
+            if present.all():
+                return values
+            result = values.astype(object)
+        else:
+            ends = _memmap(self._path("offsets"), "int64", self.length)
+            first = int(ends[start - 1]) if start > 0 else 0
+            last = int(ends[stop - 1]) if stop > start else first
+            with open(self._path("values"), "rb") as f:
+                f.seek(first)
+                buffer = memoryview(f.read(last - first))
+            bounds = np.concatenate(([first], ends[start:stop])) - first
+            result = np.array(
+                [bytes(buffer[a:b]).decode("utf-8") for a, b in zip(bounds[:-1], bounds[1:])],
+                dtype=object,
+            )
+        result[~present] = np.nan
+        return result
+
+
+class ColumnarStore:
+    """Read access to a columnar store written by ColumnarWriter"""
+    
+    def __init__(self, path: Path):
+        self.path = path
+        with open(path / MANIFEST_FILE, "r") as f:
+            self.manifest = json.load(f)
+        self.row_count: int = self.manifest["row_count"]
+        self._readers = {
+            entry["name"]: ColumnReader(
+                path / entry["file"], entry["kind"], self.row_count, entry.get("lossy", False)
+            )
+            for entry in self.manifest["columns"]
+        }
+    
+    @staticmethod
+    def exists(path: Path) -> bool:
+        """Check whether a complete store exists at path"""
+        return (path / MANIFEST_FILE).exists()
+    
+    @property
+    def columns(self) -> List[str]:
+        return list(self._readers)
+    
+    @property
+    def kinds(self) -> Dict[str, str]:
+        return {name: reader.kind for name, reader in self._readers.items()}
+    
+    def reader(self, name: str) -> ColumnReader:
+        """Get the reader of a single column"""
+        return self._readers[name]
+    
+    def read(
+        self,
+        columns: Optional[List[str]] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> pd.DataFrame:
+        """
+        Load rows [start, stop) of the selected columns as a DataFrame
+        
+        Args:
+            columns: Column names to load (default: all, in file order)
+            start: First row
+            stop: End row, exclusive (default: last row)
+        
+        Returns:
+            DataFrame equivalent to the matching slice of pd.read_csv
+        """
+        names = columns or self.columns
+        missing = [name for name in names if name not in self._readers]
+        if missing:
+            raise KeyError(f"Columns not found: {missing}")
+        
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        start = min(max(start, 0), stop)
+        data = {name: self._readers[name].read(start, stop) for name in names}
+        return pd.DataFrame(data, columns=names, index=pd.RangeIndex(start, stop), copy=False)
+    
+    def iter_chunks(
+        self,
+        chunksize: int,
+        columns: Optional[List[str]] = None,
+        start: int = 0,
+        stop: Optional[int] = None,
+    ) -> Iterator[pd.DataFrame]:
+        """Yield rows [start, stop) as consecutive DataFrames of at most chunksize rows"""
+        stop = self.row_count if stop is None else min(stop, self.row_count)
+        for chunk_start in range(start, stop, chunksize):
+            yield self.read(columns, chunk_start, min(chunk_start + chunksize, stop))
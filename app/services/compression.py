@@ -0,0 +1,165 @@
+"""Streaming decompression for compressed CSV uploads"""
+import bz2
+import zlib
+from pathlib import Path
+from typing import Iterator, Optional
+
+try:
+    import zstandard
+except ImportError:  # pragma: no cover - optional dependency
+    zstandard = None
+
+
+GZIP = "gzip"
+BZ2 = "bz2"
+ZSTD = "zstd"
+
+# File name suffix -> compression method
+SUFFIXES = {
+    ".gz": GZIP,
+    ".gzip": GZIP,
+    ".bz2": BZ2,
+    ".zst": ZSTD,
+    ".zstd": ZSTD,
+}
+
+# Content-Encoding token -> compression method
+CONTENT_ENCODINGS = {
+    "gzip": GZIP,
+    "x-gzip": GZIP,
+    "bzip2": BZ2,
+    "x-bzip2": BZ2,
+    "zstd": ZSTD,
+}
+
+# Canonical suffix used when a compressed upload is stored as-is
+STORED_SUFFIXES = {GZIP: ".gz", BZ2: ".bz2", ZSTD: ".zst"}
+
+# Upper bound on decompressed bytes produced per step, so a small highly
+# compressed chunk cannot expand into a huge buffer at once
+_MAX_OUTPUT = 1024 * 1024
+
+
+class UnsupportedCompressionError(Exception):
+    """Raised when an upload uses a compression this server cannot decode"""
+
+
+class CorruptCompressionError(ValueError):
+    """Raised when compressed upload data is invalid or truncated"""
+
+
+def detect_compression(filename: str, content_encoding: Optional[str] = None) -> Optional[str]:
+    """
+    Determine how an upload is compressed
+    
+    Args:
+        filename: Uploaded file name, e.g. ``data.csv.gz``
+        content_encoding: Content-Encoding header of the uploaded part
+    
+    Returns:
+        Compression method, or None for plain CSV
+    """
+    if content_encoding and content_encoding.strip().lower() not in ("", "identity"):
+        token = content_encoding.strip().lower()
+        if token not in CONTENT_ENCODINGS:
+            raise UnsupportedCompressionError(f"Unsupported Content-Encoding: {content_encoding}")
+        return CONTENT_ENCODINGS[token]
+    return SUFFIXES.get(Path(filename).suffix.lower())
+
+
+def strip_compression_suffix(filename: str) -> str:
+    """Drop a trailing compression suffix, e.g. ``data.csv.gz`` -> ``data.csv``"""
+    path = Path(filename)
+    if path.suffix.lower() in SUFFIXES:
+        return path.stem
+    return filename
+
+
+class StreamDecompressor:
+    """
+    Incremental decompressor fed one upload chunk at a time
+    
+    Concatenated gzip members and bzip2 streams are decoded as one stream,
+    matching the command line tools.
+    """
+    
+    def __init__(self, method: str):
+        if method == ZSTD and zstandard is None:
+            raise UnsupportedCompressionError(
+                "zstd uploads require the optional 'zstandard' package"
+            )
+        if method not in STORED_SUFFIXES:
+            raise UnsupportedCompressionError(f"Unsupported compression: {method}")
+        self.method = method
+        self._decoder = self._new_decoder()
+    
+    def _new_decoder(self):
+        if self.method == GZIP:
+            return zlib.decompressobj(wbits=zlib.MAX_WBITS | 16)
+        if self.method == BZ2:
+            return bz2.BZ2Decompressor()
+        return zstandard.ZstdDecompressor().decompressobj()
+    
+    def decompress(self, data: bytes) -> Iterator[bytes]:
+        """Yield the decompressed pieces of a chunk of compressed bytes"""
+        try:
+            if self.method == ZSTD:
+                yield from self._decompress_zstd(data)
+            elif self.method == GZIP:
+                yield from self._decompress_gzip(data)
+            else:
+                yield from self._decompress_bz2(data)
+        except (zlib.error, OSError, EOFError) as e:
+            raise CorruptCompressionError(f"Invalid {self.method} data: {e}")
+    
+    def _decompress_gzip(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            piece = self._decoder.decompress(data, _MAX_OUTPUT)
+            if piece:
+                yield piece
+            if self._decoder.eof:
+                # Next gzip member, if any
+                data = self._decoder.unused_data
+                if data:
+                    self._decoder = self._new_decoder()
+            else:
+                data = self._decoder.unconsumed_tail
+    
+    def _decompress_bz2(self, data: bytes) -> Iterator[bytes]:
+        while True:
+            if self._decoder.eof:
+                data = self._decoder.unused_data + data
+                if not data:
+                    return
+                self._decoder = self._new_decoder()
+            piece = self._decoder.decompress(data, _MAX_OUTPUT)
+            data = b""
+            if piece:
+                yield piece
+            if self._decoder.needs_input and not self._decoder.eof:
+                return
+    
+    def _decompress_zstd(self, data: bytes) -> Iterator[bytes]:
+        while data:
+            piece = self._decoder.decompress(data)
+            if piece:
+                yield piece
+            data = b""
+            if self._decoder.eof:
+                data = self._decoder.unused_data
+                if data:
+                    self._decoder = self._new_decoder()
+    
+    def finish(self) -> bytes:
+        """
+        Flush output still held by the decoder and check the stream was complete
+        
+        Returns:
+            Remaining decompressed bytes
+        """
+        tail = b""
+        if self.method == GZIP:
+            tail = self._decoder.flush()
+        if not self._decoder.eof:
+            raise CorruptCompressionError(f"Truncated {self.method} data")
+        return tail
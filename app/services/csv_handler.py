@@ -1,133 +1,651 @@
 """CSV handling service"""
 import os
 import uuid
+import shutil
+import hashlib
+import operator
 import pandas as pd
+from datetime import datetime, timezone
 from pathlib import Path
 from fastapi import UploadFile
-from typing import Dict, Any, Optional
-import json
+from starlette.datastructures import Headers
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, Iterator, List, Optional, Tuple, Union
+from app.config import settings
+from app.services.catalog import Catalog
+from app.services.columnar_store import ColumnarStore
+from app.services.ingest import ingest_csv, columnar_path_for, row_index_path_for
+from app.services.row_index import read_rows
+from app.services.csv_profiler import INTEGER, REAL, TEXT, DATETIME, BOOLEAN
+from app.services.compression import (
+    StreamDecompressor,
+    STORED_SUFFIXES,
+    detect_compression,
+)
+
+
+# (column, operator, value) row filters accepted by read_upload
+Filter = Tuple[str, str, Any]
+
+FILTER_OPERATORS = {
+    '==': operator.eq,
+    '!=': operator.ne,
+    '<': operator.lt,
+    '<=': operator.le,
+    '>': operator.gt,
+    '>=': operator.ge,
+    'in': lambda series, values: series.isin(values),
+    'not in': lambda series, values: ~series.isin(values),
+}
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+class UploadTooLargeError(Exception):
+    """Raised when an upload exceeds the configured size limit"""
 
 
 class CSVHandler:
     """Service for handling CSV file uploads and processing"""
     
-    def __init__(self, upload_dir: Path):
+    def __init__(
+        self,
+        upload_dir: Path,
+        max_upload_size: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+        max_content_size: Optional[int] = None,
+    ):
         self.upload_dir = upload_dir
         self.upload_dir.mkdir(exist_ok=True)
-        self.metadata_file = self.upload_dir / "metadata.json"
-        self._load_metadata()
-    
-    def _load_metadata(self):
-        """Load metadata from file"""
-        if self.metadata_file.exists():
-            with open(self.metadata_file, 'r') as f:
-                self.metadata = json.load(f)
-        else:
-            self.metadata = {}
+        self.max_upload_size = max_upload_size or settings.max_upload_size
+        self.chunk_size = chunk_size or settings.upload_chunk_size
+        self.max_content_size = max_content_size or settings.max_content_size
+        self.catalog = Catalog(
+            self.upload_dir / "catalog.db",
+            indexed=('filename', 'content_hash', 'aliased_from'),
+        )
+        # Uploads recorded before the catalog existed
+        self.catalog.migrate_json(self.upload_dir / "metadata.json")
     
-    def _save_metadata(self):
-        """Save metadata to file"""
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+    async def _stream_to_disk(
+        self,
+        file: UploadFile,
+        file_path: Path,
+        compression: Optional[str] = None,
+        keep_compressed: bool = False,
+    ) -> Dict[str, Any]:
+        """
+        Copy an upload to disk in fixed-size chunks
+        
+        Only one chunk is held in memory at a time, and the size limits are
+        enforced while bytes arrive rather than after the whole body is read.
+        Compressed uploads are decompressed on the fly; the content hash is
+        always computed over the decompressed CSV bytes. Decompressing,
+        hashing and writing run on the thread pool, so only reading the
+        body happens on the event loop.
+        
+        Args:
+            file: Uploaded file
+            file_path: Destination path
+            compression: Compression method of the upload, if any
+            keep_compressed: Store the compressed bytes instead of the CSV text
+        
+        Returns:
+            Dictionary with file_size (bytes stored), content_size (CSV bytes)
+            and content_hash (BLAKE2b hex digest of the CSV bytes)
+        """
+        # Reject early when the client declared the size up front
+        if file.size is not None and file.size > self.max_upload_size:
+            raise UploadTooLargeError(
+                f"File exceeds maximum upload size of {self.max_upload_size} bytes"
+            )
+        
+        decompressor = StreamDecompressor(compression) if compression else None
+        bytes_received = 0
+        content_size = 0
+        hasher = hashlib.blake2b()
+        
+        def consume(data: bytes, f):
+            nonlocal content_size
+            content_size += len(data)
+            if content_size > self.max_content_size:
+                raise UploadTooLargeError(
+                    f"Decompressed file exceeds maximum size of {self.max_content_size} bytes"
+                )
+            hasher.update(data)
+            if not keep_compressed:
+                f.write(data)
+        
+        def store(chunk: bytes, f):
+            if decompressor is None:
+                consume(chunk, f)
+                return
+            for piece in decompressor.decompress(chunk):
+                consume(piece, f)
+            if keep_compressed:
+                f.write(chunk)
+        
+        try:
+            with open(file_path, 'wb') as f:
+                while True:
+                    chunk = await file.read(self.chunk_size)
+                    if not chunk:
+                        break
+                    bytes_received += len(chunk)
+                    if bytes_received > self.max_upload_size:
+                        raise UploadTooLargeError(
+                            f"File exceeds maximum upload size of {self.max_upload_size} bytes"
+                        )
+                    await run_in_threadpool(store, chunk, f)
+                if decompressor is not None:
+                    await run_in_threadpool(lambda: consume(decompressor.finish(), f))
+                file_size = f.tell()
+        except BaseException:
+            # Never leave a partial upload behind
+            file_path.unlink(missing_ok=True)
+            raise
+        
+        return {
+            'file_size': file_size,
+            'content_size': content_size,
+            'content_hash': hasher.hexdigest(),
+        }
     
-    async def save_csv(self, file: UploadFile) -> Dict[str, Any]:
+    async def receive_upload(
+        self,
+        file: UploadFile,
+        keep_compressed: Optional[bool] = None,
+    ) -> Dict[str, Any]:
         """
-        Save uploaded CSV file and extract metadata
+        Stream an upload to disk under a new file ID without analyzing it
         
         Args:
-            file: Uploaded CSV file
-            
+            file: Uploaded CSV file, optionally gzip/bzip2/zstd compressed
+            keep_compressed: Store compressed uploads as-is (defaults to
+                settings.store_compressed_uploads)
+        
         Returns:
-            Dictionary containing file metadata and preview
+            Dictionary with file_id, filename, file_path, file_size,
+            content_size, content_hash and the stored compression
         """
+        compression = detect_compression(file.filename, file.headers.get('content-encoding'))
+        if keep_compressed is None:
+            keep_compressed = settings.store_compressed_uploads
+        keep_compressed = bool(compression) and keep_compressed
+        
         # Generate unique file ID
         file_id = str(uuid.uuid4())
         
-        # Save file
+        # Stream file to disk
         file_path = self.upload_dir / f"{file_id}.csv"
-        content = await file.read()
-        
-        with open(file_path, 'wb') as f:
-            f.write(content)
-        
-        # Read and analyze CSV
-        df = pd.read_csv(file_path)
-        
-        # Get column types
-        column_types = {}
-        for col in df.columns:
-            dtype = str(df[col].dtype)
-            # Map pandas dtypes to SQL-like types
-            if dtype.startswith('int'):
-                column_types[col] = 'INTEGER'
-            elif dtype.startswith('float'):
-                column_types[col] = 'REAL'
-            elif dtype.startswith('datetime'):
-                column_types[col] = 'DATETIME'
-            elif dtype.startswith('bool'):
-                column_types[col] = 'BOOLEAN'
-            else:
-                column_types[col] = 'TEXT'
-        
-        # Create preview (first 5 rows)
-        preview = df.head(5).to_dict('records')
+        if keep_compressed:
+            file_path = file_path.with_name(file_path.name + STORED_SUFFIXES[compression])
+        stats = await self._stream_to_disk(file, file_path, compression, keep_compressed)
         
-        # Store metadata
-        metadata = {
+        return {
             'file_id': file_id,
             'filename': file.filename,
             'file_path': str(file_path),
-            'row_count': len(df),
-            'column_count': len(df.columns),
-            'columns': df.columns.tolist(),
-            'column_types': column_types,
-            'preview': preview,
+            'compression': compression if keep_compressed else None,
+            **stats,
+        }
+    
+    def find_ingested(self, content_hash: str) -> Optional[Dict[str, Any]]:
+        """
+        Find an ingested upload with identical content whose artifacts still exist
+        
+        Args:
+            content_hash: Content hash of an upload
+        
+        Returns:
+            Metadata of the upload owning the stored bytes, or None
+        """
+        matches = self.catalog.list({'content_hash': content_hash, 'aliased_from': None}, limit=1)
+        if not matches:
+            return None
+        info = matches[0]
+        if not Path(info['file_path']).exists():
+            return None
+        columnar_path = info.get('columnar_path')
+        if columnar_path and not ColumnarStore.exists(Path(columnar_path)):
+            return None
+        return info
+    
+    def register_alias(self, upload: Dict[str, Any], original: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a duplicate upload as a new file ID sharing the original's artifacts
+        
+        The freshly received copy is deleted; the stored profile, preview and
+        columnar cache of the original are reused without re-parsing.
+        
+        Args:
+            upload: Dictionary returned by receive_upload
+            original: Metadata returned by find_ingested
+        
+        Returns:
+            Dictionary containing file metadata and preview
+        """
+        Path(upload['file_path']).unlink(missing_ok=True)
+        
+        metadata = dict(original)
+        metadata.update({
+            'file_id': upload['file_id'],
+            'filename': upload['filename'],
+            'aliased_from': original['file_id'],
+            'created_at': _now(),
+        })
+        self.catalog.put(upload['file_id'], metadata)
+        
+        return self._upload_result(metadata, deduplicated=True)
+    
+    def register_upload(self, upload: Dict[str, Any], profile: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record metadata for an ingested upload
+        
+        Safe to call from job completion callbacks running off the event loop.
+        
+        Args:
+            upload: Dictionary returned by receive_upload
+            profile: Profile returned by ingest_csv
+        
+        Returns:
+            Dictionary containing file metadata and preview
+        """
+        file_id = upload['file_id']
+        
+        # Store metadata
+        metadata = {
+            'file_id': file_id,
+            'filename': upload['filename'],
+            'file_path': upload['file_path'],
+            'file_size': upload['file_size'],
+            'content_size': upload.get('content_size'),
+            'compression': upload.get('compression'),
+            'content_hash': upload.get('content_hash'),
+            'columnar_path': profile['columnar_path'],
+            'row_index_path': profile.get('row_index_path'),
+            'row_index_stride': profile.get('row_index_stride'),
+            'row_count': profile['row_count'],
+            'column_count': profile['column_count'],
+            'columns': profile['columns'],
+            'column_types': profile['column_types'],
+            'null_counts': profile['null_counts'],
+            'distinct_ratios': profile.get('distinct_ratios'),
+            'preview': profile['preview'],
         }
         # Backwards compatible key for older metadata readers
         metadata['filepath'] = metadata['file_path']
+        metadata['created_at'] = _now()
         
-        self.metadata[file_id] = metadata
-        self._save_metadata()
+        self.catalog.put(file_id, metadata)
         
+        return self._upload_result(metadata)
+    
+    def _upload_result(self, metadata: Dict[str, Any], deduplicated: bool = False) -> Dict[str, Any]:
+        """Build the upload response fields from stored metadata"""
         return {
-            'file_id': file_id,
-            'filename': file.filename,
-            'row_count': len(df),
-            'column_count': len(df.columns),
-            'columns': df.columns.tolist(),
-            'preview': preview,
-            'column_types': column_types,
+            'file_id': metadata['file_id'],
+            'filename': metadata['filename'],
+            'row_count': metadata['row_count'],
+            'column_count': metadata['column_count'],
+            'columns': metadata['columns'],
+            'preview': metadata['preview'],
+            'column_types': metadata['column_types'],
+            'deduplicated': deduplicated,
         }
     
+    def discard_upload(self, upload: Dict[str, Any]):
+        """Remove the files of an upload that failed to ingest"""
+        file_path = Path(upload['file_path'])
+        file_path.unlink(missing_ok=True)
+        shutil.rmtree(columnar_path_for(file_path), ignore_errors=True)
+        row_index_path_for(file_path).unlink(missing_ok=True)
+    
+    async def receive_assembled(
+        self,
+        session: Dict[str, Any],
+        keep_compressed: Optional[bool] = None,
+    ) -> Dict[str, Any]:
+        """
+        Take over the data file of a finalized chunked upload session
+        
+        Uncompressed files are moved into place with the hash computed while
+        the chunks arrived; compressed ones are decompressed like a regular
+        upload.
+        
+        Args:
+            session: Record returned by UploadSessionManager.finalize
+            keep_compressed: Store compressed uploads as-is (see receive_upload)
+        
+        Returns:
+            Dictionary in the format returned by receive_upload
+        """
+        if session['compression'] is None:
+            file_id = str(uuid.uuid4())
+            file_path = self.upload_dir / f"{file_id}.csv"
+            os.replace(session['data_path'], file_path)
+            return {
+                'file_id': file_id,
+                'filename': session['filename'],
+                'file_path': str(file_path),
+                'compression': None,
+                'file_size': session['total_size'],
+                'content_size': session['total_size'],
+                'content_hash': session['content_hash'],
+            }
+        
+        headers = {}
+        if session['content_encoding']:
+            headers['content-encoding'] = session['content_encoding']
+        with open(session['data_path'], 'rb') as f:
+            file = UploadFile(
+                f,
+                size=session['total_size'],
+                filename=session['filename'],
+                headers=Headers(headers),
+            )
+            return await self.receive_upload(file, keep_compressed)
+    
+    async def ingest_upload(self, upload: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Profile and cache a received upload, reusing identical earlier uploads
+        
+        Args:
+            upload: Dictionary returned by receive_upload
+        
+        Returns:
+            Dictionary containing file metadata and preview
+        """
+        # Identical content was already ingested: reuse its artifacts
+        original = self.find_ingested(upload['content_hash'])
+        if original:
+            return self.register_alias(upload, original)
+        
+        # Profile CSV and build its columnar cache in a single chunked pass,
+        # off the event loop so other requests keep being served
+        try:
+            profile = await run_in_threadpool(ingest_csv, Path(upload['file_path']))
+        except Exception:
+            self.discard_upload(upload)
+            raise
+        
+        return self.register_upload(upload, profile)
+    
+    async def save_csv(self, file: UploadFile, keep_compressed: Optional[bool] = None) -> Dict[str, Any]:
+        """
+        Save uploaded CSV file and extract metadata
+        
+        Args:
+            file: Uploaded CSV file, optionally compressed
+            keep_compressed: Store compressed uploads as-is (see receive_upload)
+        
+        Returns:
+            Dictionary containing file metadata and preview
+        """
+        upload = await self.receive_upload(file, keep_compressed)
+        return await self.ingest_upload(upload)
+    
     def get_csv_info(self, file_id: str) -> Optional[Dict[str, Any]]:
         """
         Get metadata for a specific CSV file
         
         Args:
             file_id: ID of the file
-            
+        
         Returns:
             Metadata dictionary or None if not found
         """
-        self._load_metadata()
-        return self.metadata.get(file_id)
+        return self.catalog.get(file_id)
     
-    def get_dataframe(self, file_id: str) -> Optional[pd.DataFrame]:
+    def list_files(
+        self,
+        filename: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        List uploads in upload order
+        
+        Args:
+            filename: Only uploads with this original file name
+            limit: Maximum number of uploads to return
+            offset: Number of uploads to skip
+        
+        Returns:
+            Tuple of (upload metadata, total number of matching uploads)
+        """
+        filters = {'filename': filename} if filename is not None else None
+        return self.catalog.list(filters, limit, offset), self.catalog.count(filters)
+    
+    def get_dataframe(
+        self,
+        file_id: str,
+        columns: Optional[List[str]] = None,
+        nrows: Optional[int] = None,
+        skiprows: int = 0,
+        filters: Optional[List[Filter]] = None,
+        chunksize: Optional[int] = None,
+    ) -> Optional[Union[pd.DataFrame, Iterator[pd.DataFrame]]]:
         """
         Load CSV file as pandas DataFrame
         
         Args:
             file_id: ID of the file
-            
+            columns: Columns to load, in this order (default: all)
+            nrows: Number of rows to read (default: all)
+            skiprows: Number of data rows to skip first
+            filters: Row filters as (column, operator, value) tuples, see
+                FILTER_OPERATORS; all must hold
+            chunksize: Return an iterator of DataFrames of at most this many
+                rows instead of one DataFrame
+        
+        Returns:
+            DataFrame (or iterator of DataFrames) or None if not found
+        """
+        info = self.get_csv_info(file_id)
+        if not info:
+            return None
+        
+        return read_upload(
+            info,
+            columns=columns,
+            nrows=nrows,
+            skiprows=skiprows,
+            filters=filters,
+            chunksize=chunksize,
+        )
+    
+    def get_rows(self, file_id: str, offset: int, limit: int) -> Optional[Dict[str, Any]]:
+        """
+        Get one page of rows of an uploaded CSV
+        
+        Uses the row-offset index to parse only the requested rows; uploads
+        without an index are sliced from the columnar cache instead.
+        
+        Args:
+            file_id: ID of the file
+            offset: First row to return (0-based, excluding the header)
+            limit: Maximum number of rows to return
+        
         Returns:
-            DataFrame or None if not found
+            Dictionary with the page rows and total row count, or None if
+            the file is not found
         """
         info = self.get_csv_info(file_id)
         if not info:
             return None
+        
+        total_rows = info['row_count']
+        stop = min(offset + limit, total_rows)
+        if offset >= stop:
+            df = pd.DataFrame(columns=info['columns'])
+        elif info.get('row_index_path') and Path(info['row_index_path']).exists():
+            df = read_rows(
+                Path(info['file_path']),
+                Path(info['row_index_path']),
+                info['row_index_stride'],
+                offset,
+                stop - offset,
+                dtype=_dtype_hints(info, None),
+            )
+        elif info.get('columnar_path') and ColumnarStore.exists(Path(info['columnar_path'])):
+            df = ColumnarStore(Path(info['columnar_path'])).read(start=offset, stop=stop)
+        else:
+            df = pd.read_csv(
+                info['file_path'],
+                skiprows=range(1, offset + 1),
+                nrows=stop - offset,
+                dtype=_dtype_hints(info, None),
+            )
+        
+        return {
+            'file_id': file_id,
+            'offset': offset,
+            'limit': limit,
+            'total_rows': total_rows,
+            'columns': info['columns'],
+            # JSON has no NaN: report missing values as null
+            'rows': df.astype(object).where(df.notna(), None).to_dict('records'),
+        }
 
+
+def read_upload(
+    info: Dict[str, Any],
+    columns: Optional[List[str]] = None,
+    nrows: Optional[int] = None,
+    skiprows: int = 0,
+    filters: Optional[List[Filter]] = None,
+    chunksize: Optional[int] = None,
+) -> Optional[Union[pd.DataFrame, Iterator[pd.DataFrame]]]:
+    """
+    Load an upload from its columnar cache, falling back to the CSV text
+    
+    Numeric columns of the cached frame are copy-on-write memory maps, so
+    loading does not parse or copy the data up front, and only the selected
+    columns are touched. Uploads without a cache are parsed with ``usecols``
+    and dtypes taken from the stored column types, skipping type inference.
+    
+    ``skiprows`` and ``nrows`` select file rows before filters are applied,
+    as with pd.read_csv; the index counts rows from the first one read.
+    
+    Args:
+        info: Upload metadata
+        columns: Columns to load, in this order (default: all)
+        nrows: Number of rows to read (default: all)
+        skiprows: Number of data rows to skip first
+        filters: Row filters as (column, operator, value) tuples
+        chunksize: Yield DataFrames of at most this many rows instead
+    
+    Returns:
+        DataFrame, iterator of DataFrames when chunksize is given, or None
+        if the metadata has no file path
+    """
+    filters = filters or []
+    for _, op, _ in filters:
+        if op not in FILTER_OPERATORS:
+            raise ValueError(f"Unsupported filter operator: {op}")
+    
+    selected = list(columns) if columns else None
+    needed = None
+    if selected is not None:
+        needed = selected + [name for name, _, _ in filters if name not in selected]
+    known = info.get('columns')
+    if known is not None:
+        referenced = (selected or []) + [name for name, _, _ in filters]
+        missing = [name for name in referenced if name not in known]
+        if missing:
+            raise KeyError(f"Columns not found: {missing}")
+    
+    columnar_path = info.get('columnar_path')
+    if columnar_path and ColumnarStore.exists(Path(columnar_path)):
+        store = ColumnarStore(Path(columnar_path))
+        stop = None if nrows is None else skiprows + nrows
+        if chunksize:
+            chunks = store.iter_chunks(chunksize, needed, skiprows, stop)
+        else:
+            chunks = iter([store.read(needed, skiprows, stop)])
+        chunks = (_shift_index(chunk, skiprows) for chunk in chunks)
+    else:
+        # Uploads ingested before the columnar cache existed
         file_path = info.get('file_path') or info.get('filepath')
         if not file_path:
             return None
+        chunks = _read_csv_chunks(file_path, info, needed, nrows, skiprows, chunksize)
+    
+    frames = (_select(chunk, filters, selected) for chunk in chunks)
+    if chunksize:
+        return frames
+    return next(frames)
+
+
+def _shift_index(df: pd.DataFrame, skiprows: int) -> pd.DataFrame:
+    """Number rows from the first one read, like pd.read_csv with skiprows"""
+    if skiprows:
+        df.index = df.index - skiprows
+    return df
+
+
+def _read_csv_chunks(
+    file_path: str,
+    info: Dict[str, Any],
+    columns: Optional[List[str]],
+    nrows: Optional[int],
+    skiprows: int,
+    chunksize: Optional[int],
+) -> Iterator[pd.DataFrame]:
+    """Parse only the needed columns of a CSV with dtypes from its profile"""
+    reader = pd.read_csv(
+        file_path,
+        usecols=columns,
+        dtype=_dtype_hints(info, columns),
+        skiprows=range(1, skiprows + 1) if skiprows else None,
+        nrows=nrows,
+        chunksize=chunksize,
+    )
+    if not chunksize:
+        yield reader
+        return
+    with reader:
+        yield from reader
+
+
+def _dtype_hints(info: Dict[str, Any], columns: Optional[List[str]]) -> Dict[str, str]:
+    """
+    Map stored column types to the dtypes pd.read_csv would infer
+    
+    Integer and boolean columns need the null counts to know whether the
+    column would come back as a nullable dtype; without them no hint is given.
+    """
+    column_types = info.get('column_types') or {}
+    null_counts = info.get('null_counts')
+    hints = {}
+    for name in columns or info.get('columns') or []:
+        column_type = column_types.get(name)
+        has_nulls = None if null_counts is None else null_counts.get(name, 0) > 0
+        if column_type == REAL:
+            hints[name] = 'float64'
+        elif column_type in (TEXT, DATETIME):
+            hints[name] = 'object'
+        elif column_type == INTEGER and has_nulls is not None:
+            hints[name] = 'float64' if has_nulls else 'int64'
+        elif column_type == BOOLEAN and has_nulls is not None:
+            hints[name] = 'boolean' if has_nulls else 'bool'
+    return hints
+
 
-        return pd.read_csv(file_path)
+def _select(
+    df: pd.DataFrame,
+    filters: List[Filter],
+    columns: Optional[List[str]],
+) -> pd.DataFrame:
+    """Apply row filters, then keep the selected columns in the requested order"""
+    if filters:
+        mask = pd.Series(True, index=df.index)
+        for name, op, value in filters:
+            mask &= FILTER_OPERATORS[op](df[name], value)
+        df = df[mask]
+    if columns is not None:
+        df = df[columns]
+    return df
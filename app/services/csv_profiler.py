@@ -0,0 +1,234 @@
+"""Streaming column profiler for CSV files"""
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, List, Optional
+from app.config import settings
+
+
+# SQL-like column types reported to clients
+INTEGER = 'INTEGER'
+REAL = 'REAL'
+TEXT = 'TEXT'
+DATETIME = 'DATETIME'
+BOOLEAN = 'BOOLEAN'
+
+PREVIEW_ROWS = 5
+
+# Hashes kept per column for distinct-value estimates
+SKETCH_SIZE = 1024
+# Values per chunk and column fed to the distinct-value sketches
+SKETCH_SAMPLE_ROWS = 8192
+
+
+def promote_type(current: Optional[str], new: Optional[str]) -> Optional[str]:
+    """
+    Combine the types observed for one column in two chunks
+    
+    None means the chunk held only nulls and says nothing about the type.
+    Numeric types widen INTEGER -> REAL; any other disagreement falls back
+    to TEXT, which every value can be stored as.
+    """
+    if current is None:
+        return new
+    if new is None or current == new:
+        return current
+    if {current, new} == {INTEGER, REAL}:
+        return REAL
+    return TEXT
+
+
+def _looks_like_datetime(values: pd.Series) -> bool:
+    """Check whether every (non-null) string value parses as an ISO 8601 timestamp"""
+    parsed = pd.to_datetime(values, format='ISO8601', errors='coerce')
+    return not parsed.isna().any()
+
+
+def infer_chunk_type(series: pd.Series) -> Optional[str]:
+    """
+    Infer the SQL-like type of one column within a single chunk
+    
+    Args:
+        series: Column values of the chunk
+    
+    Returns:
+        Type name, or None when the chunk contains only nulls
+    """
+    values = series.dropna()
+    if values.empty:
+        return None
+    
+    dtype = str(series.dtype)
+    # Map pandas dtypes to SQL-like types
+    if dtype.startswith('int'):
+        return INTEGER
+    if dtype.startswith('float'):
+        return REAL
+    if dtype.startswith('datetime'):
+        return DATETIME
+    if dtype.startswith('bool'):
+        return BOOLEAN
+    
+    # Object columns: booleans mixed with nulls, timestamps, or free text
+    inferred = pd.api.types.infer_dtype(values, skipna=True)
+    if inferred == 'boolean':
+        return BOOLEAN
+    if inferred == 'string' and _looks_like_datetime(values):
+        return DATETIME
+    return TEXT
+
+
+class DistinctSketch:
+    """
+    K-minimum-values estimate of the share of distinct values in a column
+    
+    Only the k smallest 64-bit hashes are kept, so memory is bounded and
+    sketches of consecutive parts of a file merge exactly. At most
+    SKETCH_SAMPLE_ROWS evenly spaced values of each chunk are hashed, which
+    keeps the cost small next to parsing: the ratio is exact for small
+    files and an estimate for large ones.
+    """
+    
+    def __init__(self, k: int = SKETCH_SIZE):
+        self.k = k
+        self.hashes = np.empty(0, dtype=np.uint64)
+        self.count = 0
+    
+    def update(self, series: pd.Series):
+        """Add the non-null values of a chunk"""
+        values = series.dropna()
+        if len(values) > SKETCH_SAMPLE_ROWS:
+            values = values.iloc[::-(-len(values) // SKETCH_SAMPLE_ROWS)]
+        if values.empty:
+            return
+        if pd.api.types.is_numeric_dtype(values) and not pd.api.types.is_bool_dtype(values):
+            # 1 and 1.0 from differently typed chunks are the same value
+            values = values.astype('float64')
+        self.count += len(values)
+        self._add(pd.util.hash_array(values.to_numpy(), categorize=False))
+    
+    def merge(self, other: 'DistinctSketch'):
+        """Fold in the sketch of another part of the column"""
+        self.count += other.count
+        self._add(other.hashes)
+    
+    def _add(self, hashes: np.ndarray):
+        if len(self.hashes) == self.k:
+            hashes = hashes[hashes < self.hashes[-1]]
+        self.hashes = np.unique(np.concatenate([self.hashes, hashes]))[:self.k]
+    
+    @property
+    def distinct_ratio(self) -> Optional[float]:
+        """Distinct values per non-null value seen (1.0 = all distinct), None if all null"""
+        if not self.count:
+            return None
+        if len(self.hashes) < self.k:
+            distinct = len(self.hashes)
+        else:
+            distinct = (self.k - 1) / (float(self.hashes[-1]) / 2.0 ** 64)
+        return round(min(1.0, distinct / self.count), 4)
+
+
+class CSVProfiler:
+    """Incrementally profiles a CSV file one chunk at a time"""
+    
+    def __init__(self):
+        self.columns: List[str] = []
+        self.row_count = 0
+        self.preview: List[Dict[str, Any]] = []
+        self.null_counts: Dict[str, int] = {}
+        self._types: Dict[str, Optional[str]] = {}
+        self._sketches: Dict[str, DistinctSketch] = {}
+    
+    def update(self, chunk: pd.DataFrame):
+        """Fold a parsed chunk into the running profile"""
+        if not self.columns:
+            self.columns = chunk.columns.tolist()
+            self._types = {col: None for col in self.columns}
+            self.null_counts = {col: 0 for col in self.columns}
+            self._sketches = {col: DistinctSketch() for col in self.columns}
+        
+        if len(self.preview) < PREVIEW_ROWS:
+            needed = PREVIEW_ROWS - len(self.preview)
+            self.preview.extend(chunk.head(needed).to_dict('records'))
+        
+        self.row_count += len(chunk)
+        
+        for col in self.columns:
+            series = chunk[col]
+            self.null_counts[col] += int(series.isna().sum())
+            self._sketches[col].update(series)
+            # TEXT is terminal, skip inference work for the rest of the file
+            if self._types[col] == TEXT:
+                continue
+            self._types[col] = promote_type(self._types[col], infer_chunk_type(series))
+    
+    def merge(self, other: 'CSVProfiler'):
+        """
+        Fold in the profile of rows that directly follow this profile's rows
+        
+        Used to combine profiles built in parallel over consecutive parts
+        of one file; merging in file order keeps the preview correct.
+        """
+        if not other.columns:
+            return
+        if not self.columns:
+            self.columns = list(other.columns)
+            self._types = {col: None for col in self.columns}
+            self.null_counts = {col: 0 for col in self.columns}
+            self._sketches = {col: DistinctSketch() for col in self.columns}
+        elif other.columns != self.columns:
+            raise ValueError("Cannot merge profiles with different columns")
+        
+        if len(self.preview) < PREVIEW_ROWS:
+            self.preview.extend(other.preview[:PREVIEW_ROWS - len(self.preview)])
+        
+        self.row_count += other.row_count
+        for col in self.columns:
+            self.null_counts[col] += other.null_counts[col]
+            self._types[col] = promote_type(self._types[col], other._types[col])
+            self._sketches[col].merge(other._sketches[col])
+    
+    @property
+    def column_types(self) -> Dict[str, str]:
+        """Final column types; all-null columns default to TEXT"""
+        return {col: self._types[col] or TEXT for col in self.columns}
+    
+    def result(self) -> Dict[str, Any]:
+        """
+        Summarize the profile
+        
+        Returns:
+            Dictionary with row count, columns, column types, null counts,
+            distinct-value ratios and preview
+        """
+        return {
+            'row_count': self.row_count,
+            'column_count': len(self.columns),
+            'columns': self.columns,
+            'column_types': self.column_types,
+            'null_counts': self.null_counts,
+            'distinct_ratios': {col: self._sketches[col].distinct_ratio for col in self.columns},
+            'preview': self.preview,
+        }
+
+
+def profile_csv(file_path: Path, chunksize: Optional[int] = None) -> Dict[str, Any]:
+    """
+    Profile a CSV file in a single streaming pass
+    
+    The file is parsed ``chunksize`` rows at a time so memory use stays
+    constant regardless of file size.
+    
+    Args:
+        file_path: Path to the CSV file
+        chunksize: Rows per chunk (defaults to settings.profile_chunk_size)
+    
+    Returns:
+        Profile dictionary (see CSVProfiler.result)
+    """
+    profiler = CSVProfiler()
+    with pd.read_csv(file_path, chunksize=chunksize or settings.profile_chunk_size) as reader:
+        for chunk in reader:
+            profiler.update(chunk)
+    return profiler.result()
@@ -1,12 +1,32 @@
 """Database service for creating and managing SQLite databases"""
 import os
+import json
 import uuid
-import sqlite3
-import pandas as pd
+import shutil
+import hashlib
+from datetime import datetime, timezone
 from pathlib import Path
-from typing import Dict, Any, List
-import json
+from typing import Dict, Any, List, Optional, Tuple, Callable
 import re
+from app.config import settings
+from app.services.catalog import Catalog
+from app.services.csv_handler import read_upload
+from app.services.bulk_loader import bulk_load, bulk_append
+from app.services.index_advisor import optimize_database, refresh_statistics
+from app.services.parallel_load import load_tables
+
+
+# Quoted strings and identifiers, whose text must stay as written
+SQL_QUOTED = re.compile(r"""('(?:[^']|'')*'|"(?:[^"]|"")*"|`[^`]*`|\[[^\]]*\])""")
+SQL_COMMENT = re.compile(r"--[^\n]*|/\*.*?\*/", re.DOTALL)
+
+
+class DatabaseExistsError(Exception):
+    """Raised when a requested database name is already taken"""
+
+
+class DatabaseNotFoundError(KeyError):
+    """Raised when a database ID names no existing database"""
 
 
 class DatabaseService:
@@ -15,21 +35,9 @@ class DatabaseService:
     def __init__(self, db_dir: Path):
         self.db_dir = db_dir
         self.db_dir.mkdir(exist_ok=True)
-        self.metadata_file = self.db_dir / "db_metadata.json"
-        self._load_metadata()
-    
-    def _load_metadata(self):
-        """Load database metadata"""
-        if self.metadata_file.exists():
-            with open(self.metadata_file, 'r') as f:
-                self.metadata = json.load(f)
-        else:
-            self.metadata = {}
-    
-    def _save_metadata(self):
-        """Save database metadata"""
-        with open(self.metadata_file, 'w') as f:
-            json.dump(self.metadata, f, indent=2)
+        self.catalog = Catalog(self.db_dir / "catalog.db", indexed=("file_id", "table_name", "build_key"))
+        # Databases recorded before the catalog existed
+        self.catalog.migrate_json(self.db_dir / "db_metadata.json")
     
     def generate_basic_schema(self, csv_info: Dict[str, Any]) -> str:
         """
@@ -37,26 +45,28 @@ class DatabaseService:
         
         Args:
             csv_info: CSV file metadata
-            
+        
         Returns:
             SQL CREATE TABLE statement
         """
         # Use filename (without extension) as table name
         table_name = Path(csv_info['filename']).stem.replace(' ', '_').replace('-', '_')
         
-        # Build columns
+        # Build columns, with a surrogate key unless the CSV has an id column
         columns = []
-        columns.append("id INTEGER PRIMARY KEY AUTOINCREMENT")
+        clean_names = [
+            col_name.replace(' ', '_').replace('-', '_')
+            for col_name in csv_info['column_types']
+        ]
+        if "id" not in {name.lower() for name in clean_names}:
+            columns.append("id INTEGER PRIMARY KEY AUTOINCREMENT")
         
         # Add columns from CSV
-        for col_name, col_type in csv_info['column_types'].items():
-            # Clean column name (replace spaces with underscores)
-            clean_name = col_name.replace(' ', '_').replace('-', '_')
-            
+        for clean_name, col_type in zip(clean_names, csv_info['column_types'].values()):
             # Map pandas types to SQLite types
             if col_type.lower() in ['int64', 'integer']:
                 sql_type = "INTEGER"
-            elif col_type.lower() in ['float64', 'float']:
+            elif col_type.lower() in ['float64', 'float', 'real']:
                 sql_type = "REAL"
             else:
                 sql_type = "TEXT"
@@ -69,12 +79,153 @@ class DatabaseService:
         
         return schema
     
+    def _database_path(self, file_id: str, db_name: Optional[str], database_id: str) -> Path:
+        if db_name:
+            return self.db_dir / f"{db_name}.db"
+        path = self.db_dir / f"{file_id}.db"
+        if path.exists():
+            # Another database of this upload already has the default name
+            path = self.db_dir / f"{file_id}-{database_id[:8]}.db"
+        return path
+    
+    def _reserve(self, path: Path):
+        """Create the database file, so two builds never share a path"""
+        try:
+            open(path, "x").close()
+        except FileExistsError:
+            raise DatabaseExistsError(f"Database '{path.stem}' already exists")
+    
+    def plan_build(
+        self,
+        file_id: str,
+        schema: str,
+        db_name: str = None,
+        build_key: Optional[str] = None,
+        sources: Optional[Dict[str, Dict[str, Any]]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Choose the ID, path and table of a new database and claim its file
+        
+        Args:
+            file_id: ID of the CSV file
+            schema: SQL CREATE TABLE statement
+            db_name: Optional custom database name
+            build_key: Key of the build inputs (see build_key), if cacheable
+            sources: Table name -> upload metadata of a multi-table build
+        
+        Returns:
+            Dictionary with database_id, file_id, database_path, table_name
+            and build_key, plus the tables of a multi-table build
+        
+        Raises:
+            DatabaseExistsError: If a database named db_name exists
+        """
+        tables = None
+        if sources:
+            # The table of the main upload stands for the database in listings
+            tables = [
+                {"table_name": name, "file_id": source["file_id"]}
+                for name, source in sources.items()
+            ]
+            table_name = next(table["table_name"] for table in tables if table["file_id"] == file_id)
+        else:
+            # Extract table name from schema
+            table_name = self._extract_table_name(schema)
+        db_id = str(uuid.uuid4())
+        db_path = self._database_path(file_id, db_name, db_id)
+        self._reserve(db_path)
+        
+        return {
+            "database_id": db_id,
+            "file_id": file_id,
+            "database_path": str(db_path),
+            "table_name": table_name,
+            "build_key": build_key,
+            "tables": tables,
+        }
+    
+    def reuse_build(
+        self,
+        key: Optional[str],
+        file_id: str,
+        db_name: Optional[str] = None,
+    ) -> Optional[Dict[str, Any]]:
+        """
+        Answer a build request from an existing database with the same inputs
+        
+        A matching database at the requested path (or, without db_name, one
+        built for the same upload) is returned as it is. Otherwise the
+        existing file is copied to a new path, which is far cheaper than
+        parsing and inserting every row again.
+        
+        Args:
+            key: Build key of the request
+            file_id: ID of the CSV file
+            db_name: Optional custom database name
+        
+        Returns:
+            Dictionary containing database information, or None when no
+            matching database exists
+        
+        Raises:
+            DatabaseExistsError: If a different database named db_name exists
+        """
+        if key is None:
+            return None
+        
+        existing = None
+        requested = str(self.db_dir / f"{db_name}.db") if db_name else None
+        for record in self.catalog.list({"build_key": key}):
+            if not Path(record["database_path"]).exists():
+                continue
+            if record["database_path"] == requested or (not db_name and record["file_id"] == file_id):
+                return self._result(record, cached=True)
+            existing = existing or record
+        if existing is None:
+            return None
+        
+        db_id = str(uuid.uuid4())
+        target = self._database_path(file_id, db_name, db_id)
+        self._reserve(target)
+        # Copy next to the target and rename, so readers never see a partial file
+        tmp_path = target.with_name(f"{target.name}.{uuid.uuid4().hex}.tmp")
+        try:
+            shutil.copyfile(existing["database_path"], tmp_path)
+            os.replace(tmp_path, target)
+        except BaseException:
+            target.unlink(missing_ok=True)
+            raise
+        finally:
+            tmp_path.unlink(missing_ok=True)
+        
+        record = {
+            "database_id": db_id,
+            "file_id": file_id,
+            "database_path": str(target),
+            "table_name": existing["table_name"],
+            "build_key": key,
+            "row_count": existing["row_count"],
+            "optimization": existing.get("optimization"),
+            "tables": existing.get("tables"),
+            "foreign_key_violations": existing.get("foreign_key_violations"),
+            "invalid_values": existing.get("invalid_values"),
+            "cloned_from": existing["database_id"],
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.catalog.put(db_id, record)
+        return self._result(record, cached=True)
+    
     def create_database(
         self,
         file_id: str,
         csv_info: Dict[str, Any],
         schema: str,
-        db_name: str = None
+        db_name: str = None,
+        optimize: bool = True,
+        index_columns: Optional[List[str]] = None,
+        max_indexes: Optional[int] = None,
+        sources: Optional[Dict[str, Dict[str, Any]]] = None,
+        coerce_types: bool = True,
     ) -> Dict[str, Any]:
         """
         Create a SQLite database from CSV data and schema
@@ -84,69 +235,193 @@ class DatabaseService:
             csv_info: CSV file metadata
             schema: SQL CREATE TABLE statement
             db_name: Optional custom database name
-            
+            optimize: Whether to add indexes and run ANALYZE after the load
+            index_columns: Columns to index instead of the advised ones
+            max_indexes: Most indexes the advisor may add per table
+            sources: Table name -> upload metadata, to load several uploads
+            coerce_types: Whether to convert values to the declared column types
+        
         Returns:
             Dictionary containing database information
         """
-        # Generate database ID and path
-        db_id = str(uuid.uuid4())
-        if db_name:
-            db_filename = f"{db_name}.db"
-        else:
-            db_filename = f"{file_id}.db"
+        key = build_key(
+            csv_info,
+            schema,
+            optimize=optimize,
+            index_columns=index_columns,
+            max_indexes=max_indexes,
+            sources=sources,
+            coerce_types=coerce_types,
+        )
+        cached = self.reuse_build(key, file_id, db_name)
+        if cached:
+            return cached
         
-        db_path = self.db_dir / db_filename
-        
-        # Extract table name from schema
-        table_name = self._extract_table_name(schema)
+        build = self.plan_build(file_id, schema, db_name, key, sources)
         
         try:
-            # Create database and execute schema
-            conn = sqlite3.connect(str(db_path))
-            cursor = conn.cursor()
-            
-            # Execute schema; allow multi-statement definitions from LLM output
-            conn.executescript(schema)
-            
-            # Load CSV data
-            file_path = csv_info.get('file_path') or csv_info.get('filepath')
-            if not file_path:
-                raise KeyError("CSV metadata missing 'file_path'")
-            csv_path = Path(file_path)
-            df = pd.read_csv(csv_path)
-            
-            # Insert data into table
-            df.to_sql(table_name, conn, if_exists='append', index=False)
-            
-            # Get row count
-            cursor.execute(f"SELECT COUNT(*) FROM {table_name}")
-            row_count = cursor.fetchone()[0]
-            
-            conn.commit()
-            conn.close()
-            
-            # Save metadata
-            self.metadata[db_id] = {
-                "database_id": db_id,
-                "file_id": file_id,
-                "database_path": str(db_path),
-                "table_name": table_name,
-                "row_count": row_count,
-            }
-            self._save_metadata()
-            
-            return {
-                "database_id": db_id,
-                "database_path": str(db_path),
-                "table_name": table_name,
-                "row_count": row_count,
-            }
-            
+            result = build_database(
+                build,
+                schema,
+                csv_info,
+                optimize=optimize,
+                index_columns=index_columns,
+                max_indexes=max_indexes,
+                sources=sources,
+                coerce_types=coerce_types,
+            )
         except Exception as e:
             # Clean up on error
-            if db_path.exists():
-                db_path.unlink()
+            self.discard_build(build)
             raise Exception(f"Error creating database: {str(e)}")
+        
+        return self.register_database(build, result)
+    
+    def register_database(self, build: Dict[str, Any], result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record a successfully built database in the catalog
+        
+        Safe to call from job completion callbacks running off the event loop.
+        
+        Args:
+            build: Dictionary returned by plan_build
+            result: Dictionary returned by build_database
+        
+        Returns:
+            Dictionary containing database information
+        """
+        tables = build.get("tables")
+        if tables:
+            # Row counts are keyed by the table names as the schema spells them
+            tables = [
+                {**table, "table_name": name, "row_count": rows}
+                for table, (name, rows) in zip(tables, result["row_counts"].items())
+            ]
+        record = {
+            **build,
+            "tables": tables,
+            "row_count": result["row_count"],
+            "optimization": result.get("optimization"),
+            "foreign_key_violations": result.get("foreign_key_violations"),
+            "invalid_values": result.get("invalid_values"),
+            "created_at": datetime.now(timezone.utc).isoformat(),
+        }
+        self.catalog.put(build["database_id"], record)
+        
+        return self._result(record)
+    
+    def _result(self, record: Dict[str, Any], cached: bool = False) -> Dict[str, Any]:
+        """Build the creation response fields from a catalog record"""
+        return {
+            "database_id": record["database_id"],
+            "database_path": record["database_path"],
+            "table_name": record["table_name"],
+            "row_count": record["row_count"],
+            "optimization": record.get("optimization"),
+            "tables": record.get("tables"),
+            "foreign_key_violations": record.get("foreign_key_violations"),
+            "invalid_values": record.get("invalid_values"),
+            "cached": cached,
+        }
+    
+    def discard_build(self, build: Dict[str, Any]):
+        """Remove the file of a build that failed"""
+        Path(build["database_path"]).unlink(missing_ok=True)
+    
+    def prepare_append(self, db_id: str) -> Dict[str, Any]:
+        """
+        Get a database ready to receive more rows
+        
+        Its build key is dropped first: once rows are added the database no
+        longer matches the inputs it was built from, so it must not be
+        handed out (or copied) by the build cache. Its version is increased
+        here and again once the rows are in, so query results cached while
+        the append runs are not served afterwards.
+        
+        Args:
+            db_id: Database ID
+        
+        Returns:
+            The database metadata
+        
+        Raises:
+            DatabaseNotFoundError: If the database does not exist
+        """
+        def forget_build(record: Dict[str, Any]) -> Dict[str, Any]:
+            return {**record, "build_key": None, "version": record.get("version", 0) + 1}
+        
+        database = self.catalog.update(db_id, forget_build)
+        if database is None or not Path(database["database_path"]).exists():
+            raise DatabaseNotFoundError(db_id)
+        return database
+    
+    def register_append(self, db_id: str, file_id: str, result: Dict[str, Any]) -> Dict[str, Any]:
+        """
+        Record rows appended to a database
+        
+        Safe to call from job completion callbacks running off the event loop.
+        
+        Args:
+            db_id: Database ID
+            file_id: ID of the CSV file that was appended
+            result: Dictionary returned by append_database
+        
+        Returns:
+            Dictionary with the append counts and the new row_count
+        """
+        def add_rows(record: Dict[str, Any]) -> Dict[str, Any]:
+            appends = record.get("appends") or []
+            appends.append({
+                "file_id": file_id,
+                "rows_inserted": result["rows_inserted"],
+                "rows_updated": result["rows_updated"],
+                "rows_skipped": result.get("rows_skipped", 0),
+                "invalid_values": result.get("invalid_values"),
+                "appended_at": datetime.now(timezone.utc).isoformat(),
+            })
+            return {
+                **record,
+                "row_count": record["row_count"] + result["rows_inserted"],
+                "appends": appends,
+                "version": record.get("version", 0) + 1,
+            }
+        
+        record = self.catalog.update(db_id, add_rows)
+        return {
+            "database_id": db_id,
+            "file_id": file_id,
+            "table_name": record["table_name"],
+            "database_path": record["database_path"],
+            "rows_loaded": result["rows_loaded"],
+            "rows_inserted": result["rows_inserted"],
+            "rows_updated": result["rows_updated"],
+            "rows_skipped": result.get("rows_skipped", 0),
+            "invalid_values": result.get("invalid_values"),
+            "row_count": record["row_count"],
+        }
+    
+    def append_rows(
+        self,
+        db_id: str,
+        file_id: str,
+        csv_info: Dict[str, Any],
+        key_columns: Optional[List[str]] = None,
+    ) -> Dict[str, Any]:
+        """
+        Add the rows of another upload to an existing database
+        
+        Args:
+            db_id: Database ID
+            file_id: ID of the CSV file to append
+            csv_info: CSV file metadata
+            key_columns: Unique key to upsert on; None appends every row
+        
+        Returns:
+            Dictionary with the append counts and the new row_count
+        """
+        database = self.prepare_append(db_id)
+        result = append_database(database, csv_info, key_columns=key_columns)
+        return self.register_append(db_id, file_id, result)
     
     def _extract_table_name(self, schema: str) -> str:
         """Extract table name from CREATE TABLE statement"""
@@ -162,8 +437,262 @@ class DatabaseService:
         
         Args:
             db_id: Database ID
-            
+        
         Returns:
             Database metadata
         """
-        return self.metadata.get(db_id)
+        return self.catalog.get(db_id)
+    
+    def list_databases(
+        self,
+        file_id: Optional[str] = None,
+        limit: int = 100,
+        offset: int = 0,
+    ) -> Tuple[List[Dict[str, Any]], int]:
+        """
+        List databases in creation order
+        
+        Args:
+            file_id: Only databases built from this upload
+            limit: Maximum number of databases to return
+            offset: Number of databases to skip
+        
+        Returns:
+            Tuple of (database metadata, total number of matching databases)
+        """
+        filters = {"file_id": file_id} if file_id is not None else None
+        return self.catalog.list(filters, limit, offset), self.catalog.count(filters)
+
+
+def build_database(
+    build: Dict[str, Any],
+    schema: str,
+    csv_info: Dict[str, Any],
+    optimize: bool = True,
+    index_columns: Optional[List[str]] = None,
+    max_indexes: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+    sources: Optional[Dict[str, Dict[str, Any]]] = None,
+    coerce_types: bool = True,
+) -> Dict[str, Any]:
+    """
+    Create a database, load uploads into it and optimize it for queries
+    
+    Runs in the request thread or in a background job process. A single
+    upload is streamed into the table of the build; several uploads are
+    loaded in parallel by parallel_load.load_tables.
+    
+    Args:
+        build: Dictionary returned by DatabaseService.plan_build
+        schema: SQL schema (multi-statement LLM output is allowed)
+        csv_info: CSV file metadata
+        optimize: Whether to add indexes and run ANALYZE after the load
+        index_columns: Columns to index; None lets the index advisor choose.
+            Multi-table builds name them as ``table.column``
+        max_indexes: Most indexes the advisor may add per table
+        progress: Optional callback receiving phase, rows and bytes written
+        sources: Table name -> metadata of the upload loaded into it, which
+            replaces csv_info when given
+        coerce_types: Whether to convert values to the declared column types
+    
+    Returns:
+        Dictionary with the row_count loaded, the row_counts and
+        foreign_key_violations per table, the invalid_values per column
+        (``table.column`` in multi-table builds) and the optimization applied
+    """
+    db_path = Path(build["database_path"])
+    sources = sources or {build["table_name"]: csv_info}
+    
+    violations = None
+    if len(sources) == 1:
+        table_name, source = next(iter(sources.items()))
+        # Stream CSV data in chunks, preferring the columnar cache over reparsing
+        chunks = read_upload(source, chunksize=settings.load_chunk_size)
+        if chunks is None:
+            raise KeyError("CSV metadata missing 'file_path'")
+        
+        loaded = bulk_load(
+            db_path,
+            schema,
+            table_name,
+            chunks,
+            rows_total=source.get("row_count"),
+            progress=progress,
+            coerce_types=coerce_types,
+        )
+        row_counts = {table_name: loaded["rows_loaded"]}
+        invalid_values = loaded["invalid_values"]
+    else:
+        loaded = load_tables(db_path, schema, sources, progress=progress, coerce_types=coerce_types)
+        row_counts = loaded["row_counts"]
+        violations = loaded["foreign_key_violations"]
+        invalid_values = {
+            f"{table}.{column}": entry
+            for table, columns in loaded["invalid_values"].items()
+            for column, entry in columns.items()
+        }
+    
+    optimization = None
+    if optimize:
+        columns = _table_index_columns(index_columns, list(row_counts), len(sources) > 1)
+        indexes = []
+        for position, (table_name, source) in enumerate(zip(row_counts, sources.values())):
+            applied = optimize_database(
+                db_path,
+                table_name,
+                source,
+                index_columns=columns.get(table_name.lower()) if columns is not None else None,
+                max_indexes=max_indexes,
+                progress=progress,
+                analyze=position == len(sources) - 1,
+            )
+            indexes.extend(applied["indexes"])
+        optimization = {"indexes": indexes, "analyzed": True}
+    return {
+        "row_count": sum(row_counts.values()),
+        "row_counts": row_counts,
+        "foreign_key_violations": violations,
+        "invalid_values": invalid_values,
+        "optimization": optimization,
+    }
+
+
+def _table_index_columns(
+    index_columns: Optional[List[str]],
+    tables: List[str],
+    qualified: bool,
+) -> Optional[Dict[str, List[str]]]:
+    """
+    Split requested index columns by table
+    
+    Args:
+        index_columns: Requested columns, or None to let the advisor choose
+        tables: Names of the loaded tables
+        qualified: Whether columns are named as ``table.column``
+    
+    Returns:
+        Lower-cased table name -> columns, or None when none were requested
+    
+    Raises:
+        ValueError: If a qualified column names no loaded table
+    """
+    if index_columns is None:
+        return None
+    if not qualified:
+        return {tables[0].lower(): index_columns}
+    
+    columns: Dict[str, List[str]] = {table.lower(): [] for table in tables}
+    for name in index_columns:
+        table, _, column = name.rpartition(".")
+        if table.lower() not in columns:
+            raise ValueError(f"Index column '{name}' must be named as table.column of a loaded table")
+        columns[table.lower()].append(column)
+    return columns
+
+
+def append_database(
+    database: Dict[str, Any],
+    csv_info: Dict[str, Any],
+    key_columns: Optional[List[str]] = None,
+    progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
+    """
+    Stream an upload into an existing database and refresh its statistics
+    
+    Runs in the request thread or in a background job process.
+    
+    Args:
+        database: Database metadata
+        csv_info: CSV file metadata
+        key_columns: Unique key to upsert on; None appends every row
+        progress: Optional callback receiving phase, rows and bytes written
+    
+    Returns:
+        Dictionary with rows_loaded, rows_inserted, rows_updated,
+        rows_skipped and the invalid_values per column
+    """
+    chunks = read_upload(csv_info, chunksize=settings.load_chunk_size)
+    if chunks is None:
+        raise KeyError("CSV metadata missing 'file_path'")
+    
+    db_path = Path(database["database_path"])
+    result = bulk_append(
+        db_path,
+        database["table_name"],
+        chunks,
+        key_columns=key_columns,
+        rows_total=csv_info.get("row_count"),
+        progress=progress,
+    )
+    
+    if progress:
+        progress(phase="analyzing")
+    refresh_statistics(db_path, database["table_name"])
+    return result
+
+
+def normalize_schema(schema: str) -> str:
+    """
+    Canonical text of a schema for comparing builds
+    
+    Comments are dropped and whitespace is collapsed outside quoted
+    strings and identifiers, so reformatting a schema does not change it.
+    """
+    parts = SQL_QUOTED.split(schema)
+    for i in range(0, len(parts), 2):
+        text = SQL_COMMENT.sub(" ", parts[i])
+        text = " ".join(text.split())
+        parts[i] = re.sub(r"\s*([(),;])\s*", r"\1", text)
+    return "".join(parts).strip().rstrip(";")
+
+
+def build_key(
+    csv_info: Dict[str, Any],
+    schema: str,
+    optimize: bool = True,
+    index_columns: Optional[List[str]] = None,
+    max_indexes: Optional[int] = None,
+    sources: Optional[Dict[str, Dict[str, Any]]] = None,
+    coerce_types: bool = True,
+) -> Optional[str]:
+    """
+    Key identifying the inputs of a database build
+    
+    Two builds with the same key produce the same database: the CSV
+    content, the normalized schema and every option and setting that
+    changes the output are part of it.
+    
+    Args:
+        csv_info: CSV file metadata
+        schema: SQL schema
+        optimize: Whether indexes are added and ANALYZE runs
+        index_columns: Columns to index instead of the advised ones
+        max_indexes: Most indexes the advisor may add
+        sources: Table name -> metadata of the upload loaded into it
+        coerce_types: Whether values are converted to the declared types
+    
+    Returns:
+        Hex digest, or None when an upload has no content hash
+    """
+    if sources:
+        content_hash = {table: source.get("content_hash") for table, source in sources.items()}
+        if not all(content_hash.values()):
+            return None
+    else:
+        content_hash = csv_info.get("content_hash")
+        if not content_hash:
+            return None
+    inputs = {
+        "content_hash": content_hash,
+        "schema": normalize_schema(schema),
+        "page_size": settings.load_page_size,
+        "optimize": optimize,
+        "coerce_types": coerce_types,
+    }
+    if optimize:
+        inputs.update({
+            "index_columns": index_columns,
+            "max_indexes": settings.index_max_count if max_indexes is None else max_indexes,
+            "index_min_rows": settings.index_min_rows,
+        })
+    return hashlib.blake2b(json.dumps(inputs, sort_keys=True).encode(), digest_size=16).hexdigest()
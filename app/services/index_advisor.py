@@ -0,0 +1,332 @@
+"""Index selection and planner statistics for newly built databases"""
+import re
+import sqlite3
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Set, Callable, Tuple
+from app.config import settings
+from app.services.bulk_loader import quote_identifier, table_columns, map_columns, match_columns
+from app.services.csv_profiler import INTEGER, TEXT, DATETIME
+
+
+# Column names that usually hold identifiers or join keys
+KEY_NAME = re.compile(r"(?:^|_)(?:id|key|code|uuid)$", re.IGNORECASE)
+CAMEL_KEY_NAME = re.compile(r"[a-z](?:Id|ID|Key|Code)$")
+
+# Columns with at least this share of distinct values are treated as unique
+UNIQUE_RATIO = 0.9
+
+# Reasons, in the order indexes are chosen
+KEY = "key"
+UNIQUE = "unique"
+DATE = "date"
+REQUESTED = "requested"
+# Read by a slow query without an index
+FILTER = "filter"
+
+# Clauses whose columns an index can serve
+INDEXABLE_CLAUSES = {"where", "on", "using", "group by", "order by", "having"}
+CLAUSE = re.compile(
+    r"\b(where|on|using|group\s+by|order\s+by|having|select|from|join|limit|union|intersect|except|window)\b",
+    re.IGNORECASE,
+)
+STRING_LITERAL = re.compile(r"'(?:[^']|'')*'")
+IDENTIFIER = re.compile(r'"((?:[^"]|"")*)"|`([^`]*)`|\[([^\]]*)\]|([A-Za-z_][A-Za-z0-9_$]*)')
+
+
+def indexed_columns(conn: sqlite3.Connection, table_name: str) -> Set[str]:
+    """
+    Columns that already lead an index of a table
+    
+    Includes an INTEGER PRIMARY KEY, which is the rowid itself.
+    
+    Args:
+        conn: Database connection
+        table_name: Table name
+    
+    Returns:
+        Lower-cased column names
+    """
+    table = quote_identifier(table_name)
+    columns = set()
+    for _, name, declared_type, _, _, pk in conn.execute(f"PRAGMA table_info({table})"):
+        if pk == 1 and declared_type.upper() == "INTEGER":
+            columns.add(name.lower())
+    for index in conn.execute(f"PRAGMA index_list({table})").fetchall():
+        info = conn.execute(f"PRAGMA index_info({quote_identifier(index[1])})").fetchall()
+        leading = [row[2] for row in info if row[0] == 0 and row[2] is not None]
+        columns.update(name.lower() for name in leading)
+    return columns
+
+
+def advise_indexes(
+    csv_info: Dict[str, Any],
+    mapping: Dict[str, str],
+    existing: Set[str],
+    max_indexes: Optional[int] = None,
+    min_rows: Optional[int] = None,
+) -> List[Dict[str, Any]]:
+    """
+    Choose columns to index from the column profile of an upload
+    
+    Key-like names come first, then columns whose values are (nearly) all
+    distinct, then timestamps, which are typically filtered by range.
+    Columns holding a single value are never indexed.
+    
+    Args:
+        csv_info: CSV file metadata with the column profile
+        mapping: CSV column -> table column
+        existing: Lower-cased table columns that already lead an index
+        max_indexes: Most indexes to advise (defaults to settings.index_max_count)
+        min_rows: Tables with fewer rows get no indexes (defaults to settings.index_min_rows)
+    
+    Returns:
+        List of {"column", "reason"} in the order they should be created
+    """
+    max_indexes = settings.index_max_count if max_indexes is None else max_indexes
+    min_rows = settings.index_min_rows if min_rows is None else min_rows
+    row_count = csv_info.get("row_count") or 0
+    if row_count < min_rows:
+        return []
+    
+    column_types = csv_info.get("column_types") or {}
+    null_counts = csv_info.get("null_counts") or {}
+    # Uploads profiled before distinct ratios were recorded have none
+    ratios = csv_info.get("distinct_ratios") or {}
+    
+    candidates = {KEY: [], UNIQUE: [], DATE: []}
+    for name, column in mapping.items():
+        if column.lower() in existing:
+            continue
+        ratio = ratios.get(name)
+        non_null = row_count - null_counts.get(name, 0)
+        if ratio is not None and ratio * non_null < 2:
+            continue
+        
+        reason = _profile_reason(name, ratio, column_types.get(name))
+        if reason is not None:
+            candidates[reason].append(column)
+    
+    advice = [
+        {"column": column, "reason": reason}
+        for reason in (KEY, UNIQUE, DATE)
+        for column in candidates[reason]
+    ]
+    return advice[:max_indexes]
+
+
+def _profile_reason(name: str, ratio: Optional[float], column_type: Optional[str]) -> Optional[str]:
+    """Why the profile of a column makes it worth indexing, if it does"""
+    if KEY_NAME.search(name) or CAMEL_KEY_NAME.search(name):
+        return KEY
+    if ratio is not None and ratio >= UNIQUE_RATIO and column_type in (INTEGER, TEXT):
+        return UNIQUE
+    if column_type == DATETIME:
+        return DATE
+    return None
+
+
+def indexable_names(sql: str) -> Set[str]:
+    """
+    Lower-cased identifiers in the filter, join, grouping and sort clauses of a statement
+    
+    A lexical approximation: string literals are skipped, and qualified
+    names yield both parts, which is harmless when matched against the
+    columns of a table.
+    """
+    parts = CLAUSE.split(STRING_LITERAL.sub("''", sql))
+    names = set()
+    # Odd parts are the clause keywords, each followed by its text
+    for i in range(1, len(parts) - 1, 2):
+        if re.sub(r"\s+", " ", parts[i].lower()) in INDEXABLE_CLAUSES:
+            for match in IDENTIFIER.finditer(parts[i + 1]):
+                name = next(group for group in match.groups() if group is not None)
+                names.add(name.replace('""', '"').lower())
+    return names
+
+
+def suggest_indexes(
+    db_path: Path,
+    slow_queries: List[Dict[str, Any]],
+    profiles: Dict[str, Dict[str, Any]],
+) -> List[Dict[str, Any]]:
+    """
+    Indexes that would spare slow queries their full table scans
+    
+    For every table a slow query read in full, the columns of that table
+    it filters, joins, groups or sorts on are candidates unless an index
+    already leads with them. The column profile of the table's upload
+    then drops columns holding a single value and gives the reason the
+    advisor would index the column for (key, unique, date), or "filter"
+    when it is only the query that calls for one. Suggestions are ordered
+    by the time the slow queries needing them took.
+    
+    Args:
+        db_path: Database path
+        slow_queries: Slow query log entries of the database
+        profiles: Lower-cased table name -> CSV file metadata of its upload
+    
+    Returns:
+        List of {"table", "column", "reason", "distinct_ratio", "queries",
+        "total_duration_ms", "statement"}
+    """
+    scanned: Dict[str, List[Dict[str, Any]]] = {}
+    for entry in slow_queries:
+        for scan in entry.get("full_scans") or []:
+            scanned.setdefault(scan["table"], []).append(entry)
+    if not scanned:
+        return []
+    
+    suggestions: Dict[Tuple[str, str], Dict[str, Any]] = {}
+    conn = sqlite3.connect(f"{Path(db_path).resolve().as_uri()}?mode=ro", uri=True)
+    try:
+        for table_name, entries in scanned.items():
+            columns = table_columns(conn, table_name)
+            existing = indexed_columns(conn, table_name)
+            profile = _column_profile(profiles.get(table_name.lower()), columns)
+            by_name = {column.lower(): column for column in columns if column.lower() not in existing}
+            
+            for entry in entries:
+                for name in indexable_names(entry["sql"]) & by_name.keys():
+                    column = by_name[name]
+                    ratio, non_null, reason = profile.get(column, (None, None, None))
+                    if ratio is not None and non_null is not None and ratio * non_null < 2:
+                        continue
+                    suggestion = suggestions.setdefault((table_name, column), {
+                        "table": table_name,
+                        "column": column,
+                        "reason": reason or FILTER,
+                        "distinct_ratio": ratio,
+                        "queries": 0,
+                        "total_duration_ms": 0.0,
+                        "statement": (
+                            f"CREATE INDEX {quote_identifier(f'idx_{table_name}_{column}')} "
+                            f"ON {quote_identifier(table_name)} ({quote_identifier(column)})"
+                        ),
+                    })
+                    suggestion["queries"] += 1
+                    suggestion["total_duration_ms"] = round(
+                        suggestion["total_duration_ms"] + entry["duration_ms"], 3
+                    )
+    finally:
+        conn.close()
+    
+    return sorted(
+        suggestions.values(),
+        key=lambda item: (-item["total_duration_ms"], -(item["distinct_ratio"] or 0)),
+    )
+
+
+def _column_profile(
+    csv_info: Optional[Dict[str, Any]],
+    columns: List[str],
+) -> Dict[str, Tuple[Optional[float], Optional[int], Optional[str]]]:
+    """Table column -> (distinct ratio, non-null count, profile reason) from an upload"""
+    if not csv_info:
+        return {}
+    row_count = csv_info.get("row_count") or 0
+    column_types = csv_info.get("column_types") or {}
+    null_counts = csv_info.get("null_counts") or {}
+    ratios = csv_info.get("distinct_ratios") or {}
+    return {
+        column: (
+            ratios.get(name),
+            row_count - null_counts.get(name, 0),
+            _profile_reason(name, ratios.get(name), column_types.get(name)),
+        )
+        for name, column in match_columns(csv_info["columns"], columns)[0].items()
+    }
+
+
+def optimize_database(
+    db_path: Path,
+    table_name: str,
+    csv_info: Dict[str, Any],
+    index_columns: Optional[List[str]] = None,
+    max_indexes: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+    analyze: bool = True,
+) -> Dict[str, Any]:
+    """
+    Add indexes to a freshly loaded table and collect planner statistics
+    
+    Indexes are built after the bulk insert, which is much faster than
+    maintaining them row by row. ``ANALYZE`` samples settings.analysis_limit
+    rows per index so it stays cheap on large tables, then
+    ``PRAGMA optimize`` runs whatever else SQLite considers worthwhile.
+    
+    Args:
+        db_path: Database path
+        table_name: Loaded table
+        csv_info: CSV file metadata with the column profile
+        index_columns: Columns to index; None lets the advisor choose
+        max_indexes: Most indexes the advisor may add
+        progress: Optional callback receiving the phase
+        analyze: Whether to collect statistics; multi-table builds do so
+            once, after the last table is indexed
+    
+    Returns:
+        Dictionary with the "indexes" created and whether the table was analyzed
+    """
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        conn.execute("PRAGMA temp_store=MEMORY")
+        conn.execute(f"PRAGMA cache_size={-int(settings.load_cache_size_kb)}")
+        columns = table_columns(conn, table_name)
+        existing = indexed_columns(conn, table_name)
+        
+        if index_columns is None:
+            mapping = map_columns(csv_info["columns"], columns)
+            advice = advise_indexes(csv_info, mapping, existing, max_indexes)
+        else:
+            by_name = {column.lower(): column for column in columns}
+            unknown = [name for name in index_columns if name.lower() not in by_name]
+            if unknown:
+                raise ValueError(f"Cannot index unknown columns: {unknown}")
+            advice = [
+                {"column": column, "reason": REQUESTED}
+                for column in dict.fromkeys(by_name[name.lower()] for name in index_columns)
+                if column.lower() not in existing
+            ]
+        
+        if progress:
+            progress(phase="indexing")
+        indexes = []
+        conn.execute("BEGIN")
+        for item in advice:
+            name = f"idx_{table_name}_{item['column']}"
+            conn.execute(
+                f"CREATE INDEX IF NOT EXISTS {quote_identifier(name)} "
+                f"ON {quote_identifier(table_name)} ({quote_identifier(item['column'])})"
+            )
+            indexes.append({"name": name, "columns": [item["column"]], "reason": item["reason"]})
+        conn.execute("COMMIT")
+        
+        if not analyze:
+            return {"indexes": indexes, "analyzed": False}
+        if progress:
+            progress(phase="analyzing")
+        conn.execute(f"PRAGMA analysis_limit={int(settings.analysis_limit)}")
+        conn.execute("ANALYZE")
+        conn.execute("PRAGMA optimize")
+        return {"indexes": indexes, "analyzed": True}
+    finally:
+        conn.close()
+
+
+def refresh_statistics(db_path: Path, table_name: str):
+    """
+    Re-run ANALYZE on one table after rows were added
+    
+    With settings.analysis_limit the cost is bounded by the number of
+    indexes, not by the size of the table.
+    
+    Args:
+        db_path: Database path
+        table_name: Table whose statistics are stale
+    """
+    conn = sqlite3.connect(str(db_path), timeout=30, isolation_level=None)
+    try:
+        conn.execute(f"PRAGMA analysis_limit={int(settings.analysis_limit)}")
+        conn.execute(f"ANALYZE {quote_identifier(table_name)}")
+    finally:
+        conn.close()
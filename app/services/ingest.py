@@ -0,0 +1,130 @@
+"""Ingest pipeline turning an uploaded CSV into a profile and a columnar cache"""
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable
+from app.config import settings
+from app.services.csv_profiler import CSVProfiler
+from app.services.columnar_store import ColumnarWriter, csv_text_source
+from app.services.parallel_csv import ingest_csv_parallel
+from app.services.job_manager import worker_share
+from app.services.compression import SUFFIXES
+from app.services.row_index import build_row_index, count_rows, write_row_index
+
+
+def columnar_path_for(csv_path: Path) -> Path:
+    """Location of the columnar cache that sits next to an uploaded CSV"""
+    file_id = csv_path.name.split('.', 1)[0]
+    return csv_path.with_name(f"{file_id}.columns")
+
+
+def row_index_path_for(csv_path: Path) -> Path:
+    """Location of the row-offset index that sits next to an uploaded CSV"""
+    file_id = csv_path.name.split('.', 1)[0]
+    return csv_path.with_name(f"{file_id}.rows.npy")
+
+
+def stored_compression(csv_path: Path) -> Optional[str]:
+    """Compression of an upload stored as-is (``.csv.gz`` etc.), or None"""
+    return SUFFIXES.get(csv_path.suffix.lower())
+
+
+def ingest_csv(
+    file_path: Path,
+    columnar_path: Optional[Path] = None,
+    chunksize: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+) -> Dict[str, Any]:
+    """
+    Profile a CSV and write its columnar cache in one chunked pass
+    
+    Files of at least settings.parallel_parse_min_size bytes are split into
+    record-aligned ranges and parsed by settings.parse_workers processes
+    (a share of them inside a job worker, see job_manager.worker_share).
+    Uploads stored compressed are decompressed while parsing, sequentially.
+    Uncompressed uploads also get a row-offset index for paging.
+    
+    Args:
+        file_path: Path to the uploaded CSV
+        columnar_path: Where to write the cache (default: next to the CSV)
+        chunksize: Rows per chunk (defaults to settings.profile_chunk_size)
+    
+    Returns:
+        Profile dictionary plus the 'columnar_path' and 'row_index_path'
+        (None when no index was written)
+    """
+    columnar_path = columnar_path or columnar_path_for(file_path)
+    bytes_total = file_path.stat().st_size
+    compression = stored_compression(file_path)
+    
+    parallel = worker_share(settings.parse_workers) > 1 and bytes_total >= settings.parallel_parse_min_size
+    result = None
+    if parallel and compression is None:
+        result = ingest_csv_parallel(
+            file_path,
+            columnar_path,
+            chunksize=chunksize,
+            progress=progress,
+        )
+    if result is None:
+        result = _ingest_sequential(file_path, columnar_path, compression, chunksize, progress)
+    
+    result['row_index_path'] = None
+    if compression is None:
+        if progress:
+            progress(phase='indexing')
+        result.update(_index_rows(file_path, result['row_count']))
+    return result
+
+
+def _ingest_sequential(
+    file_path: Path,
+    columnar_path: Path,
+    compression: Optional[str],
+    chunksize: Optional[int],
+    progress: Optional[Callable[..., None]],
+) -> Dict[str, Any]:
+    """Parse, profile and cache a CSV in a single process"""
+    bytes_total = file_path.stat().st_size
+    profiler = CSVProfiler()
+    if progress:
+        progress(phase='parsing', rows_processed=0, bytes_processed=0, bytes_total=bytes_total)
+    
+    chunksize = chunksize or settings.profile_chunk_size
+    source = csv_text_source(file_path, chunksize, compression)
+    with open(file_path, 'rb') as f:
+        with pd.read_csv(
+            f,
+            chunksize=chunksize,
+            compression=compression,
+        ) as reader:
+            with ColumnarWriter(columnar_path, source=source) as writer:
+                for chunk in reader:
+                    profiler.update(chunk)
+                    writer.append(chunk)
+                    if progress:
+                        progress(
+                            rows_processed=profiler.row_count,
+                            bytes_processed=min(f.tell(), bytes_total),
+                        )
+    
+    result = profiler.result()
+    result['columnar_path'] = str(columnar_path)
+    return result
+
+
+def _index_rows(file_path: Path, row_count: int) -> Dict[str, Any]:
+    """
+    Write the row-offset index of an uncompressed CSV
+    
+    The index is only kept when its record count matches the parsed row
+    count; files whose records and rows disagree (e.g. blank lines, which
+    pandas skips) are paged through the columnar cache instead.
+    """
+    stride = settings.row_index_stride
+    index = build_row_index(file_path, stride)
+    if not len(index) or count_rows(file_path, index, stride) != row_count:
+        return {}
+    
+    index_path = row_index_path_for(file_path)
+    write_row_index(index, index_path)
+    return {'row_index_path': str(index_path), 'row_index_stride': stride}
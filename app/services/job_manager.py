@@ -0,0 +1,263 @@
+"""Background job execution on a bounded process pool"""
+import json
+import os
+import uuid
+import threading
+import multiprocessing
+from concurrent.futures import ProcessPoolExecutor, Future
+from concurrent.futures.process import BrokenProcessPool
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Any, Optional, Callable, Tuple
+
+
+# Job statuses
+QUEUED = "queued"
+RUNNING = "running"
+COMPLETED = "completed"
+FAILED = "failed"
+
+# Size of the job pool this process belongs to; None outside job workers
+_job_workers: Optional[int] = None
+
+
+def _now() -> str:
+    return datetime.now(timezone.utc).isoformat()
+
+
+def _read_job(job_path: Path) -> Optional[Dict[str, Any]]:
+    try:
+        with open(job_path, 'r') as f:
+            return json.load(f)
+    except FileNotFoundError:
+        return None
+
+
+def _write_job(job_path: Path, job: Dict[str, Any]):
+    """Replace a job record atomically so readers never see a partial file"""
+    job['updated_at'] = _now()
+    tmp_path = job_path.with_name(f"{job_path.name}.{os.getpid()}.{threading.get_ident()}.tmp")
+    with open(tmp_path, 'w') as f:
+        json.dump(job, f)
+    os.replace(tmp_path, job_path)
+
+
+class JobProgress:
+    """
+    Progress reporter handed to job functions
+    
+    It only holds the job file path, so it can be pickled into worker
+    processes and written from there; the API reads the same file.
+    """
+    
+    def __init__(self, job_path: Path):
+        self.job_path = job_path
+    
+    def __call__(self, **fields: Any):
+        job = _read_job(self.job_path)
+        if job is None:
+            return
+        job['progress'].update(fields)
+        _write_job(self.job_path, job)
+
+
+def _init_worker(max_workers: int):
+    """Job worker initializer: remember how many job workers share the host"""
+    global _job_workers
+    _job_workers = max_workers
+
+
+def worker_share(workers: int) -> int:
+    """
+    Processes a pool created in this process may use
+    
+    The parse and load pools are also created inside job workers. There,
+    each of the job pool's workers gets an equal share of ``workers``, so
+    jobs running at once together stay within one budget instead of
+    starting ``job_workers`` times as many processes. A share of 1 means
+    the work should run without a pool.
+    """
+    if _job_workers is None:
+        return workers
+    return max(1, workers // _job_workers)
+
+
+def _run_job(job_path: Path, fn: Callable, args: tuple, kwargs: Dict[str, Any]) -> Any:
+    """Worker-side entry point: mark the job running and call its function"""
+    job = _read_job(job_path)
+    job['status'] = RUNNING
+    job['started_at'] = _now()
+    _write_job(job_path, job)
+    return fn(*args, progress=JobProgress(job_path), **kwargs)
+
+
+class JobManager:
+    """Runs CPU-heavy work in a process pool and tracks it as job records"""
+    
+    def __init__(self, jobs_dir: Path, max_workers: int):
+        self.jobs_dir = jobs_dir
+        self.jobs_dir.mkdir(exist_ok=True)
+        self.max_workers = max_workers
+        self._executor: Optional[ProcessPoolExecutor] = None
+        self._lock = threading.Lock()
+    
+    def _job_path(self, job_id: str) -> Path:
+        return self.jobs_dir / f"{job_id}.json"
+    
+    def _get_executor(self) -> ProcessPoolExecutor:
+        """Create the pool on first use; spawn avoids forking a threaded server"""
+        with self._lock:
+            if self._executor is None:
+                self._executor = ProcessPoolExecutor(
+                    max_workers=self.max_workers,
+                    mp_context=multiprocessing.get_context("spawn"),
+                    initializer=_init_worker,
+                    initargs=(self.max_workers,),
+                )
+            return self._executor
+    
+    def _discard_executor(self, executor: ProcessPoolExecutor):
+        """
+        Forget a pool that broke (e.g. a worker was OOM-killed)
+        
+        The next job creates a new pool. Only the given pool is dropped, so
+        a pool already replaced by another thread stays. A broken pool has
+        already stopped its workers; shutting it down from its own
+        callbacks would deadlock.
+        """
+        with self._lock:
+            if self._executor is executor:
+                self._executor = None
+    
+    def _submit(
+        self,
+        job_path: Path,
+        fn: Callable,
+        args: tuple,
+        kwargs: Dict[str, Any],
+    ) -> Tuple[ProcessPoolExecutor, Future]:
+        """Submit to the pool, replacing it once if an earlier crash broke it"""
+        for attempt in range(2):
+            executor = self._get_executor()
+            try:
+                return executor, executor.submit(_run_job, job_path, fn, args, kwargs)
+            except BrokenProcessPool:
+                self._discard_executor(executor)
+                if attempt:
+                    raise
+    
+    def submit(
+        self,
+        kind: str,
+        fn: Callable,
+        *args: Any,
+        on_success: Optional[Callable[[Any], Any]] = None,
+        on_failure: Optional[Callable[[BaseException], None]] = None,
+        **kwargs: Any,
+    ) -> Dict[str, Any]:
+        """
+        Queue a job on the process pool
+        
+        Args:
+            kind: Job type label (e.g. "ingest")
+            fn: Picklable module-level function; it is called with a
+                ``progress`` keyword argument for reporting progress
+            on_success: Called in this process with fn's return value; its
+                return value becomes the job result
+            on_failure: Called in this process with the exception if the job fails
+        
+        Returns:
+            The queued job record
+        
+        Raises:
+            Exception: If the job could not be queued; the job is recorded
+                as failed and on_failure has been called
+        """
+        job_id = str(uuid.uuid4())
+        job_path = self._job_path(job_id)
+        job = {
+            'job_id': job_id,
+            'kind': kind,
+            'status': QUEUED,
+            'progress': {},
+            'result': None,
+            'error': None,
+            'created_at': _now(),
+        }
+        _write_job(job_path, job)
+        
+        try:
+            executor, future = self._submit(job_path, fn, args, kwargs)
+        except BaseException as e:
+            self._record_failure(job_path, job, e, on_failure)
+            raise
+        future.add_done_callback(
+            lambda done: self._finish(executor, job_path, done, on_success, on_failure)
+        )
+        return job
+    
+    def _finish(
+        self,
+        executor: ProcessPoolExecutor,
+        job_path: Path,
+        future: Future,
+        on_success: Optional[Callable[[Any], Any]],
+        on_failure: Optional[Callable[[BaseException], None]],
+    ):
+        """Record the outcome of a finished job"""
+        job = _read_job(job_path) or {}
+        try:
+            result = future.result()
+            if on_success is not None:
+                result = on_success(result)
+        except BaseException as e:
+            if isinstance(e, BrokenProcessPool):
+                self._discard_executor(executor)
+            self._record_failure(job_path, job, e, on_failure)
+            return
+        job['status'] = COMPLETED
+        job['result'] = result
+        job['finished_at'] = _now()
+        _write_job(job_path, job)
+    
+    def _record_failure(
+        self,
+        job_path: Path,
+        job: Dict[str, Any],
+        error: BaseException,
+        on_failure: Optional[Callable[[BaseException], None]],
+    ):
+        """Run the failure callback and record the job as failed, even if the callback fails"""
+        job['status'] = FAILED
+        job['error'] = str(error)
+        try:
+            if on_failure is not None:
+                on_failure(error)
+        except Exception as cleanup_error:
+            job['error'] = f"{error} (cleanup failed: {cleanup_error})"
+        finally:
+            job['finished_at'] = _now()
+            _write_job(job_path, job)
+    
+    def get_job(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get the current record of a job
+        
+        Args:
+            job_id: Job ID
+        
+        Returns:
+            Job record or None if not found
+        """
+        try:
+            uuid.UUID(job_id)
+        except ValueError:
+            return None
+        return _read_job(self._job_path(job_id))
+    
+    def shutdown(self, wait: bool = True):
+        """Stop the worker pool"""
+        with self._lock:
+            if self._executor is not None:
+                self._executor.shutdown(wait=wait)
+                self._executor = None
@@ -0,0 +1,272 @@
+"""Parallel CSV ingest over record-aligned byte ranges"""
+import io
+import shutil
+import threading
+import multiprocessing
+import numpy as np
+import pandas as pd
+from concurrent.futures import ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Tuple, Callable
+from app.config import settings
+from app.services.csv_profiler import CSVProfiler
+from app.services.columnar_store import ColumnarWriter, ColumnarStore, csv_text_source
+from app.services.job_manager import worker_share
+
+
+QUOTE = ord('"')
+NEWLINE = ord('\n')
+
+# Bytes scanned per read while looking for record boundaries
+_SCAN_BLOCK_SIZE = 8 * 1024 * 1024
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def record_ends(block: bytes, in_quotes: bool) -> Tuple[np.ndarray, bool]:
+    """
+    Find the newlines in a block that terminate a CSV record
+    
+    A newline ends a record only if it is outside a quoted field, i.e. an
+    even number of quote characters precede it. Escaped quotes ("") count
+    twice and so never change the parity.
+    
+    Args:
+        block: Raw bytes of the file
+        in_quotes: Whether the block starts inside a quoted field
+    
+    Returns:
+        Tuple of (offsets of record-ending newlines within the block,
+        whether the block ends inside a quoted field)
+    """
+    data = np.frombuffer(block, dtype=np.uint8)
+    quotes = np.flatnonzero(data == QUOTE)
+    newlines = np.flatnonzero(data == NEWLINE)
+    quotes_before = np.searchsorted(quotes, newlines) + int(in_quotes)
+    ends = newlines[quotes_before % 2 == 0]
+    return ends, bool((len(quotes) + int(in_quotes)) % 2)
+
+
+def split_record_ranges(file_path: Path, part_size: int) -> Tuple[int, List[Tuple[int, int]]]:
+    """
+    Split a CSV file into byte ranges that start and end on record boundaries
+    
+    The file is scanned once for quote parity (vectorized), so quoted fields
+    containing newlines are never cut in half.
+    
+    Args:
+        file_path: Path to the CSV file
+        part_size: Target size of each range in bytes
+    
+    Returns:
+        Tuple of (end offset of the header record, list of (start, end)
+        byte ranges covering every data record)
+    """
+    file_size = file_path.stat().st_size
+    header_end: Optional[int] = None
+    boundaries: List[int] = []
+    next_target = 0
+    in_quotes = False
+    offset = 0
+    
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(_SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            ends, next_in_quotes = record_ends(block, in_quotes)
+            starts = ends + offset + 1
+            
+            if header_end is None and len(starts):
+                header_end = int(starts[0])
+                boundaries.append(header_end)
+                next_target = header_end + part_size
+            
+            # First record start at or after each pending target
+            while header_end is not None and next_target < file_size:
+                index = np.searchsorted(starts, next_target)
+                if index == len(starts):
+                    break
+                boundaries.append(int(starts[index]))
+                next_target = int(starts[index]) + part_size
+            
+            in_quotes = next_in_quotes
+            offset += len(block)
+    
+    if header_end is None:
+        return file_size, []
+    
+    boundaries.append(file_size)
+    ranges = [
+        (start, end)
+        for start, end in zip(boundaries[:-1], boundaries[1:])
+        if end > start
+    ]
+    return header_end, ranges
+
+
+class _RangeReader(io.RawIOBase):
+    """File-like view of a header followed by one byte range of a file"""
+    
+    def __init__(self, file_path: Path, header: bytes, start: int, end: int):
+        self._file = open(file_path, 'rb')
+        self._file.seek(start)
+        self._header = memoryview(header)
+        self._remaining = end - start
+    
+    def readable(self) -> bool:
+        return True
+    
+    def readinto(self, buffer) -> int:
+        if len(self._header):
+            count = min(len(buffer), len(self._header))
+            buffer[:count] = self._header[:count]
+            self._header = self._header[count:]
+            return count
+        count = self._file.readinto(memoryview(buffer)[:min(len(buffer), self._remaining)])
+        self._remaining -= count
+        return count
+    
+    def close(self):
+        self._file.close()
+        super().close()
+
+
+def _parse_range(
+    file_path: Path,
+    header: bytes,
+    start: int,
+    end: int,
+    columnar_path: Path,
+    chunksize: int,
+) -> CSVProfiler:
+    """Worker: profile one byte range and write its rows to a partial store"""
+    profiler = CSVProfiler()
+    with io.BufferedReader(_RangeReader(file_path, header, start, end)) as f:
+        with pd.read_csv(f, chunksize=chunksize) as reader:
+            with ColumnarWriter(columnar_path) as writer:
+                for chunk in reader:
+                    profiler.update(chunk)
+                    writer.append(chunk)
+    return profiler
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared parse pool, created on first use; sized to this process's share of parse_workers"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=worker_share(settings.parse_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """
+    Forget a pool a crashed worker broke, so the next call creates a new one
+    
+    A broken pool has already stopped its workers. A pool that another
+    thread has already replaced stays in place.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def shutdown_pool():
+    """Stop the shared parse pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def ingest_csv_parallel(
+    file_path: Path,
+    columnar_path: Path,
+    part_size: Optional[int] = None,
+    chunksize: Optional[int] = None,
+    progress: Optional[Callable[..., None]] = None,
+) -> Optional[Dict[str, Any]]:
+    """
+    Profile a CSV and build its columnar cache using all parse workers
+    
+    Each record-aligned range is parsed in a worker process into its own
+    partial store; partial profiles and stores are then merged in file
+    order while later ranges are still being parsed.
+    
+    Args:
+        file_path: Path to the CSV file
+        columnar_path: Where to write the columnar cache
+        part_size: Bytes per range (defaults to settings.parallel_parse_part_size)
+        chunksize: Rows per chunk within a range
+        progress: Optional callback receiving phase, rows and bytes processed
+    
+    Returns:
+        Profile dictionary plus 'columnar_path', or None when the file has
+        no data records to split
+    """
+    part_size = part_size or settings.parallel_parse_part_size
+    chunksize = chunksize or settings.profile_chunk_size
+    bytes_total = file_path.stat().st_size
+    if progress:
+        progress(phase='splitting', rows_processed=0, bytes_processed=0, bytes_total=bytes_total)
+    
+    header_end, ranges = split_record_ranges(file_path, part_size)
+    if not ranges:
+        return None
+    with open(file_path, 'rb') as f:
+        header = f.read(header_end)
+    
+    part_paths = [
+        columnar_path.with_name(f"{columnar_path.name}.part{index}")
+        for index in range(len(ranges))
+    ]
+    pool = _get_pool()
+    futures = []
+    try:
+        for (start, end), part_path in zip(ranges, part_paths):
+            futures.append(pool.submit(_parse_range, file_path, header, start, end, part_path, chunksize))
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    if progress:
+        progress(phase='parsing', parts_total=len(ranges), parts_done=0)
+    
+    profiler = CSVProfiler()
+    try:
+        # Columns a range parsed as numbers but the whole file holds as text
+        # are read again from the file when the store is closed
+        with ColumnarWriter(columnar_path, source=csv_text_source(file_path, chunksize)) as writer:
+            for index, future in enumerate(futures):
+                try:
+                    profiler.merge(future.result())
+                except BrokenProcessPool:
+                    _discard_pool(pool)
+                    raise
+                writer.append_store(ColumnarStore(part_paths[index]))
+                shutil.rmtree(part_paths[index])
+                if progress:
+                    progress(
+                        parts_done=index + 1,
+                        rows_processed=profiler.row_count,
+                        bytes_processed=ranges[index][1],
+                    )
+    finally:
+        # On failure, stop queued ranges and let running ones finish before cleanup
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        for part_path in part_paths:
+            shutil.rmtree(part_path, ignore_errors=True)
+            shutil.rmtree(part_path.with_name(part_path.name + ".tmp"), ignore_errors=True)
+    
+    result = profiler.result()
+    result['columnar_path'] = str(columnar_path)
+    return result
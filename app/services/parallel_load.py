@@ -0,0 +1,203 @@
+"""Parallel loading of several uploads into the tables of one database"""
+import shutil
+import sqlite3
+import threading
+import multiprocessing
+from concurrent.futures import Future, ProcessPoolExecutor, wait
+from concurrent.futures.process import BrokenProcessPool
+from pathlib import Path
+from typing import Dict, Any, List, Optional, Callable
+from app.config import settings
+from app.services.bulk_loader import (
+    LOAD_PRAGMAS,
+    bulk_load,
+    finish_load,
+    quote_identifier,
+    split_schema,
+)
+from app.services.csv_handler import read_upload
+from app.services.job_manager import worker_share
+
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pool_lock = threading.Lock()
+
+
+def _load_part(
+    part_path: Path,
+    statement: str,
+    table_name: str,
+    csv_info: Dict[str, Any],
+    coerce_types: bool,
+) -> Dict[str, Any]:
+    """Worker: load one upload into a database of its own holding only its table"""
+    chunks = read_upload(csv_info, chunksize=settings.load_chunk_size)
+    if chunks is None:
+        raise KeyError("CSV metadata missing 'file_path'")
+    return bulk_load(part_path, statement, table_name, chunks, coerce_types=coerce_types)
+
+
+def _run_now(fn: Callable, *args: Any) -> Future:
+    """Run fn in this process, returning its outcome as a finished future"""
+    future: Future = Future()
+    try:
+        future.set_result(fn(*args))
+    except BaseException as e:
+        future.set_exception(e)
+    return future
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    """Shared load pool, created on first use; sized to this process's share of load_workers"""
+    global _pool
+    with _pool_lock:
+        if _pool is None:
+            _pool = ProcessPoolExecutor(
+                max_workers=worker_share(settings.load_workers),
+                mp_context=multiprocessing.get_context("spawn"),
+            )
+        return _pool
+
+
+def _discard_pool(pool: ProcessPoolExecutor):
+    """
+    Forget a pool a crashed worker broke, so the next call creates a new one
+    
+    A broken pool has already stopped its workers. A pool that another
+    thread has already replaced stays in place.
+    """
+    global _pool
+    with _pool_lock:
+        if _pool is pool:
+            _pool = None
+
+
+def shutdown_pool():
+    """Stop the shared load pool"""
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.shutdown()
+            _pool = None
+
+
+def foreign_key_violations(conn: sqlite3.Connection) -> Dict[str, int]:
+    """Number of rows per table whose foreign keys have no parent row"""
+    violations: Dict[str, int] = {}
+    for table_name, *_ in conn.execute("PRAGMA foreign_key_check"):
+        violations[table_name] = violations.get(table_name, 0) + 1
+    return violations
+
+
+def load_tables(
+    db_path: Path,
+    schema: str,
+    sources: Dict[str, Dict[str, Any]],
+    progress: Optional[Callable[..., None]] = None,
+    coerce_types: bool = True,
+) -> Dict[str, Any]:
+    """
+    Build a database whose tables are loaded from different uploads
+    
+    Every table is bulk loaded by a worker process into a part database
+    of its own, so tables load in parallel without contending for one
+    write lock. Parts are attached to the new database and copied over
+    with ``INSERT ... SELECT *`` as they finish, which SQLite performs as
+    a page-level transfer into the still empty table. Indexes, views and
+    triggers are created once all rows are in; foreign keys are not
+    enforced while loading and are checked afterwards.
+    
+    Args:
+        db_path: Path of the database to create
+        schema: SQL schema with a CREATE TABLE statement per source
+        sources: Table name -> metadata of the upload loaded into it
+        progress: Optional callback receiving phase, tables and rows loaded
+        coerce_types: Whether to convert values to the declared column types
+    
+    Returns:
+        Dictionary with "row_counts" (table name -> rows),
+        "foreign_key_violations" (table name -> rows without a parent) and
+        "invalid_values" (table name -> column -> invalid values)
+    """
+    tables, deferred = split_schema(schema)
+    statements = {name.lower(): (name, statement) for name, statement in tables}
+    missing = [name for name in sources if name.lower() not in statements]
+    if missing:
+        raise ValueError(f"Schema has no CREATE TABLE for: {missing}")
+    
+    parts_dir = db_path.with_name(f"{db_path.name}.parts")
+    parts_dir.mkdir(exist_ok=True)
+    part_paths: List[Path] = []
+    futures = []
+    # A job worker whose share of load_workers is one process loads the tables itself
+    pool = _get_pool() if worker_share(settings.load_workers) > 1 else None
+    submit = pool.submit if pool is not None else _run_now
+    try:
+        for index, (name, csv_info) in enumerate(sources.items()):
+            table_name, statement = statements[name.lower()]
+            part_path = parts_dir / f"{index}.db"
+            part_paths.append(part_path)
+            futures.append(submit(_load_part, part_path, statement, table_name, csv_info, coerce_types))
+    except BrokenProcessPool:
+        _discard_pool(pool)
+        raise
+    if progress:
+        progress(phase="loading", tables_total=len(sources), tables_done=0, rows_loaded=0)
+    
+    conn = sqlite3.connect(str(db_path), isolation_level=None)
+    try:
+        # page_size only takes effect before the first table is created
+        conn.execute(f"PRAGMA page_size={int(settings.load_page_size)}")
+        for pragma in LOAD_PRAGMAS:
+            conn.execute(pragma)
+        conn.execute(f"PRAGMA cache_size={-int(settings.load_cache_size_kb)}")
+        conn.executescript("\n".join(statement for _, statement in tables))
+        
+        row_counts: Dict[str, int] = {}
+        invalid_values: Dict[str, Dict[str, Any]] = {}
+        # Merge in submission order while later tables are still loading
+        for part_path, future, name in zip(part_paths, futures, sources):
+            table_name = statements[name.lower()][0]
+            try:
+                loaded = future.result()
+            except BrokenProcessPool:
+                _discard_pool(pool)
+                raise
+            row_counts[table_name] = loaded["rows_loaded"]
+            invalid_values[table_name] = loaded["invalid_values"]
+            table = quote_identifier(table_name)
+            conn.execute("ATTACH DATABASE ? AS part", (str(part_path),))
+            try:
+                conn.execute("BEGIN")
+                conn.execute(f"INSERT INTO main.{table} SELECT * FROM part.{table}")
+                conn.execute("COMMIT")
+            except BaseException:
+                if conn.in_transaction:
+                    conn.execute("ROLLBACK")
+                raise
+            finally:
+                conn.execute("DETACH DATABASE part")
+            part_path.unlink()
+            if progress:
+                progress(
+                    tables_done=len(row_counts),
+                    rows_loaded=sum(row_counts.values()),
+                    bytes_written=db_path.stat().st_size,
+                )
+        
+        if progress:
+            progress(phase="finalizing")
+        violations = foreign_key_violations(conn)
+        finish_load(conn, deferred)
+        return {
+            "row_counts": row_counts,
+            "foreign_key_violations": violations,
+            "invalid_values": invalid_values,
+        }
+    finally:
+        conn.close()
+        # On failure, stop queued tables and let running ones finish before cleanup
+        for future in futures:
+            future.cancel()
+        wait(futures)
+        shutil.rmtree(parts_dir, ignore_errors=True)
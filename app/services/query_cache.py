@@ -0,0 +1,143 @@
+"""In-memory cache of read-only query results"""
+import re
+import sys
+import json
+import time
+import threading
+from collections import OrderedDict
+from typing import Dict, Any, Optional, Tuple
+
+# String literals and quoted identifiers, whose whitespace is significant
+QUOTED = re.compile(r"('(?:[^']|'')*'|\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\])")
+# Functions whose result changes between runs of the same statement
+VOLATILE = re.compile(
+    r"\b(?:random|randomblob|changes|total_changes|last_insert_rowid)\s*\("
+    r"|\bcurrent_(?:date|time|timestamp)\b|'now'",
+    re.IGNORECASE,
+)
+
+
+def normalize_sql(sql: str) -> str:
+    """
+    Canonical spelling of a statement for cache keys
+    
+    Runs of whitespace outside quotes become one space and a trailing
+    semicolon is dropped, so reformatted copies of a query share an entry.
+    """
+    parts = QUOTED.split(sql)
+    # Odd parts are the quoted ones
+    for i in range(0, len(parts), 2):
+        parts[i] = re.sub(r"\s+", " ", parts[i])
+    return "".join(parts).strip().rstrip(";").rstrip()
+
+
+def is_cacheable(sql: str) -> bool:
+    """Whether running a statement again on unchanged data gives the same rows"""
+    return not VOLATILE.search(sql)
+
+
+def result_size(result: Dict[str, Any]) -> int:
+    """Approximate bytes held by a query result"""
+    size = sys.getsizeof(result["rows"]) + sum(sys.getsizeof(name) for name in result["columns"])
+    for row in result["rows"]:
+        size += sys.getsizeof(row) + sum(sys.getsizeof(value) for value in row)
+    return size
+
+
+class QueryCache:
+    """
+    Query results kept in least-recently-used order within a byte budget
+    
+    Keys include the database version, which the catalog increases when
+    rows are appended, so a changed database never answers from entries
+    of its old contents; ``invalidate`` frees those entries right away.
+    """
+    
+    def __init__(self, max_bytes: int, ttl: float = 0):
+        """
+        Args:
+            max_bytes: Most bytes of results kept; 0 disables the cache
+            ttl: Seconds an entry is served for; 0 keeps it until evicted
+        """
+        self.max_bytes = max_bytes
+        self.ttl = ttl
+        self._entries: "OrderedDict[Tuple, Tuple[Dict[str, Any], int, float]]" = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+    
+    @staticmethod
+    def key(database_id: str, version: int, sql: str, params: Any, max_rows: int) -> Optional[Tuple]:
+        """Cache key of a query, or None if its result must not be cached"""
+        if not is_cacheable(sql):
+            return None
+        return (
+            database_id,
+            version,
+            normalize_sql(sql),
+            json.dumps(params, sort_keys=True, default=str),
+            max_rows,
+        )
+    
+    def get(self, key: Tuple) -> Optional[Dict[str, Any]]:
+        """Cached result of a query, counting the hit or miss"""
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and self.ttl and time.monotonic() - entry[2] > self.ttl:
+                self._remove(key)
+                entry = None
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(key)
+            self.hits += 1
+            return entry[0]
+    
+    def put(self, key: Tuple, result: Dict[str, Any]):
+        """Keep a result, evicting the least recently used ones beyond the budget"""
+        size = result_size(result)
+        if size > self.max_bytes:
+            return
+        with self._lock:
+            if key in self._entries:
+                self._remove(key)
+            self._entries[key] = (result, size, time.monotonic())
+            self._bytes += size
+            while self._bytes > self.max_bytes:
+                self._remove(next(iter(self._entries)))
+                self.evictions += 1
+    
+    def invalidate(self, database_id: str) -> int:
+        """Drop every entry of a database; returns how many were dropped"""
+        with self._lock:
+            keys = [key for key in self._entries if key[0] == database_id]
+            for key in keys:
+                self._remove(key)
+        return len(keys)
+    
+    def _remove(self, key: Tuple):
+        """Drop one entry; caller holds the lock"""
+        _, size, _ = self._entries.pop(key)
+        self._bytes -= size
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
+            self._bytes = 0
+    
+    def stats(self) -> Dict[str, Any]:
+        """Hit, miss and eviction counters and the memory in use"""
+        with self._lock:
+            lookups = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_ratio": round(self.hits / lookups, 4) if lookups else 0.0,
+                "evictions": self.evictions,
+                "entries": len(self._entries),
+                "bytes": self._bytes,
+                "max_bytes": self.max_bytes,
+            }
@@ -0,0 +1,679 @@
+"""Read-only SQL queries against built databases"""
+import json
+import time
+import base64
+import asyncio
+import sqlite3
+import threading
+from collections import OrderedDict
+from concurrent.futures import Future, ThreadPoolExecutor
+from contextlib import contextmanager
+from pathlib import Path
+from typing import AsyncIterator, Callable, Dict, Any, Iterator, List, Optional, Tuple, Union
+from app.services.admission import AdmissionController
+from app.services.bulk_loader import quote_identifier
+from app.services.query_cache import QueryCache
+from app.services.slow_query_log import SlowQueryLog, explain
+
+
+Params = Optional[Union[List[Any], Dict[str, Any]]]
+
+# Authorizer actions a query must not perform, even on a read-only connection
+DENIED_ACTIONS = {sqlite3.SQLITE_ATTACH, sqlite3.SQLITE_DETACH}
+# PRAGMAs whose argument names a table or index rather than a new setting
+READ_PRAGMAS = {
+    "table_info", "table_xinfo", "table_list", "index_list", "index_info",
+    "index_xinfo", "foreign_key_list", "foreign_key_check",
+}
+
+
+def _authorize(action: int, arg1: Optional[str], arg2: Optional[str], *_) -> int:
+    """Refuse ATTACH (which would open other files) and PRAGMAs that change settings"""
+    if action in DENIED_ACTIONS:
+        return sqlite3.SQLITE_DENY
+    if action == sqlite3.SQLITE_PRAGMA and arg2 is not None and arg1.lower() not in READ_PRAGMAS:
+        return sqlite3.SQLITE_DENY
+    return sqlite3.SQLITE_OK
+
+
+# SQLite virtual machine instructions between progress handler checks
+PROGRESS_STEPS = 1000
+
+# How a query ended
+COMPLETED = "completed"
+TIMEOUT = "timeout"
+STEP_LIMIT = "step_limit"
+CANCELLED = "cancelled"
+
+
+class QueryInterruptedError(Exception):
+    """Raised when a query is stopped by its budget or cancelled"""
+    
+    def __init__(self, reason: str, message: str):
+        super().__init__(message)
+        self.reason = reason
+
+
+class QueryBudget:
+    """
+    Time and step limits of one query, enforced by the SQLite progress handler
+    
+    The handler runs every PROGRESS_STEPS virtual machine instructions and
+    stops the statement once the budget is spent. Only time spent inside
+    SQLite counts, so a streamed result is not charged for a slow client.
+    ``cancel`` may be called from any thread; it also interrupts the
+    connection, stopping the statement at the next opportunity.
+    """
+    
+    def __init__(self, timeout: float = 0, max_steps: int = 0):
+        """
+        Args:
+            timeout: Seconds the query may run in SQLite; 0 for no limit
+            max_steps: Virtual machine instructions it may run; 0 for no limit
+        """
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.steps = 0
+        self.elapsed = 0.0
+        self.reason: Optional[str] = None
+        self._started = 0.0
+        self._conn: Optional[sqlite3.Connection] = None
+        self._lock = threading.Lock()
+    
+    def _check(self) -> int:
+        """Progress handler: a non-zero result aborts the statement"""
+        self.steps += PROGRESS_STEPS
+        if self.reason is None:
+            if self.max_steps and self.steps > self.max_steps:
+                self.reason = STEP_LIMIT
+            elif self.timeout and self.elapsed + time.perf_counter() - self._started > self.timeout:
+                self.reason = TIMEOUT
+        return 1 if self.reason else 0
+    
+    @contextmanager
+    def running(self, conn: sqlite3.Connection) -> Iterator[None]:
+        """
+        Enforce the budget while a block uses the connection
+        
+        Raises:
+            QueryInterruptedError: If the block was stopped by the budget or cancel
+        """
+        with self._lock:
+            self._conn = conn
+        self._started = time.perf_counter()
+        conn.set_progress_handler(self._check, PROGRESS_STEPS)
+        try:
+            if self.reason:
+                raise sqlite3.OperationalError("interrupted")
+            yield
+        except sqlite3.OperationalError as e:
+            if self.reason is None:
+                raise
+            raise QueryInterruptedError(self.reason, self._message()) from e
+        finally:
+            conn.set_progress_handler(None, 0)
+            self.elapsed += time.perf_counter() - self._started
+            with self._lock:
+                self._conn = None
+    
+    def cancel(self):
+        """Stop the query, e.g. because its client went away"""
+        self.reason = self.reason or CANCELLED
+        with self._lock:
+            if self._conn is not None:
+                self._conn.interrupt()
+    
+    def _message(self) -> str:
+        if self.reason == TIMEOUT:
+            return f"Query exceeded its time budget of {self.timeout:g}s"
+        if self.reason == STEP_LIMIT:
+            return f"Query exceeded its budget of {self.max_steps} steps"
+        return "Query was cancelled"
+
+
+def encode_cursor(table_name: str, rowid: int) -> str:
+    """Opaque token for the rows of a table after rowid"""
+    data = json.dumps({"table": table_name, "after": rowid}).encode()
+    return base64.urlsafe_b64encode(data).decode("ascii").rstrip("=")
+
+
+def decode_cursor(token: str, table_name: str) -> int:
+    """
+    Rowid a cursor token continues after
+    
+    Raises:
+        ValueError: If the token is malformed or belongs to another table
+    """
+    try:
+        data = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+        after = data["after"]
+        table = data["table"]
+    except (ValueError, TypeError, KeyError):
+        raise ValueError("Invalid cursor")
+    if table != table_name or not isinstance(after, int):
+        raise ValueError("Cursor belongs to another table")
+    return after
+
+
+class ConnectionPool:
+    """
+    Idle read-only connections per database file
+    
+    Databases are kept in least-recently-used order. Connections that are
+    handed out are not tracked. Whenever a connection is taken or comes
+    back, databases beyond ``max_databases`` and databases unused for
+    ``idle_timeout`` seconds have their idle connections closed, so only
+    recently queried files stay open.
+    """
+    
+    def __init__(
+        self,
+        max_connections: int,
+        max_databases: int,
+        idle_timeout: float,
+        mmap_size: int,
+        cache_size_kb: int,
+    ):
+        self.max_connections = max_connections
+        self.max_databases = max_databases
+        self.idle_timeout = idle_timeout
+        self.mmap_size = mmap_size
+        self.cache_size_kb = cache_size_kb
+        self._idle: "OrderedDict[str, List[sqlite3.Connection]]" = OrderedDict()
+        self._last_used: Dict[str, float] = {}
+        self._lock = threading.Lock()
+    
+    def _connect(self, db_path: str) -> sqlite3.Connection:
+        """Open a connection that cannot write, tuned for reads"""
+        uri = f"{Path(db_path).resolve().as_uri()}?mode=ro"
+        conn = sqlite3.connect(uri, uri=True, check_same_thread=False)
+        try:
+            conn.execute("PRAGMA query_only=1")
+            conn.execute(f"PRAGMA mmap_size={int(self.mmap_size)}")
+            conn.execute(f"PRAGMA cache_size={-int(self.cache_size_kb)}")
+            conn.execute("PRAGMA temp_store=MEMORY")
+            conn.set_authorizer(_authorize)
+        except BaseException:
+            conn.close()
+            raise
+        return conn
+    
+    def acquire(self, db_path: str) -> sqlite3.Connection:
+        """Take an idle connection to a database or open a new one"""
+        conn = None
+        with self._lock:
+            idle = self._idle.get(db_path)
+            if idle:
+                self._idle.move_to_end(db_path)
+                self._last_used[db_path] = time.monotonic()
+                conn = idle.pop()
+            closing = self._evict()
+        for stale in closing:
+            stale.close()
+        return conn if conn is not None else self._connect(db_path)
+    
+    def release(self, db_path: str, conn: sqlite3.Connection):
+        """Return a connection, closing it if the database already has enough idle ones"""
+        with self._lock:
+            idle = self._idle.setdefault(db_path, [])
+            self._idle.move_to_end(db_path)
+            self._last_used[db_path] = time.monotonic()
+            if len(idle) < self.max_connections:
+                idle.append(conn)
+                conn = None
+            closing = self._evict()
+        if conn is not None:
+            closing.append(conn)
+        for stale in closing:
+            stale.close()
+    
+    def _evict(self) -> List[sqlite3.Connection]:
+        """Drop least recently used and idle databases; caller holds the lock"""
+        closing = []
+        deadline = time.monotonic() - self.idle_timeout
+        for db_path in list(self._idle):
+            if len(self._idle) > self.max_databases or self._last_used.get(db_path, 0) < deadline:
+                closing.extend(self._idle.pop(db_path))
+                self._last_used.pop(db_path, None)
+            else:
+                # The rest were used more recently
+                break
+        return closing
+    
+    def discard(self, db_path: str):
+        """Close the idle connections of one database, e.g. before its file changes"""
+        with self._lock:
+            closing = self._idle.pop(db_path, [])
+            self._last_used.pop(db_path, None)
+        for conn in closing:
+            conn.close()
+    
+    def close(self):
+        """Close every idle connection"""
+        with self._lock:
+            closing = [conn for idle in self._idle.values() for conn in idle]
+            self._idle.clear()
+            self._last_used.clear()
+        for conn in closing:
+            conn.close()
+    
+    def stats(self) -> Dict[str, int]:
+        """Number of databases and idle connections held open"""
+        with self._lock:
+            return {
+                "open_databases": len(self._idle),
+                "idle_connections": sum(len(idle) for idle in self._idle.values()),
+            }
+
+
+class QueryService:
+    """
+    Runs read-only SQL on a bounded thread pool, off the event loop
+    
+    Every query runs under a QueryBudget and is admitted by an
+    AdmissionController sized to the thread pool, so overload is refused
+    up front rather than queued inside the pool. Queries that run for
+    longer than the slow query threshold are logged with their plan.
+    """
+    
+    def __init__(
+        self,
+        max_workers: int,
+        max_connections: int,
+        max_databases: int,
+        idle_timeout: float,
+        mmap_size: int,
+        cache_size_kb: int,
+        result_cache_bytes: int = 0,
+        result_cache_ttl: float = 0,
+        timeout: float = 0,
+        max_steps: int = 0,
+        stream_timeout: float = 0,
+        max_queued: int = 64,
+        max_per_database: int = 32,
+        queue_timeout: float = 5.0,
+        slow_query_threshold: float = 1.0,
+        slow_query_log_size: int = 0,
+    ):
+        self.pool = ConnectionPool(
+            max_connections=max_connections,
+            max_databases=max_databases,
+            idle_timeout=idle_timeout,
+            mmap_size=mmap_size,
+            cache_size_kb=cache_size_kb,
+        )
+        self.cache = QueryCache(max_bytes=result_cache_bytes, ttl=result_cache_ttl)
+        self.admission = AdmissionController(
+            max_active=max_workers,
+            max_queued=max_queued,
+            max_per_database=max_per_database,
+            queue_timeout=queue_timeout,
+        )
+        self.slow_log = SlowQueryLog(threshold=slow_query_threshold, size=slow_query_log_size)
+        self.timeout = timeout
+        self.max_steps = max_steps
+        self.stream_timeout = stream_timeout
+        self._executor = ThreadPoolExecutor(max_workers=max_workers, thread_name_prefix="query")
+    
+    def budget(self, timeout: Optional[float] = None) -> QueryBudget:
+        """Budget of one query; timeout may only lower the configured limit"""
+        if timeout is None or (self.timeout and timeout > self.timeout):
+            timeout = self.timeout
+        return QueryBudget(timeout=timeout, max_steps=self.max_steps)
+    
+    def execute(
+        self,
+        db_path: str,
+        sql: str,
+        params: Params = None,
+        max_rows: int = 100,
+        budget: Optional[QueryBudget] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run one SQL statement on a pooled read-only connection
+        
+        Args:
+            db_path: Database path
+            sql: A single SQL statement
+            params: Positional or named parameters bound to the statement
+            max_rows: Most rows to return
+            budget: Limits of the query (default: the configured ones)
+        
+        Returns:
+            Dictionary with columns, rows, row_count, truncated and
+            execution_time (seconds)
+        
+        Raises:
+            sqlite3.Error: If the statement is invalid or tries to write
+            QueryInterruptedError: If the budget ran out or the query was cancelled
+        """
+        budget = budget or self.budget()
+        conn = self.pool.acquire(db_path)
+        try:
+            with self._observed(conn, db_path, "query", sql, params, budget) as observed:
+                started = time.perf_counter()
+                with budget.running(conn):
+                    cursor = conn.execute(sql, params or ())
+                    try:
+                        columns = [column[0] for column in cursor.description or []]
+                        rows = cursor.fetchmany(max_rows + 1)
+                    finally:
+                        cursor.close()
+                execution_time = time.perf_counter() - started
+                observed["rows_returned"] = min(len(rows), max_rows)
+        finally:
+            # Never pool a connection inside a transaction (e.g. after BEGIN)
+            if conn.in_transaction:
+                conn.rollback()
+            self.pool.release(db_path, conn)
+        
+        truncated = len(rows) > max_rows
+        rows = [list(row) for row in rows[:max_rows]]
+        return {
+            "columns": columns,
+            "rows": rows,
+            "row_count": len(rows),
+            "truncated": truncated,
+            "execution_time": round(execution_time, 6),
+        }
+    
+    def _log_if_slow(
+        self,
+        conn: sqlite3.Connection,
+        db_path: str,
+        kind: str,
+        sql: str,
+        params: Any,
+        budget: QueryBudget,
+        rows_returned: int,
+        status: str,
+    ):
+        """
+        Log a query that ran for at least the slow query threshold, with its plan
+        
+        Runs on the query's own connection, after the query, so only slow
+        queries pay for the EXPLAIN QUERY PLAN.
+        """
+        if not self.slow_log.is_slow(budget.elapsed):
+            return
+        try:
+            plan = explain(conn, sql, params)
+        except sqlite3.Error:
+            plan = {"plan": [], "full_scans": []}
+        self.slow_log.record(db_path, {
+            "kind": kind,
+            "sql": sql,
+            "params": params,
+            "status": status,
+            "duration_ms": round(budget.elapsed * 1000, 3),
+            "rows_returned": rows_returned,
+            "vm_steps": budget.steps,
+            **plan,
+            "full_scan": bool(plan["full_scans"]),
+        })
+    
+    @contextmanager
+    def _observed(
+        self,
+        conn: sqlite3.Connection,
+        db_path: str,
+        kind: str,
+        sql: str,
+        params: Any,
+        budget: QueryBudget,
+    ) -> Iterator[Dict[str, Any]]:
+        """
+        Log the query run by a block if it is slow, also when its budget stops it
+        
+        The block sets "rows_returned" in the yielded dictionary. Queries
+        failing for other reasons (invalid SQL, refused statements) are not logged.
+        """
+        observed = {"rows_returned": 0}
+        try:
+            yield observed
+        except QueryInterruptedError as e:
+            self._log_if_slow(conn, db_path, kind, sql, params, budget, observed["rows_returned"], e.reason)
+            raise
+        self._log_if_slow(conn, db_path, kind, sql, params, budget, observed["rows_returned"], COMPLETED)
+    
+    async def _call(self, budget: QueryBudget, fn: Callable, *args: Any) -> Any:
+        """
+        Run fn on the query thread pool and wait for it
+        
+        If the waiting task is cancelled (e.g. its client went away), the
+        query is cancelled too instead of running on unobserved.
+        """
+        future = self._executor.submit(fn, *args)
+        try:
+            return await asyncio.wrap_future(future)
+        except asyncio.CancelledError:
+            budget.cancel()
+            raise
+    
+    async def run(
+        self,
+        db_path: str,
+        sql: str,
+        params: Params = None,
+        max_rows: int = 100,
+        database_id: Optional[str] = None,
+        version: int = 0,
+        budget: Optional[QueryBudget] = None,
+    ) -> Dict[str, Any]:
+        """
+        Run execute on the query thread pool without blocking the event loop
+        
+        With a database_id, results are cached per database version, and a
+        repeated query is answered from memory without touching SQLite or
+        waiting for admission.
+        
+        Returns:
+            The execute result plus "cached" (whether it came from the cache)
+        
+        Raises:
+            DatabaseBusyError, QueryQueueFullError: If the query is not admitted
+        """
+        key = None
+        if database_id is not None and self.cache.max_bytes:
+            key = self.cache.key(database_id, version, sql, params, max_rows)
+        if key is not None:
+            cached = self.cache.get(key)
+            if cached is not None:
+                return {**cached, "cached": True}
+        
+        budget = budget or self.budget()
+        async with self.admission.admit(db_path):
+            result = await self._call(budget, self.execute, db_path, sql, params, max_rows, budget)
+        if key is not None:
+            self.cache.put(key, result)
+        return {**result, "cached": False}
+    
+    async def stream(
+        self,
+        db_path: str,
+        sql: str,
+        encoder: Callable[[List[str]], Any],
+        params: Params = None,
+        batch_size: int = 1000,
+    ) -> AsyncIterator[bytes]:
+        """
+        Run one SQL statement and yield its rows encoded, batch by batch
+        
+        The statement is started before the first (header) chunk is
+        yielded, so errors in it surface before anything is sent. Every
+        ``fetchmany`` batch is read and encoded on the query thread pool;
+        only one batch is held at a time, so results of any size are sent
+        in constant memory. The admission slot is held until the stream
+        ends; the time budget is stream_timeout.
+        
+        Args:
+            db_path: Database path
+            sql: A single SQL statement
+            encoder: Called with the column names; returns an object with
+                header(), encode(rows) and close() methods returning bytes
+                (see result_formats)
+            params: Positional or named parameters bound to the statement
+            batch_size: Rows per batch
+        
+        Yields:
+            Encoded bytes
+        """
+        budget = QueryBudget(timeout=self.stream_timeout, max_steps=self.max_steps)
+        pending: List[Future] = []
+        rows_returned = 0
+        finished = False
+        
+        async def call(fn: Callable, *args: Any) -> Any:
+            future = self._executor.submit(fn, *args)
+            pending[:] = [future]
+            return await asyncio.wrap_future(future)
+        
+        await self.admission.acquire(db_path)
+        try:
+            conn = await call(self.pool.acquire, db_path)
+        except BaseException:
+            self.admission.release(db_path)
+            raise
+        cursor = None
+        
+        def start() -> Any:
+            nonlocal cursor
+            with budget.running(conn):
+                cursor = conn.execute(sql, params or ())
+            return encoder([column[0] for column in cursor.description or []])
+        
+        def read(rows_encoder: Any) -> Optional[bytes]:
+            nonlocal rows_returned
+            with budget.running(conn):
+                rows = cursor.fetchmany(batch_size)
+            rows_returned += len(rows)
+            return rows_encoder.encode(rows) if rows else None
+        
+        def close():
+            if cursor is not None:
+                cursor.close()
+            if cursor is not None or budget.reason:
+                # A stream that ends before its last row was cut off by the client
+                status = budget.reason or (COMPLETED if finished else CANCELLED)
+                self._log_if_slow(conn, db_path, "stream", sql, params, budget, rows_returned, status)
+            if conn.in_transaction:
+                conn.rollback()
+            self.pool.release(db_path, conn)
+        
+        try:
+            rows_encoder = await call(start)
+            yield rows_encoder.header()
+            while True:
+                chunk = await call(read, rows_encoder)
+                if chunk is None:
+                    break
+                yield chunk
+            finished = True
+            yield rows_encoder.close()
+        finally:
+            self.admission.release(db_path)
+            # A read still running on a query thread owns the connection until it ends
+            if pending and not pending[0].done():
+                budget.cancel()
+                pending[0].add_done_callback(lambda _: close())
+            else:
+                close()
+    
+    def page(
+        self,
+        db_path: str,
+        table_name: str,
+        after: Optional[int] = None,
+        limit: int = 100,
+        budget: Optional[QueryBudget] = None,
+    ) -> Dict[str, Any]:
+        """
+        Read the rows of a table in rowid order, after a given rowid
+        
+        The rowid is the table's primary index, so every page is one range
+        seek, as cheap for the last page as for the first.
+        
+        Args:
+            db_path: Database path
+            table_name: Table to read
+            after: Rowid of the last row of the previous page
+            limit: Most rows to return
+            budget: Limits of the query (default: the configured ones)
+        
+        Returns:
+            Dictionary with columns, rows, row_count and next_cursor (None on
+            the last page)
+        
+        Raises:
+            sqlite3.Error: If the table does not exist or has no rowid
+            QueryInterruptedError: If the budget ran out or the query was cancelled
+        """
+        budget = budget or self.budget()
+        sql = (
+            f"SELECT _rowid_, * FROM {quote_identifier(table_name)} "
+            f"WHERE _rowid_ > ? ORDER BY _rowid_ LIMIT ?"
+        )
+        params = [after if after is not None else -(2 ** 63), limit + 1]
+        conn = self.pool.acquire(db_path)
+        try:
+            with self._observed(conn, db_path, "page", sql, params, budget) as observed:
+                with budget.running(conn):
+                    cursor = conn.execute(sql, params)
+                    columns = [column[0] for column in cursor.description][1:]
+                    rows: List[Tuple] = cursor.fetchall()
+                    cursor.close()
+                observed["rows_returned"] = min(len(rows), limit)
+        finally:
+            self.pool.release(db_path, conn)
+        
+        more = len(rows) > limit
+        rows = rows[:limit]
+        return {
+            "columns": columns,
+            "rows": [list(row[1:]) for row in rows],
+            "row_count": len(rows),
+            "next_cursor": encode_cursor(table_name, rows[-1][0]) if more else None,
+        }
+    
+    async def run_page(
+        self,
+        db_path: str,
+        table_name: str,
+        after: Optional[int] = None,
+        limit: int = 100,
+    ) -> Dict[str, Any]:
+        """Run page on the query thread pool without blocking the event loop"""
+        budget = self.budget()
+        async with self.admission.admit(db_path):
+            return await self._call(budget, self.page, db_path, table_name, after, limit, budget)
+    
+    def invalidate(self, database_id: str, db_path: Optional[str] = None):
+        """
+        Forget cached results of a database whose rows changed
+        
+        Args:
+            database_id: Database ID
+            db_path: Path of its file; its idle connections are closed too
+        """
+        self.cache.invalidate(database_id)
+        if db_path is not None:
+            self.pool.discard(db_path)
+    
+    def slow_queries(self, db_path: str) -> List[Dict[str, Any]]:
+        """Slow queries logged for a database, newest first"""
+        return self.slow_log.entries(db_path)
+    
+    def stats(self) -> Dict[str, Any]:
+        """Result cache counters, open connections and admission counters"""
+        return {
+            "cache": self.cache.stats(),
+            "connections": self.pool.stats(),
+            "admission": self.admission.stats(),
+        }
+    
+    def shutdown(self):
+        """Stop the query threads and close pooled connections"""
+        self._executor.shutdown(wait=True)
+        self.pool.close()
+        self.cache.clear()
+        self.slow_log.clear()
@@ -0,0 +1,168 @@
+"""Encoders turning batches of query rows into streamed NDJSON, CSV or Arrow IPC"""
+import io
+import csv
+import json
+import base64
+from typing import Any, List, Sequence
+
+try:
+    import pyarrow
+    import pyarrow.ipc
+except ImportError:  # pragma: no cover - optional dependency
+    pyarrow = None
+
+
+NDJSON = "ndjson"
+CSV = "csv"
+ARROW = "arrow"
+
+MEDIA_TYPES = {
+    NDJSON: "application/x-ndjson",
+    CSV: "text/csv",
+    ARROW: "application/vnd.apache.arrow.stream",
+}
+
+
+class UnsupportedFormatError(Exception):
+    """Raised when a result format cannot be produced"""
+
+
+def get_encoder(name: str) -> type:
+    """
+    Encoder class of a result format
+    
+    Encoders are created with the column names; ``header()``, then
+    ``encode(rows)`` per batch and ``close()`` return the bytes to send.
+    
+    Raises:
+        UnsupportedFormatError: If the format is unknown or needs a missing package
+    """
+    if name not in ENCODERS:
+        raise UnsupportedFormatError(f"Unsupported result format: {name}")
+    if name == ARROW and pyarrow is None:
+        raise UnsupportedFormatError("arrow output requires the optional 'pyarrow' package")
+    return ENCODERS[name]
+
+
+def _json_default(value: Any) -> Any:
+    """BLOB values are sent as base64 text"""
+    if isinstance(value, bytes):
+        return base64.b64encode(value).decode("ascii")
+    raise TypeError(f"Cannot encode {type(value).__name__}")
+
+
+class NDJSONEncoder:
+    """One JSON object per row and line"""
+    
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+    
+    def header(self) -> bytes:
+        return b""
+    
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        lines = [json.dumps(dict(zip(self.columns, row)), default=_json_default) for row in rows]
+        return ("\n".join(lines) + "\n").encode()
+    
+    def close(self) -> bytes:
+        return b""
+
+
+class CSVEncoder:
+    """A header row, then one CSV record per row; BLOBs as base64 text"""
+    
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+    
+    def header(self) -> bytes:
+        return self.encode([self.columns])
+    
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        buffer = io.StringIO()
+        writer = csv.writer(buffer)
+        writer.writerows(
+            [base64.b64encode(value).decode("ascii") if isinstance(value, bytes) else value for value in row]
+            for row in rows
+        )
+        return buffer.getvalue().encode()
+    
+    def close(self) -> bytes:
+        return b""
+
+
+class ArrowEncoder:
+    """
+    One Arrow IPC stream, a record batch per batch of rows
+    
+    SQLite columns are not typed, so each column takes the Arrow type
+    inferred from the first batch (text for columns that are all NULL or
+    mix types there), and the schema is sent with that batch. Later values
+    that do not fit it are sent as text when the column is text and fail
+    the stream otherwise.
+    """
+    
+    def __init__(self, columns: List[str]):
+        self.columns = columns
+        self.sink = io.BytesIO()
+        self.writer = None
+        self.schema = None
+    
+    def header(self) -> bytes:
+        return b""
+    
+    def _arrays(self, rows: Sequence[Sequence[Any]]) -> list:
+        values = list(zip(*rows)) if rows else [() for _ in self.columns]
+        if self.schema is None:
+            arrays = []
+            for column in values:
+                try:
+                    array = pyarrow.array(column)
+                except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                    array = None
+                if array is None or pyarrow.types.is_null(array.type):
+                    array = pyarrow.array(_as_text(column), type=pyarrow.string())
+                arrays.append(array)
+            self.schema = pyarrow.schema(
+                [pyarrow.field(name, array.type) for name, array in zip(self.columns, arrays)]
+            )
+            return arrays
+        arrays = []
+        for column, field in zip(values, self.schema):
+            try:
+                arrays.append(pyarrow.array(column, type=field.type))
+            except (pyarrow.ArrowInvalid, pyarrow.ArrowTypeError):
+                if not pyarrow.types.is_string(field.type):
+                    raise
+                arrays.append(pyarrow.array(_as_text(column), type=field.type))
+        return arrays
+    
+    def encode(self, rows: Sequence[Sequence[Any]]) -> bytes:
+        arrays = self._arrays(rows)
+        if self.writer is None:
+            self.writer = pyarrow.ipc.new_stream(self.sink, self.schema)
+        if rows:
+            self.writer.write_batch(pyarrow.RecordBatch.from_arrays(arrays, schema=self.schema))
+        return self._take()
+    
+    def close(self) -> bytes:
+        """End of stream marker, after the schema if no rows were written"""
+        head = self.encode([]) if self.writer is None else b""
+        self.writer.close()
+        return head + self._take()
+    
+    def _take(self) -> bytes:
+        data = self.sink.getvalue()
+        self.sink.seek(0)
+        self.sink.truncate()
+        return data
+
+
+def _as_text(values: Sequence[Any]) -> list:
+    return [None if value is None else str(value) for value in values]
+
+
+ENCODERS = {
+    NDJSON: NDJSONEncoder,
+    CSV: CSVEncoder,
+    ARROW: ArrowEncoder,
+}
@@ -0,0 +1,138 @@
+"""Sparse byte-offset index of CSV record starts for random-access paging"""
+import io
+import os
+import numpy as np
+import pandas as pd
+from pathlib import Path
+from typing import Dict, Optional
+from app.services.parallel_csv import record_ends
+
+
+# Bytes scanned per read while indexing
+_SCAN_BLOCK_SIZE = 8 * 1024 * 1024
+
+
+def build_row_index(file_path: Path, stride: int) -> np.ndarray:
+    """
+    Collect the byte offset of every ``stride``-th data record of a CSV
+    
+    Entry 0 is the start of the first data record, i.e. the end of the
+    header; entry ``k`` is the start of data row ``k * stride``. Record
+    boundaries use the same vectorized quote-parity scan as parallel parsing,
+    so quoted fields containing newlines are handled.
+    
+    Args:
+        file_path: Path to an uncompressed CSV file
+        stride: Number of rows between indexed offsets
+    
+    Returns:
+        uint64 array of record start offsets, empty if the file has no header
+    """
+    file_size = file_path.stat().st_size
+    parts = []
+    record = -1  # the header is record -1
+    in_quotes = False
+    offset = 0
+    
+    with open(file_path, 'rb') as f:
+        while True:
+            block = f.read(_SCAN_BLOCK_SIZE)
+            if not block:
+                break
+            ends, in_quotes = record_ends(block, in_quotes)
+            starts = ends.astype(np.uint64) + np.uint64(offset + 1)
+            
+            # Record started by starts[i] is data row record + 1 + i
+            first = record + 1
+            wanted = np.arange(-first % stride, len(starts), stride)
+            parts.append(starts[wanted])
+            
+            record += len(starts)
+            offset += len(block)
+    
+    if not parts:
+        return np.empty(0, dtype=np.uint64)
+    index = np.concatenate(parts)
+    # A newline at the very end does not start another record
+    if len(index) and index[-1] >= file_size:
+        index = index[:-1]
+    return index
+
+
+def count_rows(file_path: Path, index: np.ndarray, stride: int) -> int:
+    """
+    Number of data records in a CSV, given its row index
+    
+    Only the tail after the last indexed offset is scanned.
+    """
+    if not len(index):
+        return 0
+    with open(file_path, 'rb') as f:
+        f.seek(int(index[-1]))
+        tail = f.read()
+    ends, _ = record_ends(tail, False)
+    rows = len(ends)
+    if tail and tail[-1:] != b'\n':
+        rows += 1
+    return (len(index) - 1) * stride + rows
+
+
+def write_row_index(index: np.ndarray, index_path: Path):
+    """Save an index atomically"""
+    tmp_path = index_path.with_name(f"{index_path.name}.tmp")
+    with open(tmp_path, 'wb') as f:
+        np.save(f, index)
+    os.replace(tmp_path, index_path)
+
+
+def read_rows(
+    file_path: Path,
+    index_path: Path,
+    stride: int,
+    offset: int,
+    limit: int,
+    dtype: Optional[Dict[str, str]] = None,
+) -> pd.DataFrame:
+    """
+    Parse only the requested rows of a CSV using its row index
+    
+    The file is read from the nearest indexed record at or before ``offset``
+    up to the indexed record after the page, so at most ``limit + 2 * stride``
+    rows are parsed regardless of how deep the page is. Pass the dtypes of
+    the whole file, since the few rows of one page may suggest others
+    (e.g. integers for codes with leading zeros).
+    
+    Args:
+        file_path: Path to the CSV file
+        index_path: Path to the index written by write_row_index
+        stride: Stride the index was built with
+        offset: First data row to return
+        limit: Maximum number of rows to return
+        dtype: Column dtypes to parse with, as for pd.read_csv
+    
+    Returns:
+        DataFrame of at most ``limit`` rows
+    """
+    index = np.load(index_path, mmap_mode='r')
+    header_end = int(index[0])
+    block = offset // stride
+    if block >= len(index):
+        block = len(index) - 1
+    end_block = -(-(offset + limit) // stride)
+    
+    with open(file_path, 'rb') as f:
+        header = f.read(header_end)
+        start = int(index[block])
+        f.seek(start)
+        if end_block < len(index):
+            data = f.read(int(index[end_block]) - start)
+        else:
+            data = f.read()
+    
+    skip = offset - block * stride
+    return pd.read_csv(
+        io.BytesIO(header + data),
+        skiprows=range(1, skip + 1),
+        nrows=limit,
+        dtype=dtype,
+    )
@@ -0,0 +1,258 @@
+"""Dry runs of a schema against a sample of an upload"""
+import re
+import time
+import sqlite3
+import pandas as pd
+from typing import Dict, Any, Optional, Set, Tuple
+from app.config import settings
+from app.services.bulk_loader import (
+    quote_identifier,
+    split_schema,
+    match_columns,
+    insert_statement,
+)
+from app.services.csv_handler import read_upload
+from app.services.type_coercion import (
+    TypeCoercer,
+    INTEGER,
+    REAL,
+    NUMERIC,
+    BOOLEAN,
+    DATE,
+    DATETIME,
+)
+
+
+# Evenly spaced windows the streamed sample is read from
+SAMPLE_WINDOWS = 4
+# Issues of each kind listed in a report; all of them are counted
+MAX_ISSUES = 20
+
+# Why a value that does not convert to its column's kind is reported
+INVALID_VALUE = {
+    INTEGER: "value is not an integer",
+    REAL: "value is not a number",
+    NUMERIC: "value is not a number",
+    BOOLEAN: "value is not a boolean",
+    DATE: "value is not a date",
+    DATETIME: "value is not a date and time",
+}
+# Message of a STRICT table refusing a value
+CANNOT_STORE = re.compile(r"cannot store \w+ value in \w+ column (?:.*\.)?(.+)$")
+
+
+def sample_upload(csv_info: Dict[str, Any], rows: Optional[int] = None) -> pd.DataFrame:
+    """
+    Rows of an upload to dry-run a schema with
+    
+    The stored preview rows are used as they are. Further rows are read
+    from SAMPLE_WINDOWS evenly spaced parts of the rest of the file, so
+    values that only appear late in a file are seen too. Reads go through
+    the columnar cache where the upload has one.
+    
+    Args:
+        csv_info: CSV file metadata
+        rows: Rows to read from the file besides the preview (defaults to
+            settings.validation_sample_rows)
+    
+    Returns:
+        DataFrame indexed by 0-based row number in the file
+    """
+    rows = settings.validation_sample_rows if rows is None else rows
+    preview = pd.DataFrame(csv_info.get("preview") or [], columns=csv_info["columns"])
+    start = len(preview)
+    remaining = max(csv_info.get("row_count", 0) - start, 0)
+    if not rows or not remaining:
+        return preview
+    
+    if remaining <= rows:
+        offsets, size = [start], remaining
+    else:
+        size = max(rows // SAMPLE_WINDOWS, 1)
+        windows = min(SAMPLE_WINDOWS, rows // size)
+        step = (remaining - size) // max(windows - 1, 1)
+        offsets = [start + i * step for i in range(windows)]
+    
+    frames = [preview]
+    for offset in offsets:
+        frame = read_upload(csv_info, skiprows=offset, nrows=size)
+        if frame is None:
+            break
+        frame.index = frame.index + offset
+        frames.append(frame)
+    return pd.concat(frames)
+
+
+def validate_schema(
+    schema: str,
+    csv_info: Dict[str, Any],
+    table_name: Optional[str] = None,
+    sample_rows: Optional[int] = None,
+) -> Dict[str, Any]:
+    """
+    Dry-run a schema against a sample of an upload
+    
+    The whole schema is applied to an in-memory database and the sample
+    rows are converted to the declared column types by the TypeCoercer
+    a build uses, then inserted one at a time, so problems a full build
+    would hit are found in milliseconds and attributed to a column or row.
+    
+    Args:
+        schema: SQL schema
+        csv_info: CSV file metadata
+        table_name: Table the upload is loaded into (default: first table)
+        sample_rows: Rows to read from the file besides the preview
+    
+    Returns:
+        Report with "valid", the table, rows checked, the schema error,
+        unmatched CSV columns, required table columns without CSV data,
+        type errors and constraint violations
+    """
+    started = time.perf_counter()
+    report = {
+        "valid": False,
+        "table_name": table_name,
+        "rows_checked": 0,
+        "schema_error": None,
+        "unmatched_columns": [],
+        "missing_columns": [],
+        "type_errors": [],
+        "type_error_count": 0,
+        "constraint_violations": [],
+        "constraint_violation_count": 0,
+    }
+    
+    conn = sqlite3.connect(":memory:", isolation_level=None)
+    try:
+        error = _apply_schema(conn, schema, table_name)
+        if error:
+            report["schema_error"] = error
+        else:
+            if table_name is None:
+                report["table_name"] = table_name = split_schema(schema)[0][0][0]
+            _check_rows(conn, report, table_name, csv_info, sample_upload(csv_info, sample_rows))
+    finally:
+        conn.close()
+    
+    report["valid"] = not (
+        report["schema_error"]
+        or report["unmatched_columns"]
+        or report["missing_columns"]
+        or report["type_error_count"]
+        or report["constraint_violation_count"]
+    )
+    report["elapsed_ms"] = round((time.perf_counter() - started) * 1000, 2)
+    return report
+
+
+def _apply_schema(conn: sqlite3.Connection, schema: str, table_name: Optional[str]) -> Optional[str]:
+    """Create the schema, returning why it cannot be used or None"""
+    tables, _ = split_schema(schema)
+    if not tables:
+        return "Schema has no CREATE TABLE statement"
+    if table_name is not None and table_name.lower() not in {name.lower() for name, _ in tables}:
+        return f"Schema has no CREATE TABLE for: {table_name}"
+    try:
+        conn.executescript(schema)
+    except sqlite3.Error as e:
+        return str(e)
+    return None
+
+
+def _check_rows(
+    conn: sqlite3.Connection,
+    report: Dict[str, Any],
+    table_name: str,
+    csv_info: Dict[str, Any],
+    sample: pd.DataFrame,
+):
+    """Match the columns and insert the sample, adding what fails to the report"""
+    info = conn.execute(f"PRAGMA table_info({quote_identifier(table_name)})").fetchall()
+    mapping, unmatched = match_columns(csv_info["columns"], [row[1] for row in info])
+    report["unmatched_columns"] = unmatched
+    
+    filled = {column.lower() for column in mapping.values()}
+    rowid_alias = [row[1] for row in info if row[5] == 1 and row[2].upper() == "INTEGER"]
+    report["missing_columns"] = [
+        name for _, name, _, notnull, default, _ in info
+        if notnull and default is None and name.lower() not in filled and name not in rowid_alias
+    ]
+    
+    columns = [name for name in sample.columns if name in mapping]
+    if not columns:
+        return
+    coercer = TypeCoercer(conn, table_name)
+    reported = set()
+    for name in columns:
+        reported.update(_check_values(report, coercer, name, mapping[name], sample[name]))
+    
+    if report["missing_columns"]:
+        # Every row would fail the same NOT NULL constraint
+        return
+    
+    insert_sql = insert_statement(table_name, columns, mapping)
+    converted = coercer.coerce(sample[columns], mapping)
+    # Python scalars sqlite3 can bind; NaN is stored as NULL
+    values = zip(*(converted[name].tolist() for name in columns))
+    conn.execute("BEGIN")
+    for row, params in zip(sample.index.tolist(), values):
+        try:
+            conn.execute(insert_sql, params)
+        except sqlite3.Error as e:
+            refused = CANNOT_STORE.match(str(e))
+            if refused:
+                column = next((name for name in columns if mapping[name].lower() == refused.group(1).lower()), None)
+                value = params[columns.index(column)] if column else None
+                # Values that did not convert were already reported by _check_values
+                if (row, column) not in reported:
+                    _add_issue(report, "type_errors", "type_error_count", {
+                        "row": row,
+                        "column": column,
+                        "value": value,
+                        "message": str(e),
+                    })
+            else:
+                _add_issue(report, "constraint_violations", "constraint_violation_count", {
+                    "row": row,
+                    "message": str(e),
+                })
+    conn.execute("ROLLBACK")
+    report["rows_checked"] = len(sample)
+
+
+def _check_values(
+    report: Dict[str, Any],
+    coercer: TypeCoercer,
+    name: str,
+    column: str,
+    values: pd.Series,
+) -> Set[Tuple[int, str]]:
+    """
+    Report values a build could not convert to the column's declared type
+    
+    A build stores them as NULL, or keeps them in NOT NULL columns where a
+    STRICT table then refuses them.
+    
+    Returns:
+        (row, CSV column) of every reported value
+    """
+    _, invalid = coercer.convert(column, values)
+    if invalid is None or not invalid.any():
+        return set()
+    message = INVALID_VALUE[coercer.kinds[column]]
+    rejected = values[invalid]
+    for row, value in zip(rejected.index.tolist(), rejected.tolist()):
+        _add_issue(report, "type_errors", "type_error_count", {
+            "row": row,
+            "column": name,
+            "value": value,
+            "message": message,
+        })
+    return {(row, name) for row in rejected.index.tolist()}
+
+
+def _add_issue(report: Dict[str, Any], key: str, count_key: str, issue: Dict[str, Any]):
+    """Count an issue and list it while the list is not full"""
+    report[count_key] += 1
+    if len(report[key]) < MAX_ISSUES:
+        report[key].append(issue)
@@ -0,0 +1,127 @@
+"""Log of slow queries with their query plans"""
+import re
+import sqlite3
+import threading
+from collections import deque
+from datetime import datetime, timezone
+from typing import Any, Deque, Dict, List, Optional
+
+# A plan step reading every row of a table ("SCAN TABLE x" before SQLite 3.36)
+SCAN = re.compile(r"^SCAN (?:TABLE )?(\S+)(.*)$")
+# Tables named in FROM and JOIN clauses, with their aliases
+TABLE_ALIAS = re.compile(
+    r"(?:\bFROM|\bJOIN|,)\s+(\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|\w+)"
+    r"(?:\s+(?:AS\s+)?(\"(?:[^\"]|\"\")*\"|`[^`]*`|\[[^\]]*\]|\w+))?",
+    re.IGNORECASE,
+)
+
+
+def _unquote(name: str) -> str:
+    if name[:1] in "\"`[":
+        return name[1:-1].replace('""', '"')
+    return name
+
+
+def explain(conn: sqlite3.Connection, sql: str, params: Any = None) -> Dict[str, Any]:
+    """
+    Query plan of a statement and the tables it reads in full
+    
+    SQLite names a table by its alias in the plan, so aliases are resolved
+    from the FROM and JOIN clauses. Scans of subqueries, CTEs and constant
+    rows are not full table scans; neither are scans using an index.
+    
+    Args:
+        conn: Connection to the database the statement runs on
+        sql: The statement
+        params: Parameters bound to the statement
+    
+    Returns:
+        Dictionary with the "plan" steps (id, parent, detail) and
+        "full_scans": [{"table", "estimated_rows"}], where estimated_rows
+        comes from sqlite_stat1 and is None for tables never analyzed
+    """
+    plan = [
+        {"id": row[0], "parent": row[1], "detail": row[3]}
+        for row in conn.execute(f"EXPLAIN QUERY PLAN {sql}", params or ())
+    ]
+    tables = {
+        name.lower(): name
+        for (name,) in conn.execute("SELECT name FROM sqlite_schema WHERE type = 'table'")
+    }
+    aliases = {}
+    for table, alias in TABLE_ALIAS.findall(sql):
+        table = _unquote(table)
+        if table.lower() in tables:
+            aliases[_unquote(alias or table).lower()] = tables[table.lower()]
+    
+    scanned = []
+    for step in plan:
+        match = SCAN.match(step["detail"])
+        if not match or "INDEX" in match.group(2):
+            continue
+        name = _unquote(match.group(1)).lower()
+        table = aliases.get(name) or tables.get(name)
+        if table is not None and table not in scanned:
+            scanned.append(table)
+    
+    return {
+        "plan": plan,
+        "full_scans": [{"table": table, "estimated_rows": _estimated_rows(conn, table)} for table in scanned],
+    }
+
+
+def _estimated_rows(conn: sqlite3.Connection, table_name: str) -> Optional[int]:
+    """Row count ANALYZE recorded for a table, if any"""
+    try:
+        row = conn.execute("SELECT stat FROM sqlite_stat1 WHERE tbl = ? LIMIT 1", (table_name,)).fetchone()
+    except sqlite3.Error:
+        # Never analyzed: there is no sqlite_stat1
+        return None
+    try:
+        return int(row[0].split()[0]) if row else None
+    except (AttributeError, ValueError, IndexError):
+        return None
+
+
+class SlowQueryLog:
+    """
+    The latest queries of each database that ran for at least ``threshold``
+    
+    Entries are kept in a ring buffer of ``size`` per database, in memory
+    and per server process, so the log costs nothing on disk and the
+    oldest entries make room for new ones.
+    """
+    
+    def __init__(self, threshold: float, size: int):
+        """
+        Args:
+            threshold: Seconds a query must spend in SQLite to be logged
+            size: Entries kept per database; 0 disables the log
+        """
+        self.threshold = threshold
+        self.size = size
+        self._entries: Dict[str, Deque[Dict[str, Any]]] = {}
+        self._lock = threading.Lock()
+    
+    def is_slow(self, elapsed: float) -> bool:
+        """Whether a query that ran this many seconds is logged"""
+        return self.size > 0 and elapsed >= self.threshold
+    
+    def record(self, database: str, entry: Dict[str, Any]):
+        """Add an entry, dropping the oldest one of the database if it is full"""
+        entry = {**entry, "recorded_at": datetime.now(timezone.utc).isoformat()}
+        with self._lock:
+            entries = self._entries.get(database)
+            if entries is None:
+                entries = self._entries[database] = deque(maxlen=self.size)
+            entries.append(entry)
+    
+    def entries(self, database: str) -> List[Dict[str, Any]]:
+        """Logged queries of a database, newest first"""
+        with self._lock:
+            return list(reversed(self._entries.get(database, ())))
+    
+    def clear(self):
+        """Drop every entry"""
+        with self._lock:
+            self._entries.clear()
@@ -0,0 +1,302 @@
+"""Vectorized conversion of CSV values to the declared column types of a table"""
+import sqlite3
+import warnings
+import numpy as np
+import pandas as pd
+from typing import Dict, Any, Optional
+
+
+# How values of a column are converted, derived from its declared type
+INTEGER = "integer"
+REAL = "real"
+NUMERIC = "numeric"
+BOOLEAN = "boolean"
+DATE = "date"
+DATETIME = "datetime"
+TEXT = "text"
+
+# Invalid values kept as examples per column
+MAX_EXAMPLES = 5
+
+# Timestamps ending in a UTC offset
+UTC_OFFSET = r"(?:Z|[+-]\d\d:?\d\d)\s*$"
+
+TRUE_VALUES = {"true", "t", "yes", "y", "1"}
+FALSE_VALUES = {"false", "f", "no", "n", "0"}
+
+
+def column_affinity(declared_type: str) -> str:
+    """
+    Type affinity SQLite gives a column with this declared type
+    
+    Follows the rules of https://www.sqlite.org/datatype3.html#affinity_name_examples
+    """
+    declared = (declared_type or "").upper()
+    if "INT" in declared:
+        return "INTEGER"
+    if any(name in declared for name in ("CHAR", "CLOB", "TEXT")):
+        return "TEXT"
+    if "BLOB" in declared or not declared:
+        return "BLOB"
+    if any(name in declared for name in ("REAL", "FLOA", "DOUB")):
+        return "REAL"
+    return "NUMERIC"
+
+
+def column_kind(declared_type: str) -> Optional[str]:
+    """
+    Conversion applied to values of a column with this declared type
+    
+    Dates and booleans have NUMERIC affinity in SQLite, which would keep
+    them as free text; they are recognized by name so they are stored in
+    one canonical form.
+    
+    Returns:
+        One of the kinds above, or None when values are stored as they are
+    """
+    declared = (declared_type or "").upper()
+    if "BOOL" in declared:
+        return BOOLEAN
+    if "DATETIME" in declared or "TIMESTAMP" in declared:
+        return DATETIME
+    if declared.split("(")[0].strip() == "DATE":
+        return DATE
+    return {
+        "INTEGER": INTEGER,
+        "REAL": REAL,
+        "NUMERIC": NUMERIC,
+        "TEXT": TEXT,
+    }.get(column_affinity(declared_type))
+
+
+def is_strict(conn: sqlite3.Connection, table_name: str) -> bool:
+    """Whether a table was declared STRICT"""
+    row = conn.execute(
+        "SELECT strict FROM pragma_table_list(?) WHERE schema = 'main'", (table_name,)
+    ).fetchone()
+    return bool(row and row[0])
+
+
+class TypeCoercer:
+    """
+    Converts DataFrame chunks to the declared column types of a table
+    
+    Every column is converted with one vectorized pandas operation per
+    chunk before the rows are bound, so numbers are stored as numbers and
+    dates in SQLite's ``YYYY-MM-DD HH:MM:SS`` form. Values that cannot be
+    converted are stored as NULL and counted per column; in NOT NULL
+    columns they are kept as they are, so the row is not lost (a STRICT
+    table then refuses it).
+    """
+    
+    def __init__(self, conn: sqlite3.Connection, table_name: str):
+        self.strict = is_strict(conn, table_name)
+        self.kinds: Dict[str, Optional[str]] = {}
+        self.declared: Dict[str, str] = {}
+        self.not_null = set()
+        for name, declared_type, notnull in conn.execute(
+            "SELECT name, type, \"notnull\" FROM pragma_table_info(?)", (table_name,)
+        ):
+            self.kinds[name] = column_kind(declared_type)
+            self.declared[name] = declared_type
+            if notnull:
+                self.not_null.add(name)
+        self.invalid: Dict[str, Dict[str, Any]] = {}
+    
+    def coerce(self, chunk: pd.DataFrame, mapping: Dict[str, str]) -> pd.DataFrame:
+        """
+        Convert the columns of a chunk in place of a copy
+        
+        Args:
+            chunk: Rows to convert
+            mapping: CSV column -> table column
+        
+        Returns:
+            Chunk with converted columns
+        """
+        converted = {}
+        for name in chunk.columns:
+            column = mapping[name]
+            if self.kinds.get(column) is None:
+                continue
+            values = chunk[name]
+            result, invalid = self.convert(column, values)
+            if invalid is not None and invalid.any():
+                self._record(column, values[invalid])
+                if column in self.not_null:
+                    result = result.astype(object).where(~invalid, values)
+                else:
+                    result = result.astype(object).where(~invalid, None)
+            if result is not values:
+                converted[name] = result
+        if not converted:
+            return chunk
+        return chunk.assign(**converted)
+    
+    def convert(self, column: str, values: pd.Series) -> tuple:
+        """
+        Convert the values of one table column, without recording anything
+        
+        Args:
+            column: Table column
+            values: Values read from the CSV
+        
+        Returns:
+            (converted values, boolean mask of the values that did not
+            convert or None)
+        """
+        kind = self.kinds.get(column)
+        if kind is None:
+            return values, None
+        return _CONVERTERS[kind](values, self.strict)
+    
+    def _record(self, column: str, values: pd.Series):
+        entry = self.invalid.setdefault(column, {
+            "declared_type": self.declared[column],
+            "count": 0,
+            "examples": [],
+        })
+        entry["count"] += len(values)
+        for value in values.astype(str).unique()[:MAX_EXAMPLES]:
+            if len(entry["examples"]) < MAX_EXAMPLES and value not in entry["examples"]:
+                entry["examples"].append(value)
+    
+    def report(self) -> Dict[str, Dict[str, Any]]:
+        """Table column -> declared_type, count and examples of invalid values"""
+        return self.invalid
+
+
+def _numbers(values: pd.Series) -> tuple:
+    """Parse text as numbers; returns (numbers, mask of unparseable values)"""
+    if pd.api.types.is_bool_dtype(values):
+        return values.astype("int64"), None
+    if pd.api.types.is_numeric_dtype(values):
+        return values, None
+    parsed = pd.to_numeric(values, errors="coerce", dtype_backend="numpy_nullable")
+    invalid = values.notna().to_numpy() & parsed.isna().to_numpy()
+    return parsed, invalid
+
+
+def _bindable(values: pd.Series) -> pd.Series:
+    """Nullable extension arrays hold pd.NA, which sqlite3 cannot bind"""
+    if isinstance(values.dtype, pd.api.extensions.ExtensionDtype):
+        return values.astype(object).where(values.notna(), None)
+    return values
+
+
+def _to_integer(values: pd.Series, strict: bool) -> tuple:
+    parsed, invalid = _numbers(values)
+    if strict and pd.api.types.is_float_dtype(parsed):
+        # A STRICT INTEGER column refuses fractional values
+        fractional = (parsed.notna() & (parsed != parsed.round())).to_numpy(dtype=bool)
+        invalid = fractional if invalid is None else invalid | fractional
+    if invalid is None and parsed is values:
+        return values, None
+    return _bindable(parsed), invalid
+
+
+def _to_real(values: pd.Series, strict: bool) -> tuple:
+    parsed, invalid = _numbers(values)
+    if parsed is values and pd.api.types.is_float_dtype(values):
+        return values, None
+    return _bindable(parsed.astype("float64")), invalid
+
+
+def _to_numeric(values: pd.Series, strict: bool) -> tuple:
+    parsed, invalid = _numbers(values)
+    if parsed is values:
+        return values, None
+    return _bindable(parsed), invalid
+
+
+def _to_boolean(values: pd.Series, strict: bool) -> tuple:
+    if pd.api.types.is_bool_dtype(values):
+        return _bindable(values.astype("Int64")), None
+    if pd.api.types.is_numeric_dtype(values):
+        invalid = (values.notna() & ~values.isin([0, 1])).to_numpy()
+        return values, invalid
+    text = values.astype(str).str.strip().str.lower()
+    result = pd.Series(np.where(text.isin(TRUE_VALUES), 1, 0), index=values.index, dtype=object)
+    known = text.isin(TRUE_VALUES) | text.isin(FALSE_VALUES)
+    result = result.where(known & values.notna(), None)
+    invalid = (values.notna() & ~known).to_numpy()
+    return result, invalid
+
+
+def _parse_datetimes(values: pd.Series) -> pd.Series:
+    """Parse ISO 8601 text, then retry other spellings; offsets convert to UTC"""
+    if pd.api.types.is_datetime64_any_dtype(values):
+        if values.dt.tz is not None:
+            return values.dt.tz_convert("UTC").dt.tz_localize(None)
+        return values
+    
+    with warnings.catch_warnings():
+        # Mixed offsets come back as objects (with a warning) and are split below
+        warnings.simplefilter("ignore", FutureWarning)
+        try:
+            parsed = pd.to_datetime(values, format="ISO8601", errors="coerce")
+        except (ValueError, TypeError):
+            parsed = None
+    if parsed is not None and pd.api.types.is_datetime64_dtype(parsed):
+        # Only naive values: the common case, parsed in one pass
+        return _retry_datetimes(values, parsed, utc=False)
+    
+    # Parsed apart: pandas applies one value's offset to naive values parsed with it
+    aware = values.str.contains(UTC_OFFSET, na=False).to_numpy(dtype=bool)
+    parsed = pd.Series(pd.NaT, index=values.index, dtype="datetime64[ns]")
+    for subset, utc in ((~aware, False), (aware, True)):
+        if subset.any():
+            part = pd.to_datetime(values[subset], format="ISO8601", errors="coerce", utc=utc)
+            parsed[subset] = _retry_datetimes(values[subset], part, utc)
+    return parsed
+
+
+def _retry_datetimes(values: pd.Series, parsed: pd.Series, utc: bool) -> pd.Series:
+    """Parse values ISO 8601 could not read with per-value format inference"""
+    retry = values.notna() & parsed.isna()
+    if retry.any():
+        parsed = parsed.copy()
+        parsed[retry] = pd.to_datetime(values[retry], format="mixed", errors="coerce", utc=utc)
+    if utc:
+        parsed = parsed.dt.tz_localize(None)
+    return parsed
+
+
+def _to_datetime(values: pd.Series, strict: bool, date_only: bool = False) -> tuple:
+    if not pd.api.types.is_datetime64_any_dtype(values) and not pd.api.types.is_object_dtype(values):
+        # Numbers (e.g. Unix times) are left for the schema to interpret
+        return values, None
+    parsed = _parse_datetimes(values)
+    invalid = (values.notna() & parsed.isna()).to_numpy()
+    stamps = parsed.to_numpy(dtype="datetime64[ns]")
+    if date_only:
+        text = np.datetime_as_string(stamps, unit="D")
+    else:
+        fractional = (parsed.dt.microsecond.fillna(0) != 0).any()
+        text = np.char.replace(np.datetime_as_string(stamps, unit="us" if fractional else "s"), "T", " ")
+    result = pd.Series(text, index=values.index, dtype=object)
+    return result.where(parsed.notna(), None), invalid
+
+
+def _to_date(values: pd.Series, strict: bool) -> tuple:
+    return _to_datetime(values, strict, date_only=True)
+
+
+def _to_text(values: pd.Series, strict: bool) -> tuple:
+    if pd.api.types.is_float_dtype(values):
+        # Integers read as floats (because of missing values) would become '12.0'
+        whole = values.dropna()
+        if (whole == whole.round()).all() and (whole.abs() < 2 ** 53).all():
+            return _bindable(values.astype("Int64").astype("string")), None
+    return values, None
+
+
+_CONVERTERS = {
+    INTEGER: _to_integer,
+    REAL: _to_real,
+    NUMERIC: _to_numeric,
+    BOOLEAN: _to_boolean,
+    DATE: _to_date,
+    DATETIME: _to_datetime,
+    TEXT: _to_text,
+}
@@ -0,0 +1,358 @@
+"""Resumable chunked upload sessions"""
+import os
+import json
+import time
+import uuid
+import fcntl
+import shutil
+import hashlib
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from fastapi.concurrency import run_in_threadpool
+from typing import Dict, Any, List, Optional, AsyncIterator
+from app.config import settings
+from app.services.compression import detect_compression
+from app.services.csv_handler import UploadTooLargeError
+
+
+SESSION_FILE = "session.json"
+DATA_FILE = "data.part"
+LOCK_FILE = "lock"
+
+
+class UploadSessionError(Exception):
+    """Raised when a chunk or finalize request does not fit the session state"""
+
+
+class UploadSessionExpiredError(UploadSessionError):
+    """Raised when a session has received no data within its TTL"""
+
+
+def merge_range(ranges: List[List[int]], start: int, end: int) -> List[List[int]]:
+    """
+    Add [start, end) to a sorted list of disjoint byte ranges
+    
+    Overlapping and adjacent ranges are merged, so a fully received upload
+    is always the single range [0, total_size).
+    """
+    merged = []
+    for range_start, range_end in ranges:
+        if range_end < start or range_start > end:
+            merged.append([range_start, range_end])
+        else:
+            start = min(start, range_start)
+            end = max(end, range_end)
+    merged.append([start, end])
+    return sorted(merged)
+
+
+def _pwrite_all(fd: int, data: bytes, position: int) -> int:
+    """Write all of data at position; returns the position after it"""
+    view = memoryview(data)
+    while view:
+        written = os.pwrite(fd, view, position)
+        view = view[written:]
+        position += written
+    return position
+
+
+class UploadSessionManager:
+    """
+    Tracks chunked uploads that are assembled in place on disk
+    
+    Each session is a directory holding the preallocated data file, written
+    with positional writes so chunks may arrive in any order and over
+    several connections, plus a JSON record of the byte ranges received.
+    The record is updated under a file lock, so chunks of one session may
+    also be handled by different server processes.
+    
+    The content hash is updated incrementally whenever the contiguous
+    received prefix grows. Hasher state lives in the process that saw the
+    chunks; finalize completes (or recomputes) it from the data file.
+    """
+    
+    def __init__(
+        self,
+        sessions_dir: Path,
+        max_upload_size: Optional[int] = None,
+        ttl: Optional[int] = None,
+        chunk_size: Optional[int] = None,
+    ):
+        self.sessions_dir = sessions_dir
+        self.sessions_dir.mkdir(parents=True, exist_ok=True)
+        self.max_upload_size = max_upload_size or settings.max_upload_size
+        self.ttl = ttl or settings.upload_session_ttl
+        self.chunk_size = chunk_size or settings.upload_chunk_size
+        # session_id -> [hasher, bytes hashed, lock]; only valid in this process
+        self._hashers: Dict[str, List[Any]] = {}
+        self._lock = threading.Lock()
+    
+    def _session_dir(self, session_id: str) -> Path:
+        try:
+            uuid.UUID(session_id)
+        except ValueError:
+            raise KeyError(session_id)
+        return self.sessions_dir / session_id
+    
+    @contextmanager
+    def _locked(self, session_id: str):
+        """Hold the session's file lock (shared across server processes)"""
+        session_dir = self._session_dir(session_id)
+        try:
+            fd = os.open(session_dir / LOCK_FILE, os.O_RDWR | os.O_CREAT)
+        except FileNotFoundError:
+            raise KeyError(session_id)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX)
+            yield
+        finally:
+            os.close(fd)
+    
+    def _read(self, session_id: str) -> Dict[str, Any]:
+        try:
+            with open(self._session_dir(session_id) / SESSION_FILE, 'r') as f:
+                return json.load(f)
+        except FileNotFoundError:
+            raise KeyError(session_id)
+    
+    def _write(self, session: Dict[str, Any]):
+        """Replace the session record atomically"""
+        session['updated_at'] = time.time()
+        session_path = self._session_dir(session['session_id']) / SESSION_FILE
+        tmp_path = session_path.with_name(f"{SESSION_FILE}.{os.getpid()}.{threading.get_ident()}.tmp")
+        with open(tmp_path, 'w') as f:
+            json.dump(session, f)
+        os.replace(tmp_path, session_path)
+    
+    def create(
+        self,
+        filename: str,
+        total_size: int,
+        content_encoding: Optional[str] = None,
+    ) -> Dict[str, Any]:
+        """
+        Start an upload session
+        
+        Args:
+            filename: Name of the file being uploaded
+            total_size: Size of the complete upload in bytes
+            content_encoding: Content-Encoding of the uploaded bytes, if any
+        
+        Returns:
+            The session record
+        """
+        if total_size > self.max_upload_size:
+            raise UploadTooLargeError(
+                f"File exceeds maximum upload size of {self.max_upload_size} bytes"
+            )
+        # Reject unsupported encodings now rather than after the transfer
+        compression = detect_compression(filename, content_encoding)
+        self.cleanup_expired()
+        
+        session_id = str(uuid.uuid4())
+        session_dir = self._session_dir(session_id)
+        session_dir.mkdir()
+        with open(session_dir / DATA_FILE, 'wb') as f:
+            f.truncate(total_size)
+        
+        session = {
+            'session_id': session_id,
+            'filename': filename,
+            'total_size': total_size,
+            'compression': compression,
+            'content_encoding': content_encoding,
+            'received': [],
+            'created_at': time.time(),
+        }
+        self._write(session)
+        return self.describe(session)
+    
+    def describe(self, session: Dict[str, Any]) -> Dict[str, Any]:
+        """Add the derived progress fields to a session record"""
+        bytes_received = sum(end - start for start, end in session['received'])
+        return {
+            **session,
+            'bytes_received': bytes_received,
+            'complete': bytes_received == session['total_size'],
+            'expires_at': session['updated_at'] + self.ttl,
+        }
+    
+    def _check_open(self, session: Dict[str, Any]):
+        """Refuse data for a session that expired or is being finalized"""
+        if time.time() > session['updated_at'] + self.ttl:
+            raise UploadSessionExpiredError(f"Upload session {session['session_id']} has expired")
+        if session.get('finalizing'):
+            raise UploadSessionError(f"Upload session {session['session_id']} is being finalized")
+    
+    def get(self, session_id: str) -> Optional[Dict[str, Any]]:
+        """
+        Get a session with the byte ranges received so far
+        
+        Args:
+            session_id: Session ID
+        
+        Returns:
+            Session record or None if not found
+        """
+        try:
+            return self.describe(self._read(session_id))
+        except KeyError:
+            return None
+    
+    async def receive_chunk(
+        self,
+        session_id: str,
+        offset: int,
+        chunks: AsyncIterator[bytes],
+    ) -> Dict[str, Any]:
+        """
+        Write one chunk of the upload at its byte offset
+        
+        The chunk body is streamed straight into place, in blocks of
+        ``chunk_size`` written on the thread pool. Only a completely
+        received chunk is recorded, so a chunk cut off by a dropped
+        connection is simply sent again.
+        
+        Args:
+            session_id: Session ID
+            offset: Byte offset of the chunk within the upload
+            chunks: Body of the chunk, as it arrives
+        
+        Returns:
+            The updated session record
+        
+        Raises:
+            UploadSessionExpiredError: If the session expired
+            UploadSessionError: If the chunk does not fit the upload or the
+                session is being finalized
+        """
+        session = self._read(session_id)
+        self._check_open(session)
+        total_size = session['total_size']
+        if offset < 0 or offset > total_size:
+            raise UploadSessionError(f"Offset {offset} is outside the upload of {total_size} bytes")
+        
+        fd = os.open(self._session_dir(session_id) / DATA_FILE, os.O_WRONLY)
+        position = offset
+        buffer = bytearray()
+        try:
+            async for data in chunks:
+                if position + len(buffer) + len(data) > total_size:
+                    raise UploadSessionError(f"Chunk extends past the upload size of {total_size} bytes")
+                buffer += data
+                if len(buffer) >= self.chunk_size:
+                    position = await run_in_threadpool(_pwrite_all, fd, buffer, position)
+                    buffer = bytearray()
+            if buffer:
+                position = await run_in_threadpool(_pwrite_all, fd, buffer, position)
+        finally:
+            os.close(fd)
+        
+        session = await run_in_threadpool(self._record_range, session_id, offset, position)
+        if session['received'] and session['received'][0][0] == 0:
+            await run_in_threadpool(self._advance_hash, session_id, session['received'][0][1])
+        return self.describe(session)
+    
+    def _record_range(self, session_id: str, start: int, end: int) -> Dict[str, Any]:
+        """Mark [start, end) as received"""
+        with self._locked(session_id):
+            session = self._read(session_id)
+            self._check_open(session)
+            if end > start:
+                session['received'] = merge_range(session['received'], start, end)
+                self._write(session)
+        return session
+    
+    def _advance_hash(self, session_id: str, upto: int):
+        """Hash the received prefix of the data file up to ``upto`` bytes"""
+        with self._lock:
+            state = self._hashers.setdefault(session_id, [hashlib.blake2b(), 0, threading.Lock()])
+        hasher, _, lock = state
+        with lock:
+            with open(self._session_dir(session_id) / DATA_FILE, 'rb') as f:
+                f.seek(state[1])
+                while state[1] < upto:
+                    block = f.read(min(self.chunk_size, upto - state[1]))
+                    if not block:
+                        break
+                    hasher.update(block)
+                    state[1] += len(block)
+    
+    def finalize(self, session_id: str) -> Dict[str, Any]:
+        """
+        Close a complete session
+        
+        The session is claimed under its lock, so of concurrent finalize
+        calls only one takes over the data file; the others are refused.
+        Call ``release`` if the data file was not taken over after all.
+        
+        Args:
+            session_id: Session ID
+        
+        Returns:
+            The session record plus 'data_path' of the assembled file and,
+            for uncompressed uploads, its 'content_hash'
+        
+        Raises:
+            UploadSessionExpiredError: If the session expired
+            UploadSessionError: If bytes are missing or the session is
+                already being finalized
+        """
+        with self._locked(session_id):
+            session = self._read(session_id)
+            self._check_open(session)
+            described = self.describe(session)
+            if not described['complete']:
+                raise UploadSessionError(
+                    f"Upload incomplete: received {described['bytes_received']} of {described['total_size']} bytes"
+                )
+            session['finalizing'] = True
+            self._write(session)
+        
+        session = self.describe(session)
+        session['data_path'] = str(self._session_dir(session_id) / DATA_FILE)
+        if session['compression'] is None:
+            self._advance_hash(session_id, session['total_size'])
+            session['content_hash'] = self._hashers[session_id][0].hexdigest()
+        return session
+    
+    def release(self, session_id: str):
+        """Undo a finalize claim whose data file was not taken over"""
+        with self._locked(session_id):
+            session = self._read(session_id)
+            session.pop('finalizing', None)
+            self._write(session)
+    
+    def delete(self, session_id: str) -> bool:
+        """
+        Remove a session and its data
+        
+        Args:
+            session_id: Session ID
+        
+        Returns:
+            True if the session existed
+        """
+        session_dir = self._session_dir(session_id)
+        with self._lock:
+            self._hashers.pop(session_id, None)
+        if not session_dir.exists():
+            return False
+        shutil.rmtree(session_dir, ignore_errors=True)
+        return True
+    
+    def cleanup_expired(self):
+        """Remove sessions that have not received data within the TTL"""
+        cutoff = time.time() - self.ttl
+        for session_dir in self.sessions_dir.iterdir():
+            session_path = session_dir / SESSION_FILE
+            try:
+                expired = session_path.stat().st_mtime < cutoff
+            except FileNotFoundError:
+                continue
+            if expired:
+                try:
+                    self.delete(session_dir.name)
+                except KeyError:
+                    continue
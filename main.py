@@ -1,17 +1,16 @@
 from fastapi import FastAPI
 from fastapi.middleware.cors import CORSMiddleware
 from contextlib import asynccontextmanager
-from pathlib import Path
 
-from app.api.routes import csv_routes, schema_routes, database_routes, health_routes
+from app.api.routes import csv_routes, schema_routes, database_routes, health_routes, job_routes, query_routes
+from app.api.dependencies import shutdown_services
+from app.services import parallel_csv, parallel_load
 from app.config import settings
 
 
 # Create necessary directories
-UPLOAD_DIR = Path("uploads")
-DB_DIR = Path("databases")
-UPLOAD_DIR.mkdir(exist_ok=True)
-DB_DIR.mkdir(exist_ok=True)
+settings.upload_dir.mkdir(exist_ok=True)
+settings.db_dir.mkdir(exist_ok=True)
 
 
 @asynccontextmanager
@@ -22,6 +21,9 @@ async def lifespan(app: FastAPI):
     yield
     # Shutdown
     print("Shutting down Data Query Backend...")
+    shutdown_services()
+    parallel_csv.shutdown_pool()
+    parallel_load.shutdown_pool()
 
 
 app = FastAPI(
@@ -45,13 +47,17 @@ app.include_router(health_routes.router)
 app.include_router(csv_routes.router)
 app.include_router(schema_routes.router)
 app.include_router(database_routes.router)
+app.include_router(job_routes.router)
+app.include_router(query_routes.router)
 
 
 if __name__ == "__main__":
     import uvicorn
+    # Auto-reload only works with a single process
     uvicorn.run(
         "main:app",
         host="0.0.0.0",
         port=8000,
-        reload=True,
+        reload=settings.workers == 1,
+        workers=settings.workers,
     )
@@ -1,4 +1,6 @@
 """Tests for CSV upload routes"""
+import gzip
+import uuid
 import pytest
 from io import BytesIO
 
@@ -51,3 +53,233 @@ def test_upload_malformed_csv(client):
     # Should handle gracefully - either succeed with parsing or fail clearly
     # The actual behavior depends on pandas' handling
     assert response.status_code in [200, 400, 500]
+
+
+def test_upload_exceeding_size_limit(client, sample_csv_bytes, monkeypatch):
+    """Test upload larger than max_upload_size is rejected while streaming"""
+    from app.api.dependencies import get_csv_handler
+    monkeypatch.setattr(get_csv_handler(), "max_upload_size", 16)
+    
+    files = {"file": ("big.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    response = client.post("/api/upload-csv", files=files)
+    
+    assert response.status_code == 413
+    assert "maximum upload size" in response.json()["detail"]
+
+
+def test_upload_duplicate_content_is_deduplicated(client):
+    """Test re-uploading identical content reuses the stored analysis"""
+    content = f"id,token\n1,{uuid.uuid4()}\n2,b\n".encode()
+    
+    first = client.post("/api/upload-csv", files={"file": ("a.csv", BytesIO(content), "text/csv")})
+    second = client.post("/api/upload-csv", files={"file": ("b.csv", BytesIO(content), "text/csv")})
+    
+    assert first.status_code == 200
+    assert second.status_code == 200
+    assert first.json()["deduplicated"] is False
+    assert second.json()["deduplicated"] is True
+    assert second.json()["file_id"] != first.json()["file_id"]
+    assert second.json()["filename"] == "b.csv"
+    assert second.json()["row_count"] == 2
+    
+    from app.api.dependencies import get_csv_handler
+    first_info = get_csv_handler().get_csv_info(first.json()["file_id"])
+    second_info = get_csv_handler().get_csv_info(second.json()["file_id"])
+    assert second_info["file_path"] == first_info["file_path"]
+    assert second_info["columnar_path"] == first_info["columnar_path"]
+
+
+def test_upload_gzip_csv(client):
+    """Test a .csv.gz upload is decompressed while streaming"""
+    content = f"id,token\n1,{uuid.uuid4()}\n2,b\n3,c\n".encode()
+    files = {"file": ("data.csv.gz", BytesIO(gzip.compress(content)), "application/gzip")}
+    response = client.post("/api/upload-csv", files=files)
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["row_count"] == 3
+    assert data["columns"] == ["id", "token"]
+    
+    from app.api.dependencies import get_csv_handler
+    info = get_csv_handler().get_csv_info(data["file_id"])
+    assert info["file_path"].endswith(".csv")
+    assert info["content_size"] == len(content)
+    
+    # Same content uploaded uncompressed is a duplicate
+    plain = client.post("/api/upload-csv", files={"file": ("data.csv", BytesIO(content), "text/csv")})
+    assert plain.json()["deduplicated"] is True
+
+
+@pytest.mark.parametrize("body", [
+    gzip.compress(b"id,token\n1,a\n2,b\n")[:-12],
+    b"\x1f\x8b not gzip at all",
+])
+def test_upload_corrupt_gzip_rejected(client, body):
+    """Test truncated or corrupt compressed uploads are client errors"""
+    files = {"file": ("data.csv.gz", BytesIO(body), "application/gzip")}
+    response = client.post("/api/upload-csv", files=files)
+    
+    assert response.status_code == 400
+    assert "gzip data" in response.json()["detail"]
+
+
+def test_upload_content_encoding_kept_compressed(client):
+    """Test Content-Encoding uploads can be stored compressed and still read"""
+    content = f"id,token\n1,{uuid.uuid4()}\n2,b\n".encode()
+    files = {"file": ("data.csv", BytesIO(gzip.compress(content)), "text/csv", {"Content-Encoding": "gzip"})}
+    response = client.post("/api/upload-csv?keep_compressed=true", files=files)
+    
+    assert response.status_code == 200
+    assert response.json()["row_count"] == 2
+    
+    from app.api.dependencies import get_csv_handler
+    file_id = response.json()["file_id"]
+    info = get_csv_handler().get_csv_info(file_id)
+    assert info["file_path"].endswith(".csv.gz")
+    assert info["compression"] == "gzip"
+    assert get_csv_handler().get_dataframe(file_id)["id"].tolist() == [1, 2]
+
+
+def test_upload_unsupported_content_encoding(client, sample_csv_bytes):
+    """Test an unknown Content-Encoding is rejected"""
+    files = {"file": ("data.csv", BytesIO(sample_csv_bytes), "text/csv", {"Content-Encoding": "br"})}
+    response = client.post("/api/upload-csv", files=files)
+    
+    assert response.status_code == 415
+
+
+def test_get_file_rows(client):
+    """Test paging through an upload's rows"""
+    content = "id,token\n" + "".join(f"{i},{uuid.uuid4()}\n" for i in range(50))
+    upload = client.post("/api/upload-csv", files={"file": ("rows.csv", BytesIO(content.encode()), "text/csv")})
+    file_id = upload.json()["file_id"]
+    
+    response = client.get(f"/api/files/{file_id}/rows", params={"offset": 45, "limit": 10})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total_rows"] == 50
+    assert data["columns"] == ["id", "token"]
+    assert [row["id"] for row in data["rows"]] == [45, 46, 47, 48, 49]
+    
+    past_end = client.get(f"/api/files/{file_id}/rows", params={"offset": 50})
+    assert past_end.json()["rows"] == []
+
+
+def test_get_file_rows_keeps_column_types_of_the_file(client):
+    """Test a page is parsed with the upload's column types, not its own"""
+    content = "code,amount\nA12,\n" + "".join(f"{i:03d},{i}\n" for i in range(1, 20))
+    upload = client.post("/api/upload-csv", files={"file": ("codes.csv", BytesIO(content.encode()), "text/csv")})
+    file_id = upload.json()["file_id"]
+    
+    response = client.get(f"/api/files/{file_id}/rows", params={"offset": 5, "limit": 3})
+    
+    rows = response.json()["rows"]
+    assert [row["code"] for row in rows] == ["005", "006", "007"]
+    assert [row["amount"] for row in rows] == [5.0, 6.0, 7.0]
+
+
+def test_get_file_rows_not_found(client):
+    """Test paging a non-existent file"""
+    response = client.get(f"/api/files/{uuid.uuid4()}/rows")
+    
+    assert response.status_code == 404
+
+
+def test_chunked_upload_out_of_order(client):
+    """Test a resumable upload assembled from chunks sent out of order"""
+    content = ("id,token\n" + "".join(f"{i},{uuid.uuid4()}\n" for i in range(20))).encode()
+    middle = len(content) // 2
+    
+    created = client.post("/api/uploads", json={"filename": "chunked.csv", "total_size": len(content)})
+    assert created.status_code == 201
+    session_id = created.json()["session_id"]
+    
+    second = client.put(f"/api/uploads/{session_id}", params={"offset": middle}, content=content[middle:])
+    assert second.json()["received"] == [[middle, len(content)]]
+    assert second.json()["complete"] is False
+    
+    incomplete = client.post(f"/api/uploads/{session_id}/finalize")
+    assert incomplete.status_code == 409
+    
+    first = client.put(f"/api/uploads/{session_id}", params={"offset": 0}, content=content[:middle])
+    assert first.json()["received"] == [[0, len(content)]]
+    assert client.get(f"/api/uploads/{session_id}").json()["complete"] is True
+    
+    finalized = client.post(f"/api/uploads/{session_id}/finalize")
+    assert finalized.status_code == 200
+    assert finalized.json()["row_count"] == 20
+    assert client.get(f"/api/uploads/{session_id}").status_code == 404
+    
+    # The incrementally computed hash matches a regular upload of the same bytes
+    plain = client.post("/api/upload-csv", files={"file": ("plain.csv", BytesIO(content), "text/csv")})
+    assert plain.json()["deduplicated"] is True
+
+
+def test_chunked_upload_rejects_chunk_past_end(client):
+    """Test chunks must fit inside the declared size"""
+    created = client.post("/api/uploads", json={"filename": "small.csv", "total_size": 4})
+    session_id = created.json()["session_id"]
+    
+    response = client.put(f"/api/uploads/{session_id}", params={"offset": 2}, content=b"abcdef")
+    
+    assert response.status_code == 400
+    assert client.get(f"/api/uploads/{session_id}").json()["received"] == []
+    assert client.delete(f"/api/uploads/{session_id}").status_code == 200
+
+
+def test_chunked_upload_rejects_chunks_after_expiry(client, monkeypatch):
+    """Test an expired session refuses chunks and finalize with 410"""
+    from app.api.dependencies import get_upload_sessions
+    created = client.post("/api/uploads", json={"filename": "late.csv", "total_size": 4})
+    session_id = created.json()["session_id"]
+    monkeypatch.setattr(get_upload_sessions(), "ttl", -1)
+    
+    chunk = client.put(f"/api/uploads/{session_id}", params={"offset": 0}, content=b"a,b\n")
+    finalized = client.post(f"/api/uploads/{session_id}/finalize")
+    
+    assert chunk.status_code == 410
+    assert finalized.status_code == 410
+    assert client.get(f"/api/uploads/{session_id}").json()["received"] == []
+    assert client.delete(f"/api/uploads/{session_id}").status_code == 200
+
+
+def test_chunked_upload_finalized_once(client):
+    """Test only one of two finalize calls takes over a session"""
+    from app.api.dependencies import get_upload_sessions
+    from app.services.upload_sessions import UploadSessionError
+    upload_sessions = get_upload_sessions()
+    content = b"id,name\n1,a\n"
+    created = client.post("/api/uploads", json={"filename": "once.csv", "total_size": len(content)})
+    session_id = created.json()["session_id"]
+    client.put(f"/api/uploads/{session_id}", params={"offset": 0}, content=content)
+    
+    claimed = upload_sessions.finalize(session_id)
+    with pytest.raises(UploadSessionError):
+        upload_sessions.finalize(session_id)
+    assert client.post(f"/api/uploads/{session_id}/finalize").status_code == 409
+    assert client.put(f"/api/uploads/{session_id}", params={"offset": 0}, content=content).status_code == 400
+    
+    upload_sessions.release(session_id)
+    finalized = client.post(f"/api/uploads/{session_id}/finalize")
+    assert finalized.status_code == 200
+    assert finalized.json()["row_count"] == 1
+    assert claimed["content_hash"]
+
+
+def test_list_files_filtered_by_filename(client):
+    """Test listing uploads with a file name filter and pagination"""
+    filename = f"{uuid.uuid4()}.csv"
+    file_ids = []
+    for i in range(3):
+        content = f"id,token\n{i},{uuid.uuid4()}\n".encode()
+        upload = client.post("/api/upload-csv", files={"file": (filename, BytesIO(content), "text/csv")})
+        file_ids.append(upload.json()["file_id"])
+    
+    response = client.get("/api/files", params={"filename": filename, "limit": 2, "offset": 1})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 3
+    assert [item["file_id"] for item in data["items"]] == file_ids[1:]
+    assert "preview" not in data["items"][0]
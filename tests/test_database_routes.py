@@ -1,4 +1,6 @@
 """Tests for database creation routes"""
+import uuid
+import sqlite3
 import pytest
 from io import BytesIO
 from pathlib import Path
@@ -100,3 +102,431 @@ def test_create_database_invalid_schema(client, sample_csv_bytes):
     
     assert response.status_code == 500
     assert "error" in response.json()["detail"].lower()
+
+
+def test_list_databases_by_file(client, sample_csv_bytes):
+    """Test listing the databases built from one upload"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    schema = "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);"
+    created = client.post("/api/create-database", json={"file_id": file_id, "sql_schema": schema})
+    assert created.status_code == 200
+    
+    response = client.get("/api/databases", params={"file_id": file_id})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] >= 1
+    assert created.json()["database_id"] in [item["database_id"] for item in data["items"]]
+    assert all(item["file_id"] == file_id for item in data["items"])
+
+
+def test_create_database_async_mode(client, sample_csv_bytes):
+    """Test a background build returns the database ID and reports progress"""
+    from tests.test_job_routes import wait_for_job
+    
+    # Unique content so the build is not answered from the build cache
+    content = sample_csv_bytes + f"4,{uuid.uuid4()},x@example.com,40\n".encode()
+    files = {"file": ("test.csv", BytesIO(content), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    schema = "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);"
+    response = client.post(
+        "/api/create-database?async_mode=true",
+        json={"file_id": file_id, "sql_schema": schema, "db_name": f"async_{uuid.uuid4().hex}"}
+    )
+    
+    assert response.status_code == 202
+    data = response.json()
+    assert data["database_id"]
+    assert data["file_id"] == file_id
+    
+    job = wait_for_job(client, data["job_id"])
+    assert job["status"] == "completed"
+    assert job["kind"] == "build_database"
+    assert job["result"]["database_id"] == data["database_id"]
+    assert job["result"]["row_count"] == 4
+    assert job["progress"]["phase"] == "analyzing"
+    assert job["progress"]["rows_loaded"] == 4
+    
+    listed = client.get("/api/databases", params={"file_id": file_id}).json()
+    assert data["database_id"] in [item["database_id"] for item in listed["items"]]
+
+
+def test_create_database_async_mode_failure(client, sample_csv_bytes):
+    """Test a failed background build removes the database file"""
+    from tests.test_job_routes import wait_for_job
+    
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    response = client.post(
+        "/api/create-database?async_mode=true",
+        json={"file_id": file_id, "sql_schema": "CREATE TABLE t (unrelated TEXT);", "db_name": f"async_{uuid.uuid4().hex}"}
+    )
+    assert response.status_code == 202
+    
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "failed"
+    assert "no columns" in job["error"]
+    assert client.get("/api/databases", params={"file_id": file_id}).json()["total"] == 0
+
+
+def test_create_database_index_columns(client, sample_csv_bytes):
+    """Test requested indexes are created and recorded with the database"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    schema = "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER);"
+    response = client.post(
+        "/api/create-database",
+        json={
+            "file_id": file_id,
+            "sql_schema": schema,
+            "db_name": f"indexed_{uuid.uuid4().hex}",
+            "index_columns": ["email", "id"],
+        }
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    # id is the rowid already and needs no index
+    assert data["optimization"]["indexes"] == [
+        {"name": "idx_people_email", "columns": ["email"], "reason": "requested"}
+    ]
+    assert data["optimization"]["analyzed"] is True
+    
+    conn = sqlite3.connect(data["database_path"])
+    try:
+        plan = conn.execute(
+            "EXPLAIN QUERY PLAN SELECT * FROM people WHERE email = 'jane@example.com'"
+        ).fetchall()
+        assert "idx_people_email" in plan[0][3]
+        assert conn.execute("SELECT COUNT(*) FROM sqlite_stat1").fetchone()[0] >= 1
+    finally:
+        conn.close()
+    
+    listed = client.get("/api/databases", params={"file_id": file_id}).json()
+    info = next(item for item in listed["items"] if item["database_id"] == data["database_id"])
+    assert info["optimization"] == data["optimization"]
+
+
+def test_create_database_without_optimize(client, sample_csv_bytes):
+    """Test optimization can be turned off per request"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    schema = "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);"
+    response = client.post(
+        "/api/create-database",
+        json={
+            "file_id": file_id,
+            "sql_schema": schema,
+            "db_name": f"plain_{uuid.uuid4().hex}",
+            "optimize": False,
+        }
+    )
+    
+    assert response.status_code == 200
+    assert response.json()["optimization"] is None
+
+
+def test_create_database_reuses_identical_build(client, sample_csv_bytes):
+    """Test a repeated build is answered from the existing database"""
+    content = sample_csv_bytes + f"4,{uuid.uuid4()},x@example.com,40\n".encode()
+    files = {"file": ("test.csv", BytesIO(content), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    request = {
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);",
+        "db_name": f"first_{uuid.uuid4().hex}",
+    }
+    first = client.post("/api/create-database", json=request).json()
+    assert first["cached"] is False
+    
+    # Same inputs and path: the same database is returned
+    again = client.post("/api/create-database?async_mode=true", json=request)
+    assert again.status_code == 200
+    assert again.json()["cached"] is True
+    assert again.json()["database_id"] == first["database_id"]
+    
+    # Reformatted schema and another name: the database is copied
+    copy_request = {
+        **request,
+        "sql_schema": "CREATE TABLE people (\n  id INTEGER,\n  name TEXT,\n  email TEXT,\n  age INTEGER\n)",
+        "db_name": f"copy_{uuid.uuid4().hex}",
+    }
+    copy = client.post("/api/create-database", json=copy_request).json()
+    assert copy["cached"] is True
+    assert copy["database_id"] != first["database_id"]
+    assert copy["row_count"] == 4
+    conn = sqlite3.connect(copy["database_path"])
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM people").fetchone()[0] == 4
+    finally:
+        conn.close()
+    
+    # Different options are a different build
+    other = client.post("/api/create-database", json={
+        **request,
+        "db_name": f"plain_{uuid.uuid4().hex}",
+        "optimize": False,
+    }).json()
+    assert other["cached"] is False
+
+
+def test_create_database_name_collision(client, sample_csv_bytes):
+    """Test a taken database name is refused instead of overwritten"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    db_name = f"taken_{uuid.uuid4().hex}"
+    first = client.post("/api/create-database", json={
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);",
+        "db_name": db_name,
+    })
+    assert first.status_code == 200
+    
+    response = client.post("/api/create-database", json={
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE others (id INTEGER, name TEXT, email TEXT, age INTEGER);",
+        "db_name": db_name,
+    })
+    
+    assert response.status_code == 409
+    assert "already exists" in response.json()["detail"]
+    assert Path(first.json()["database_path"]).exists()
+
+
+def test_create_database_from_several_uploads(client, sample_csv_bytes):
+    """Test one database is built from an upload per table, indexes and foreign keys last"""
+    people_csv = sample_csv_bytes + f"4,{uuid.uuid4()},x@example.com,40\n".encode()
+    orders_csv = b"order_id,person_id,total\n1,1,9.5\n2,2,20.0\n3,99,1.0\n"
+    file_ids = []
+    for name, content in (("people.csv", people_csv), ("orders.csv", orders_csv)):
+        files = {"file": (name, BytesIO(content), "text/csv")}
+        file_ids.append(client.post("/api/upload-csv", files=files).json()["file_id"])
+    schema = (
+        "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER);\n"
+        "CREATE TABLE orders (order_id INTEGER PRIMARY KEY, "
+        "person_id INTEGER REFERENCES people(id), total REAL);\n"
+        "CREATE INDEX idx_orders_person ON orders (person_id);"
+    )
+    response = client.post(
+        "/api/create-database",
+        json={
+            "file_id": file_ids[1],
+            "sql_schema": schema,
+            "db_name": f"shop_{uuid.uuid4().hex}",
+            "tables": [
+                {"file_id": file_ids[0], "table_name": "people"},
+                {"file_id": file_ids[1], "table_name": "orders"},
+            ],
+            "index_columns": ["people.email"],
+        }
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["table_name"] == "orders"
+    assert data["row_count"] == 7
+    assert data["tables"] == [
+        {"table_name": "people", "file_id": file_ids[0], "row_count": 4},
+        {"table_name": "orders", "file_id": file_ids[1], "row_count": 3},
+    ]
+    # Order 3 refers to a person that does not exist
+    assert data["foreign_key_violations"] == {"orders": 1}
+    assert [index["name"] for index in data["optimization"]["indexes"]] == ["idx_people_email"]
+    
+    conn = sqlite3.connect(data["database_path"])
+    try:
+        indexes = {row[0] for row in conn.execute("SELECT name FROM sqlite_master WHERE type = 'index'")}
+        assert {"idx_orders_person", "idx_people_email"} <= indexes
+        assert conn.execute("SELECT SUM(total) FROM orders").fetchone()[0] == 30.5
+    finally:
+        conn.close()
+    assert not Path(data["database_path"] + ".parts").exists()
+
+
+def test_create_database_tables_must_match_schema(client, sample_csv_bytes):
+    """Test multi-table requests naming unknown tables or uploads are rejected"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    schema = "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);"
+    
+    response = client.post(
+        "/api/create-database",
+        json={"file_id": file_id, "sql_schema": schema, "tables": [{"file_id": file_id, "table_name": "staff"}]}
+    )
+    assert response.status_code == 400
+    
+    response = client.post(
+        "/api/create-database",
+        json={
+            "file_id": file_id,
+            "sql_schema": schema,
+            "tables": [
+                {"file_id": file_id, "table_name": "people"},
+                {"file_id": "missing", "table_name": "people"},
+            ],
+        }
+    )
+    assert response.status_code == 400
+
+
+def test_create_database_coerces_declared_types(client):
+    """Test values are stored as the declared types and invalid ones are reported"""
+    csv_content = (
+        f"id,joined,active,score\n"
+        f"1,2024-01-31,true,10\n"
+        f"2,2024-02-01T08:30:00,false,unknown\n"
+        f"3,{uuid.uuid4()},yes,7.5\n"
+    )
+    files = {"file": ("members.csv", BytesIO(csv_content.encode()), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    schema = "CREATE TABLE members (id INTEGER PRIMARY KEY, joined DATE, active BOOLEAN, score REAL);"
+    
+    response = client.post("/api/create-database", json={"file_id": file_id, "sql_schema": schema})
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["row_count"] == 3
+    assert {column: entry["count"] for column, entry in data["invalid_values"].items()} == {
+        "joined": 1, "score": 1,
+    }
+    assert data["invalid_values"]["score"]["examples"] == ["unknown"]
+    
+    conn = sqlite3.connect(data["database_path"])
+    try:
+        rows = conn.execute(
+            "SELECT joined, active, score, typeof(score) FROM members ORDER BY id"
+        ).fetchall()
+    finally:
+        conn.close()
+    assert rows == [
+        ("2024-01-31", 1, 10.0, "real"),
+        ("2024-02-01", 0, None, "null"),
+        (None, 1, 7.5, "real"),
+    ]
+
+
+def test_append_and_upsert_rows(client, sample_csv_bytes):
+    """Test appending an upload inserts new rows and upserts on a declared key"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    created = client.post("/api/create-database", json={
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER);",
+        "db_name": f"delta_{uuid.uuid4().hex}",
+    }).json()
+    database_id = created["database_id"]
+    
+    delta = f"id,name,email,age\n3,Charlie,charlie@example.org,36\n4,{uuid.uuid4()},dana@example.com,41\n"
+    delta_id = client.post(
+        "/api/upload-csv", files={"file": ("delta.csv", BytesIO(delta.encode()), "text/csv")}
+    ).json()["file_id"]
+    
+    # Plain append fails on the duplicate key and leaves the table unchanged
+    conflict = client.post(f"/api/databases/{database_id}/append", json={"file_id": delta_id})
+    assert conflict.status_code == 409
+    
+    response = client.post(
+        f"/api/databases/{database_id}/append",
+        json={"file_id": delta_id, "key_columns": ["id"]},
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["rows_loaded"], data["rows_inserted"], data["rows_updated"]) == (2, 1, 1)
+    assert data["row_count"] == 4
+    conn = sqlite3.connect(created["database_path"])
+    try:
+        assert conn.execute("SELECT COUNT(*) FROM people").fetchone()[0] == 4
+        assert conn.execute("SELECT email FROM people WHERE id = 3").fetchone()[0] == "charlie@example.org"
+    finally:
+        conn.close()
+    
+    listed = client.get("/api/databases", params={"file_id": file_id}).json()
+    info = next(item for item in listed["items"] if item["database_id"] == database_id)
+    assert info["row_count"] == 4
+    assert info["appends"][0]["file_id"] == delta_id
+    
+    # The extended database no longer answers builds of the original inputs
+    rebuilt = client.post("/api/create-database", json={
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER);",
+        "db_name": f"rebuilt_{uuid.uuid4().hex}",
+    }).json()
+    assert rebuilt["row_count"] == 3
+
+
+def test_append_reports_rows_skipped_on_key_only_upload(client):
+    """Test rows whose key exists count as skipped when there is nothing to update"""
+    def upload(text):
+        files = {"file": (f"{uuid.uuid4()}.csv", BytesIO(text.encode()), "text/csv")}
+        return client.post("/api/upload-csv", files=files).json()["file_id"]
+    
+    database_id = client.post("/api/create-database", json={
+        "file_id": upload(f"code\n{uuid.uuid4()}\nb\n"),
+        "sql_schema": "CREATE TABLE codes (code TEXT PRIMARY KEY);",
+        "db_name": f"codes_{uuid.uuid4().hex}",
+    }).json()["database_id"]
+    
+    response = client.post(
+        f"/api/databases/{database_id}/append",
+        json={"file_id": upload("code\nb\nc\n"), "key_columns": ["code"]},
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert (data["rows_inserted"], data["rows_updated"], data["rows_skipped"]) == (1, 0, 1)
+    assert data["row_count"] == 3
+
+
+def test_append_missing_metadata_is_not_reported_as_unknown_database(client, sample_csv_bytes, monkeypatch):
+    """Test a KeyError from the load itself is not turned into a 404"""
+    from app.api.dependencies import get_db_service
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    database_id = client.post("/api/create-database", json={
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER);",
+        "db_name": f"meta_{uuid.uuid4().hex}",
+    }).json()["database_id"]
+    
+    def missing_file(*args, **kwargs):
+        raise KeyError("CSV metadata missing 'file_path'")
+    monkeypatch.setattr(get_db_service(), "append_rows", missing_file)
+    
+    response = client.post(f"/api/databases/{database_id}/append", json={"file_id": file_id})
+    
+    assert response.status_code == 500
+    assert "file_path" in response.json()["detail"]
+
+
+def test_append_rejects_undeclared_key(client, sample_csv_bytes):
+    """Test upserting on columns without a unique constraint"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    database_id = client.post("/api/create-database", json={
+        "file_id": file_id,
+        "sql_schema": "CREATE TABLE people (id INTEGER, name TEXT, email TEXT, age INTEGER);",
+        "db_name": f"nokey_{uuid.uuid4().hex}",
+    }).json()["database_id"]
+    
+    response = client.post(
+        f"/api/databases/{database_id}/append",
+        json={"file_id": file_id, "key_columns": ["email"]},
+    )
+    
+    assert response.status_code == 400
+    assert "UNIQUE" in response.json()["detail"]
+
+
+def test_append_database_not_found(client, sample_csv_bytes):
+    """Test appending to an unknown database"""
+    files = {"file": ("test.csv", BytesIO(sample_csv_bytes), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    
+    response = client.post(
+        "/api/databases/00000000-0000-0000-0000-000000000000/append",
+        json={"file_id": file_id},
+    )
+    
+    assert response.status_code == 404
@@ -0,0 +1,83 @@
+"""Tests for background job routes"""
+import json
+import time
+import uuid
+from io import BytesIO
+
+
+def wait_for_job(client, job_id, timeout=60):
+    """Poll a job until it leaves the queued/running states"""
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        job = client.get(f"/api/jobs/{job_id}").json()
+        if job["status"] in ("completed", "failed"):
+            return job
+        time.sleep(0.1)
+    raise AssertionError(f"Job {job_id} did not finish in {timeout}s")
+
+
+def test_upload_csv_async_mode(client, sample_csv_bytes):
+    """Test async upload returns a job that completes with the profile"""
+    # Unique content so the upload is not answered from the dedup index
+    content = sample_csv_bytes + f"4,{uuid.uuid4()},x@example.com,40\n".encode()
+    files = {"file": ("test.csv", BytesIO(content), "text/csv")}
+    response = client.post("/api/upload-csv?async_mode=true", files=files)
+    
+    assert response.status_code == 202
+    data = response.json()
+    assert data["success"] is True
+    assert "job_id" in data
+    assert "file_id" in data
+    
+    job = wait_for_job(client, data["job_id"])
+    assert job["status"] == "completed"
+    assert job["kind"] == "ingest"
+    assert job["result"]["file_id"] == data["file_id"]
+    assert job["result"]["row_count"] == 4
+    assert job["progress"]["rows_processed"] == 4
+    
+    # The ingested file is usable by the rest of the pipeline
+    schema_response = client.post(
+        "/api/generate-schema",
+        json={"file_id": data["file_id"], "sql_schema": "CREATE TABLE t (id INTEGER);"}
+    )
+    assert schema_response.status_code == 200
+
+
+def test_upload_csv_async_mode_failure(client):
+    """Test a file that cannot be parsed marks the job as failed"""
+    files = {"file": ("empty.csv", BytesIO(b""), "text/csv")}
+    response = client.post("/api/upload-csv?async_mode=true", files=files)
+    assert response.status_code == 202
+    
+    job = wait_for_job(client, response.json()["job_id"])
+    assert job["status"] == "failed"
+    assert job["error"]
+
+
+def test_get_job_not_found(client):
+    """Test status of an unknown job"""
+    response = client.get("/api/jobs/00000000-0000-0000-0000-000000000000")
+    assert response.status_code == 404
+    assert "not found" in response.json()["detail"].lower()
+
+
+def test_job_events_stream(client, sample_csv_bytes):
+    """Test the event stream ends with the final job record"""
+    content = sample_csv_bytes + f"4,{uuid.uuid4()},x@example.com,40\n".encode()
+    files = {"file": ("test.csv", BytesIO(content), "text/csv")}
+    job_id = client.post("/api/upload-csv?async_mode=true", files=files).json()["job_id"]
+    
+    response = client.get(f"/api/jobs/{job_id}/events")
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = [block for block in response.text.split("\n\n") if block]
+    assert events[-1].startswith("event: completed\n")
+    assert json.loads(events[-1].split("data: ", 1)[1])["result"]["row_count"] == 4
+
+
+def test_job_events_not_found(client):
+    """Test the event stream of an unknown job"""
+    response = client.get("/api/jobs/00000000-0000-0000-0000-000000000000/events")
+    assert response.status_code == 404
@@ -0,0 +1,281 @@
+"""Tests for query routes"""
+import json
+import time
+import asyncio
+import uuid
+import pytest
+from io import BytesIO
+
+
+@pytest.fixture
+def database_id(client):
+    """Build a small database with content of its own"""
+    csv_content = "id,name,city\n" + "".join(
+        f"{i},{uuid.uuid4()},{'Paris' if i % 2 else 'Oslo'}\n" for i in range(1, 6)
+    )
+    files = {"file": ("people.csv", BytesIO(csv_content.encode()), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    response = client.post(
+        "/api/create-database",
+        json={
+            "file_id": file_id,
+            "sql_schema": "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, city TEXT);",
+        }
+    )
+    assert response.status_code == 200
+    return response.json()["database_id"]
+
+
+def test_execute_query_success(client, database_id):
+    """Test a SELECT returns columns, rows and timing"""
+    response = client.post(
+        "/api/query/execute",
+        json={
+            "database_id": database_id,
+            "query": "SELECT city, COUNT(*) AS people FROM people WHERE id > ? GROUP BY city ORDER BY city",
+            "params": [0],
+        }
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["success"] is True
+    assert data["columns"] == ["city", "people"]
+    assert data["rows"] == [["Oslo", 2], ["Paris", 3]]
+    assert data["row_count"] == 2
+    assert data["truncated"] is False
+    assert data["execution_time"] >= 0
+
+
+def test_execute_query_truncates_to_max_rows(client, database_id):
+    """Test rows beyond max_rows are left out and flagged"""
+    response = client.post(
+        "/api/query/execute",
+        json={"database_id": database_id, "query": "SELECT id FROM people ORDER BY id", "max_rows": 2}
+    )
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["rows"] == [[1], [2]]
+    assert data["truncated"] is True
+
+
+@pytest.mark.parametrize("query", [
+    "DELETE FROM people",
+    "PRAGMA query_only=0",
+    "ATTACH DATABASE ':memory:' AS other",
+    "SELECT 1; SELECT 2",
+])
+def test_execute_query_refuses_writes(client, database_id, query):
+    """Test statements that would write or change the connection are refused"""
+    response = client.post("/api/query/execute", json={"database_id": database_id, "query": query})
+    
+    assert response.status_code == 400
+    
+    count = client.post(
+        "/api/query/execute",
+        json={"database_id": database_id, "query": "SELECT COUNT(*) FROM people"}
+    )
+    assert count.json()["rows"] == [[5]]
+
+
+def test_execute_query_database_not_found(client):
+    """Test querying an unknown database"""
+    response = client.post(
+        "/api/query/execute",
+        json={"database_id": "non-existent-id", "query": "SELECT 1"}
+    )
+    
+    assert response.status_code == 404
+
+
+def test_execute_query_served_from_cache_until_append(client, database_id):
+    """Test a repeated query is cached and an append invalidates it"""
+    query = {"database_id": database_id, "query": "SELECT COUNT(*) FROM people"}
+    
+    first = client.post("/api/query/execute", json=query).json()
+    hits = client.get("/api/query/stats").json()["cache"]["hits"]
+    second = client.post(
+        "/api/query/execute",
+        json={**query, "query": "SELECT  COUNT(*)\n FROM people;"}
+    ).json()
+    
+    assert first["cached"] is False
+    assert second["cached"] is True
+    assert second["rows"] == first["rows"] == [[5]]
+    assert client.get("/api/query/stats").json()["cache"]["hits"] == hits + 1
+    
+    csv_content = f"id,name,city\n6,{uuid.uuid4()},Rome\n"
+    files = {"file": ("delta.csv", BytesIO(csv_content.encode()), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    assert client.post(f"/api/databases/{database_id}/append", json={"file_id": file_id}).status_code == 200
+    
+    third = client.post("/api/query/execute", json=query).json()
+    assert third["cached"] is False
+    assert third["rows"] == [[6]]
+
+
+@pytest.mark.parametrize("batch_size", [2, None])
+def test_stream_query_as_ndjson(client, database_id, batch_size):
+    """Test every row is streamed as one JSON object per line"""
+    response = client.post(
+        "/api/query/stream",
+        json={"database_id": database_id, "query": "SELECT id, city FROM people ORDER BY id", "batch_size": batch_size}
+    )
+    
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "application/x-ndjson"
+    lines = [json.loads(line) for line in response.text.splitlines()]
+    assert [line["id"] for line in lines] == [1, 2, 3, 4, 5]
+    assert lines[0] == {"id": 1, "city": "Paris"}
+
+
+def test_stream_query_as_csv(client, database_id):
+    """Test streamed CSV starts with a header row"""
+    response = client.post(
+        "/api/query/stream",
+        json={"database_id": database_id, "query": "SELECT id, city FROM people WHERE id < 3", "format": "csv"}
+    )
+    
+    assert response.status_code == 200
+    assert response.text.splitlines() == ["id,city", "1,Paris", "2,Oslo"]
+
+
+def test_stream_query_as_arrow(client, database_id):
+    """Test streamed Arrow IPC batches read back as one table"""
+    pyarrow = pytest.importorskip("pyarrow")
+    import pyarrow.ipc
+    
+    response = client.post(
+        "/api/query/stream",
+        json={"database_id": database_id, "query": "SELECT id, city FROM people", "format": "arrow", "batch_size": 2}
+    )
+    
+    assert response.status_code == 200
+    table = pyarrow.ipc.open_stream(response.content).read_all()
+    assert table.column_names == ["id", "city"]
+    assert table.column("id").to_pylist() == [1, 2, 3, 4, 5]
+
+
+def test_stream_query_reports_errors_before_streaming(client, database_id):
+    """Test an invalid statement fails with a status instead of a broken stream"""
+    response = client.post(
+        "/api/query/stream",
+        json={"database_id": database_id, "query": "SELECT nope FROM people"}
+    )
+    
+    assert response.status_code == 400
+
+
+def test_table_rows_keyset_pagination(client, database_id):
+    """Test cursor tokens walk through a table page by page"""
+    url = f"/api/query/{database_id}/tables/people/rows"
+    ids = []
+    cursor = None
+    pages = 0
+    while True:
+        params = {"limit": 2, **({"cursor": cursor} if cursor else {})}
+        data = client.get(url, params=params).json()
+        assert data["columns"] == ["id", "name", "city"]
+        ids.extend(row[0] for row in data["rows"])
+        pages += 1
+        cursor = data["next_cursor"]
+        if cursor is None:
+            break
+    
+    assert ids == [1, 2, 3, 4, 5]
+    assert pages == 3
+    
+    assert client.get(url, params={"cursor": "garbage"}).status_code == 400
+    assert client.get(f"/api/query/{database_id}/tables/nope/rows").status_code == 400
+
+
+RUNAWAY = "WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r) SELECT COUNT(*) FROM r"
+
+
+def test_execute_query_stops_at_time_budget(client, database_id):
+    """Test a runaway query is interrupted once its timeout is spent"""
+    response = client.post(
+        "/api/query/execute",
+        json={"database_id": database_id, "query": RUNAWAY, "timeout": 0.2}
+    )
+    
+    assert response.status_code == 504
+    assert "time budget" in response.json()["detail"]
+
+
+def test_query_cancelled_by_server_is_retryable():
+    """Test only a client disconnect answers 499; other cancellations get 503"""
+    from app.api.routes.query_routes import _refusal
+    from app.services.query_service import CANCELLED, QueryInterruptedError
+    
+    error = _refusal(QueryInterruptedError(CANCELLED, "Query was cancelled"))
+    
+    assert error.status_code == 503
+    assert error.headers == {"Retry-After": "1"}
+
+
+async def test_client_disconnect_cancels_query(test_db_dir):
+    """Test a query whose client goes away is interrupted and its slot freed"""
+    import sqlite3
+    from fastapi import HTTPException
+    from app.api.routes.query_routes import _unless_disconnected
+    from app.services.query_service import QueryService
+    
+    db_path = str(test_db_dir / "runaway.db")
+    sqlite3.connect(db_path).close()
+    service = QueryService(2, 1, 1, 60, 0, 1024, timeout=30)
+    
+    class Disconnecting:
+        async def receive(self):
+            await asyncio.sleep(0.1)
+            return {"type": "http.disconnect"}
+    
+    started = time.perf_counter()
+    with pytest.raises(HTTPException) as error:
+        await _unless_disconnected(Disconnecting(), service.run(db_path, RUNAWAY))
+    
+    assert error.value.status_code == 499
+    assert time.perf_counter() - started < 5
+    assert service.admission.stats()["active"] == 0
+    # The interrupted statement ends and its connection goes back to the pool
+    await asyncio.sleep(0.2)
+    assert service.pool.stats()["idle_connections"] == 1
+    service.shutdown()
+
+
+def test_slow_queries_flag_full_scans_and_suggest_indexes(client, database_id, monkeypatch):
+    """Test slow queries are logged with their plan and a missing index is suggested"""
+    from app.api.dependencies import get_query_service
+    
+    monkeypatch.setattr(get_query_service().slow_log, "threshold", 0)
+    client.post(
+        "/api/query/execute",
+        json={"database_id": database_id, "query": "SELECT id FROM people p WHERE p.name = ?", "params": ["x"]}
+    )
+    client.post(
+        "/api/query/execute",
+        json={"database_id": database_id, "query": "SELECT name FROM people WHERE id = 3"}
+    )
+    
+    response = client.get(f"/api/databases/{database_id}/slow-queries")
+    
+    assert response.status_code == 200
+    data = response.json()
+    assert data["total"] == 2
+    seek, scan = data["entries"]
+    assert seek["full_scan"] is False
+    assert scan["full_scan"] is True
+    assert scan["full_scans"][0]["table"] == "people"
+    assert scan["status"] == "completed"
+    assert scan["rows_returned"] == 0
+    assert any("SCAN" in step["detail"] for step in scan["plan"])
+    
+    suggestion, = data["index_suggestions"]
+    assert suggestion["column"] == "name"
+    assert suggestion["reason"] == "unique"
+    assert suggestion["statement"].startswith("CREATE INDEX")
+    
+    full_scans = client.get(f"/api/databases/{database_id}/slow-queries", params={"full_scan_only": True})
+    assert [entry["sql"] for entry in full_scans.json()["entries"]] == [scan["sql"]]
+    assert client.get("/api/databases/non-existent-id/slow-queries").status_code == 404
@@ -79,3 +79,100 @@ async def test_generate_schema_llm_failure_fallback(mock_llm, client, uploaded_f
     assert data["success"] is True
     assert "sql_schema" in data
     assert "CREATE TABLE" in data["sql_schema"]
+
+
+def test_generate_schema_with_validation(client, uploaded_file_id):
+    """Test the generated schema can be dry-run in the same request"""
+    schema = "CREATE TABLE test (id INTEGER PRIMARY KEY, name TEXT, email TEXT, age INTEGER);"
+    response = client.post(
+        "/api/generate-schema",
+        json={"file_id": uploaded_file_id, "sql_schema": schema, "validate": True}
+    )
+    
+    assert response.status_code == 200
+    validation = response.json()["validation"]
+    assert validation["valid"] is True
+    assert validation["table_name"] == "test"
+    assert validation["rows_checked"] == 3
+
+
+def test_validate_schema_reports_problems(client):
+    """Test the dry run reports column mismatches, type errors and constraint violations"""
+    csv_content = "id,name,age\n" + "".join(f"{i},n{i},{i if i % 5 else 'unknown'}\n" for i in range(1, 20))
+    csv_content += "3,duplicate,30\n"
+    files = {"file": ("people.csv", BytesIO(csv_content.encode()), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    
+    response = client.post(
+        "/api/validate-schema",
+        json={
+            "file_id": file_id,
+            "sql_schema": "CREATE TABLE people (id INTEGER PRIMARY KEY, full_name TEXT, name TEXT, age INTEGER);"
+        }
+    )
+    assert response.status_code == 200
+    validation = response.json()["validation"]
+    assert validation["valid"] is False
+    assert validation["rows_checked"] == 20
+    assert validation["unmatched_columns"] == []
+    assert validation["type_error_count"] == 3
+    assert [error["row"] for error in validation["type_errors"]] == [4, 9, 14]
+    assert validation["constraint_violations"] == [
+        {"row": 19, "message": "UNIQUE constraint failed: people.id"}
+    ]
+    
+    response = client.post(
+        "/api/validate-schema",
+        json={"file_id": file_id, "sql_schema": "CREATE TABLE people (id INTEGER, name TEXT NOT NULL, city TEXT NOT NULL);"}
+    )
+    validation = response.json()["validation"]
+    assert validation["unmatched_columns"] == ["age"]
+    assert validation["missing_columns"] == ["city"]
+    
+    response = client.post(
+        "/api/validate-schema",
+        json={"file_id": file_id, "sql_schema": "CREATE TABLE people (id INTEGER,, name TEXT);"}
+    )
+    validation = response.json()["validation"]
+    assert validation["valid"] is False
+    assert "syntax error" in validation["schema_error"]
+
+
+def test_validate_schema_converts_dates_and_booleans_like_a_build(client):
+    """Test values a build converts are accepted and only unconvertible ones reported"""
+    csv_content = (
+        "id,joined,seen_at,active,price\n"
+        "1,2024-01-31,2024-01-31T08:00:00Z,yes,9.99\n"
+        "2,2024-02-01,2024-02-01 09:30:00,false,10\n"
+        "3,someday,2024-02-02,maybe,12.50\n"
+    )
+    files = {"file": ("dates.csv", BytesIO(csv_content.encode()), "text/csv")}
+    file_id = client.post("/api/upload-csv", files=files).json()["file_id"]
+    
+    response = client.post(
+        "/api/validate-schema",
+        json={
+            "file_id": file_id,
+            "sql_schema": (
+                "CREATE TABLE events (id INTEGER PRIMARY KEY, joined DATE, seen_at DATETIME, "
+                "active BOOLEAN, price DECIMAL(10, 2));"
+            ),
+        }
+    )
+    
+    validation = response.json()["validation"]
+    assert validation["type_errors"] == [
+        {"row": 2, "column": "joined", "value": "someday", "message": "value is not a date"},
+        {"row": 2, "column": "active", "value": "maybe", "message": "value is not a boolean"},
+    ]
+    assert validation["constraint_violation_count"] == 0
+
+
+def test_validate_schema_file_not_found(client):
+    """Test dry runs need an existing upload"""
+    response = client.post(
+        "/api/validate-schema",
+        json={"file_id": "non-existent-id", "sql_schema": "CREATE TABLE t (id INTEGER);"}
+    )
+    
+    assert response.status_code == 404
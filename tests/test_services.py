@@ -1,4 +1,5 @@
 """Tests for service layer"""
+import time
 import pytest
 from pathlib import Path
 from app.services.csv_handler import CSVHandler
@@ -15,6 +16,373 @@ def test_csv_handler_initialization(test_upload_dir):
     assert test_upload_dir.exists()
 
 
+async def test_csv_handler_streams_upload_in_chunks(test_upload_dir, sample_csv_bytes):
+    """Test CSV upload is copied to disk chunk by chunk"""
+    from io import BytesIO
+    from fastapi import UploadFile
+    
+    handler = CSVHandler(upload_dir=test_upload_dir, chunk_size=8)
+    upload = UploadFile(BytesIO(sample_csv_bytes), filename="test.csv")
+    
+    result = await handler.save_csv(upload)
+    info = handler.get_csv_info(result["file_id"])
+    
+    assert info["file_size"] == len(sample_csv_bytes)
+    assert Path(info["file_path"]).read_bytes() == sample_csv_bytes
+    assert result["row_count"] == 3
+
+
+async def test_csv_handler_rejects_oversized_upload(test_upload_dir, sample_csv_bytes):
+    """Test oversized upload raises and leaves no partial file"""
+    from io import BytesIO
+    from fastapi import UploadFile
+    from app.services.csv_handler import UploadTooLargeError
+    
+    handler = CSVHandler(upload_dir=test_upload_dir, max_upload_size=20, chunk_size=8)
+    upload = UploadFile(BytesIO(sample_csv_bytes), filename="test.csv")
+    
+    with pytest.raises(UploadTooLargeError):
+        await handler.save_csv(upload)
+    
+    assert list(test_upload_dir.glob("*.csv")) == []
+
+
+async def test_csv_handler_limits_decompressed_size(test_upload_dir, sample_csv_bytes):
+    """Test a compressed upload may not expand beyond max_content_size"""
+    import gzip
+    from io import BytesIO
+    from fastapi import UploadFile
+    from app.services.csv_handler import UploadTooLargeError
+    
+    handler = CSVHandler(upload_dir=test_upload_dir, max_content_size=20, chunk_size=8)
+    upload = UploadFile(BytesIO(gzip.compress(sample_csv_bytes)), filename="test.csv.gz")
+    
+    with pytest.raises(UploadTooLargeError):
+        await handler.save_csv(upload)
+    
+    assert list(test_upload_dir.glob("*.csv*")) == []
+
+
+def test_stream_decompressor_multi_member_and_truncated():
+    """Test streaming decompression across chunk and member boundaries"""
+    import bz2
+    import gzip
+    from app.services.compression import StreamDecompressor
+    
+    content = b"id,name\n" + b"".join(b"%d,row%d\n" % (i, i) for i in range(5000))
+    for method, compress in (("gzip", gzip.compress), ("bz2", bz2.compress)):
+        data = compress(content[:1000]) + compress(content[1000:])
+        decompressor = StreamDecompressor(method)
+        output = b"".join(
+            piece
+            for start in range(0, len(data), 7)
+            for piece in decompressor.decompress(data[start:start + 7])
+        )
+        assert output + decompressor.finish() == content
+        
+        truncated = StreamDecompressor(method)
+        list(truncated.decompress(data[:len(data) // 3]))
+        with pytest.raises(ValueError):
+            truncated.finish()
+
+
+def test_csv_profiler_promotes_types_across_chunks(test_upload_dir):
+    """Test chunked profiling promotes column types and keeps the preview"""
+    from app.services.csv_profiler import profile_csv
+    
+    csv_path = test_upload_dir / "typed.csv"
+    csv_path.write_text(
+        "id,score,flag,created,label\n"
+        "1,10,True,2024-01-01,a\n"
+        "2,11,False,2024-01-02,b\n"
+        "3,1.5,,2024-01-03 10:00:00,3\n"
+        "4,12,True,2024-01-04,x\n"
+        "5,,False,2024-01-05,\n"
+    )
+    
+    profile = profile_csv(csv_path, chunksize=2)
+    
+    assert profile["row_count"] == 5
+    assert profile["columns"] == ["id", "score", "flag", "created", "label"]
+    assert profile["column_types"] == {
+        "id": "INTEGER",
+        "score": "REAL",
+        "flag": "BOOLEAN",
+        "created": "DATETIME",
+        "label": "TEXT",
+    }
+    assert profile["null_counts"]["score"] == 1
+    assert len(profile["preview"]) == 5
+    assert profile["preview"][0]["id"] == 1
+
+
+def test_columnar_store_round_trip_matches_read_csv(test_upload_dir):
+    """Test the columnar cache reloads the same frame as pd.read_csv"""
+    import pandas as pd
+    from app.services.columnar_store import ColumnarStore
+    from app.services.ingest import ingest_csv
+    
+    csv_path = test_upload_dir / "mixed.csv"
+    csv_path.write_text(
+        "id,price,flag,name,code\n"
+        "1,9.5,True,Alice,1\n"
+        "2,,False,Bob,2\n"
+        "3,7.25,,,x\n"
+        "4,1,True,Dan,4\n"
+    )
+    
+    profile = ingest_csv(csv_path, chunksize=2)
+    store = ColumnarStore(Path(profile["columnar_path"]))
+    
+    pd.testing.assert_frame_equal(store.read(), pd.read_csv(csv_path))
+    assert store.kinds == {
+        "id": "int64",
+        "price": "float64",
+        "flag": "bool",
+        "name": "text",
+        "code": "text",
+    }
+    assert store.read(["name"], 1, 3)["name"].tolist()[0] == "Bob"
+
+
+def test_columnar_store_keeps_source_text_when_column_turns_text(test_upload_dir):
+    """Test numbers stored before a column turned out to be text keep their CSV spelling"""
+    import pandas as pd
+    from app.services.columnar_store import ColumnarStore
+    from app.services.ingest import ingest_csv
+    from app.services.parallel_csv import ingest_csv_parallel
+    
+    csv_path = test_upload_dir / "zips.csv"
+    csv_path.write_text(
+        "zip,flag,n\n"
+        "000,TRUE,1\n001,false,2\n002,true,3\n003,FALSE,4\n004,1.50,5\nA12,TRUE,6\n010,x,7\n"
+    )
+    expected = pd.read_csv(csv_path)
+    assert expected["zip"].tolist()[:2] == ["000", "001"]
+    
+    sequential = ingest_csv(csv_path, test_upload_dir / "seq.columns", chunksize=2)
+    parallel = ingest_csv_parallel(csv_path, test_upload_dir / "par.columns", part_size=16, chunksize=1)
+    
+    for profile in (sequential, parallel):
+        store = ColumnarStore(Path(profile["columnar_path"]))
+        pd.testing.assert_frame_equal(store.read(), expected)
+        assert not any(entry.get("lossy") for entry in store.manifest["columns"])
+
+
+async def test_csv_handler_get_dataframe_uses_columnar_cache(test_upload_dir, sample_csv_bytes):
+    """Test get_dataframe loads from the columnar cache instead of the CSV"""
+    from io import BytesIO
+    from fastapi import UploadFile
+    
+    handler = CSVHandler(upload_dir=test_upload_dir)
+    result = await handler.save_csv(UploadFile(BytesIO(sample_csv_bytes), filename="test.csv"))
+    info = handler.get_csv_info(result["file_id"])
+    
+    # Remove the CSV text to prove the cache is what gets read
+    Path(info["file_path"]).unlink()
+    df = handler.get_dataframe(result["file_id"])
+    
+    assert df["name"].tolist() == ["Alice", "Bob", "Charlie"]
+    assert df["age"].sum() == 90
+
+
+async def test_csv_handler_get_dataframe_projection_and_filters(test_upload_dir):
+    """Test column projection, row slicing, filters and chunking with and without the cache"""
+    import shutil
+    import pandas as pd
+    from io import BytesIO
+    from fastapi import UploadFile
+    
+    content = b"id,name,score,flag\n" + b"".join(
+        b"%d,name%d,%d.5,%s\n" % (i, i, i % 10, b"true" if i % 2 else b"false")
+        for i in range(100)
+    )
+    expected = pd.read_csv(BytesIO(content))
+    
+    handler = CSVHandler(upload_dir=test_upload_dir)
+    result = await handler.save_csv(UploadFile(BytesIO(content), filename="wide.csv"))
+    file_id = result["file_id"]
+    
+    for drop_cache in (False, True):
+        if drop_cache:
+            shutil.rmtree(handler.get_csv_info(file_id)["columnar_path"])
+        
+        df = handler.get_dataframe(file_id, columns=["score", "id"], skiprows=10, nrows=20)
+        pd.testing.assert_frame_equal(
+            df,
+            expected[["score", "id"]].iloc[10:30].reset_index(drop=True),
+        )
+        
+        filters = [("score", ">=", 8), ("flag", "==", True)]
+        chunks = list(handler.get_dataframe(file_id, columns=["id"], filters=filters, chunksize=30))
+        assert len(chunks) == 4
+        assert pd.concat(chunks)["id"].tolist() == [
+            i for i in range(100) if i % 10 >= 8 and i % 2
+        ]
+
+
+def test_split_record_ranges_respects_quoted_newlines(test_upload_dir):
+    """Test byte ranges never split a quoted field containing newlines"""
+    from app.services.parallel_csv import split_record_ranges
+    
+    csv_path = test_upload_dir / "quoted.csv"
+    rows = [f'{i},"line one\nline ""two"" {i}"\n' for i in range(50)]
+    csv_path.write_text("id,note\n" + "".join(rows))
+    data = csv_path.read_bytes()
+    
+    header_end, ranges = split_record_ranges(csv_path, part_size=40)
+    
+    assert data[:header_end] == b"id,note\n"
+    assert len(ranges) > 1
+    assert ranges[0][0] == header_end
+    assert ranges[-1][1] == len(data)
+    record_starts = {len("id,note\n") + sum(len(r.encode()) for r in rows[:i]) for i in range(51)}
+    for start, end in ranges:
+        assert start in record_starts and end in record_starts
+
+
+def test_ingest_csv_parallel_matches_sequential(test_upload_dir):
+    """Test parallel ingest yields the same profile and cache as sequential ingest"""
+    import pandas as pd
+    from app.services.columnar_store import ColumnarStore
+    from app.services.ingest import ingest_csv
+    from app.services.parallel_csv import ingest_csv_parallel
+    
+    csv_path = test_upload_dir / "big.csv"
+    lines = ["id,amount,note"]
+    for i in range(300):
+        amount = "" if i % 7 == 3 and i > 10 else (f"{i}.5" if i > 200 else str(i))
+        lines.append(f'{i},{amount},"row {i}\nsecond line"')
+    csv_path.write_text("\n".join(lines) + "\n")
+    
+    sequential = ingest_csv(csv_path, test_upload_dir / "seq.columns", chunksize=64)
+    parallel = ingest_csv_parallel(
+        csv_path, test_upload_dir / "par.columns", part_size=2048, chunksize=64
+    )
+    
+    for key in ("row_count", "columns", "column_types", "null_counts", "distinct_ratios", "preview"):
+        assert parallel[key] == sequential[key]
+    assert parallel["column_types"]["amount"] == "REAL"
+    pd.testing.assert_frame_equal(
+        ColumnarStore(Path(parallel["columnar_path"])).read(),
+        pd.read_csv(csv_path),
+    )
+    assert not list(test_upload_dir.glob("*.part*"))
+
+
+def test_read_rows_uses_row_index(test_upload_dir):
+    """Test indexed paging returns the same rows as a full parse"""
+    import pandas as pd
+    from app.services.row_index import build_row_index, count_rows, read_rows, write_row_index
+    
+    lines = ["id,note"]
+    for i in range(1000):
+        note = f'"line {i}\nwith ""quotes"""' if i % 7 == 0 else f"n{i}"
+        lines.append(f"{i},{note}")
+    csv_path = test_upload_dir / "paged.csv"
+    csv_path.write_text("\n".join(lines) + "\n")
+    
+    index = build_row_index(csv_path, stride=64)
+    assert count_rows(csv_path, index, stride=64) == 1000
+    index_path = test_upload_dir / "paged.rows.npy"
+    write_row_index(index, index_path)
+    
+    expected = pd.read_csv(csv_path)
+    for offset, limit in [(0, 5), (63, 2), (64, 64), (500, 100), (990, 50)]:
+        page = read_rows(csv_path, index_path, 64, offset, limit)
+        pd.testing.assert_frame_equal(
+            page,
+            expected.iloc[offset:offset + limit].reset_index(drop=True),
+        )
+
+
+def test_catalog_lookup_filter_and_cross_instance_invalidation(test_upload_dir):
+    """Test catalog reads see writes made through another instance"""
+    import json
+    from app.services.catalog import Catalog
+    
+    legacy = test_upload_dir / "metadata.json"
+    legacy.write_text(json.dumps({"a": {"file_id": "a", "filename": "x.csv"}}))
+    
+    first = Catalog(test_upload_dir / "catalog.db", indexed=("filename",))
+    first.migrate_json(legacy)
+    second = Catalog(test_upload_dir / "catalog.db", indexed=("filename",))
+    
+    assert not legacy.exists()
+    assert second.get("a")["filename"] == "x.csv"
+    
+    first.put("a", {"file_id": "a", "filename": "y.csv"})
+    first.put("b", {"file_id": "b", "filename": "y.csv"})
+    
+    assert second.get("a")["filename"] == "y.csv"
+    assert [record["file_id"] for record in second.list({"filename": "y.csv"})] == ["a", "b"]
+    assert second.list({"filename": "y.csv"}, limit=1, offset=1)[0]["file_id"] == "b"
+    assert second.count({"filename": "x.csv"}) == 0
+    assert second.delete("b") and second.get("b") is None
+    
+    # A field indexed later is backfilled from the stored records
+    third = Catalog(test_upload_dir / "catalog.db", indexed=("filename", "file_id"))
+    assert [record["filename"] for record in third.list({"file_id": "a"})] == ["y.csv"]
+
+
+def test_normalize_schema_ignores_formatting_only():
+    """Test schema normalization keeps quoted text and drops comments and spacing"""
+    from app.services.database_service import normalize_schema
+    
+    compact = "CREATE TABLE t(id INTEGER,name TEXT DEFAULT 'a  b')"
+    formatted = """CREATE TABLE t (
+        -- primary identifier
+        id INTEGER , /* display */ name TEXT DEFAULT 'a  b'
+    );"""
+    
+    assert normalize_schema(formatted) == normalize_schema(compact)
+    assert normalize_schema(compact.replace("'a  b'", "'a b'")) != normalize_schema(compact)
+
+
+def test_split_schema_defers_everything_but_tables():
+    """Test tables are separated from indexes and triggers, whose bodies hold semicolons"""
+    from app.services.bulk_loader import split_schema
+    
+    schema = """CREATE TABLE "people" (id INTEGER, note TEXT DEFAULT 'a;b');
+    CREATE INDEX idx_people_id ON people (id);
+    CREATE TABLE IF NOT EXISTS orders (id INTEGER);
+    CREATE TRIGGER t AFTER INSERT ON orders BEGIN UPDATE people SET note = 'x'; END;"""
+    
+    tables, deferred = split_schema(schema)
+    
+    assert [name for name, _ in tables] == ["people", "orders"]
+    assert tables[0][1].endswith("'a;b');")
+    assert len(deferred) == 2
+    assert deferred[1].startswith("CREATE TRIGGER") and deferred[1].endswith("END;")
+
+
+async def test_csv_handlers_share_state_across_instances(test_upload_dir, sample_csv_bytes):
+    """Test handlers in different workers see each other's uploads"""
+    from io import BytesIO
+    from concurrent.futures import ThreadPoolExecutor
+    from fastapi import UploadFile
+    
+    worker_a = CSVHandler(upload_dir=test_upload_dir)
+    worker_b = CSVHandler(upload_dir=test_upload_dir)
+    
+    first = await worker_a.save_csv(UploadFile(BytesIO(sample_csv_bytes), filename="a.csv"))
+    assert worker_b.get_csv_info(first["file_id"])["filename"] == "a.csv"
+    
+    second = await worker_b.save_csv(UploadFile(BytesIO(sample_csv_bytes), filename="b.csv"))
+    assert second["deduplicated"] is True
+    assert worker_a.get_csv_info(second["file_id"])["aliased_from"] == first["file_id"]
+    
+    # Concurrent writers through separate connections do not lose records
+    def register(index):
+        handler = CSVHandler(upload_dir=test_upload_dir)
+        for i in range(20):
+            handler.catalog.put(f"{index}-{i}", {"file_id": f"{index}-{i}", "filename": "c.csv"})
+    
+    with ThreadPoolExecutor(max_workers=4) as pool:
+        list(pool.map(register, range(4)))
+    assert worker_a.list_files(filename="c.csv")[1] == 80
+
+
 def test_database_service_initialization(test_db_dir):
     """Test database service initialization"""
     service = DatabaseService(db_dir=test_db_dir)
@@ -22,6 +390,66 @@ def test_database_service_initialization(test_db_dir):
     assert test_db_dir.exists()
 
 
+def test_bulk_load_streams_chunks_and_restores_pragmas(test_db_dir):
+    """Test bulk loading maps columns, stores NaN as NULL and leaves a durable database"""
+    import sqlite3
+    import numpy as np
+    import pandas as pd
+    from app.services.bulk_loader import bulk_load
+    
+    frame = pd.DataFrame({
+        "Order ID": np.arange(2500),
+        "amount": np.where(np.arange(2500) % 10 == 0, np.nan, 1.5),
+        "city": ["Oslo", None, "Lima", "Pune", "Kiev"] * 500,
+    })
+    chunks = (frame.iloc[start:start + 1000] for start in range(0, len(frame), 1000))
+    schema = "CREATE TABLE orders (id INTEGER PRIMARY KEY AUTOINCREMENT, order_id INTEGER, amount REAL, City TEXT);"
+    db_path = test_db_dir / "orders.db"
+    
+    loaded = bulk_load(db_path, schema, "orders", chunks, rows_total=len(frame))
+    
+    assert loaded == {"rows_loaded": 2500, "invalid_values": {}}
+    conn = sqlite3.connect(str(db_path))
+    assert conn.execute("SELECT COUNT(*), SUM(order_id), COUNT(amount), COUNT(City) FROM orders").fetchone() == (
+        2500, frame["Order ID"].sum(), 2250, 2000,
+    )
+    assert conn.execute("PRAGMA journal_mode").fetchone()[0] == "delete"
+    assert conn.execute("PRAGMA page_size").fetchone()[0] == 8192
+    conn.close()
+
+
+def test_advise_indexes_from_profile():
+    """Test the index advisor picks keys, unique columns and dates from the profile"""
+    from app.services.index_advisor import advise_indexes
+    
+    csv_info = {
+        "row_count": 50000,
+        "column_types": {
+            "order_id": "INTEGER", "customerId": "INTEGER", "email": "TEXT",
+            "status": "TEXT", "placed_at": "DATETIME", "region_code": "TEXT", "amount": "REAL",
+        },
+        "null_counts": {"email": 100},
+        "distinct_ratios": {
+            "order_id": 1.0, "customerId": 0.2, "email": 0.99, "status": 0.0001,
+            "placed_at": 0.8, "region_code": 0.00002, "amount": 1.0,
+        },
+    }
+    mapping = {name: name for name in csv_info["column_types"]}
+    
+    advice = advise_indexes(csv_info, mapping, existing={"order_id"}, max_indexes=10, min_rows=1000)
+    
+    # order_id is indexed already, status is low-cardinality, region_code is constant
+    assert advice == [
+        {"column": "customerId", "reason": "key"},
+        {"column": "email", "reason": "unique"},
+        {"column": "placed_at", "reason": "date"},
+    ]
+    assert advise_indexes(csv_info, mapping, set(), max_indexes=1, min_rows=1000) == [
+        {"column": "order_id", "reason": "key"}
+    ]
+    assert advise_indexes(csv_info, mapping, set(), min_rows=100000) == []
+
+
 def test_llm_service_initialization():
     """Test LLM service initialization"""
     service = LLMService()
@@ -94,3 +522,361 @@ async def test_llm_service_generate_schema_http_error(mock_post):
         )
     
     assert "error" in str(exc_info.value).lower()
+
+
+def test_type_coercer_converts_to_declared_types():
+    """Test chunks are converted per declared type and invalid values reported per column"""
+    import sqlite3
+    import pandas as pd
+    from app.services.type_coercion import TypeCoercer
+    
+    conn = sqlite3.connect(":memory:")
+    conn.execute(
+        "CREATE TABLE t (qty INTEGER NOT NULL, price REAL, active BOOLEAN, day DATE, seen DATETIME, zip TEXT)"
+    )
+    frame = pd.DataFrame({
+        "qty": ["1", "2", "many"],
+        "price": ["1.5", "n/a", None],
+        "active": ["yes", "No", "maybe"],
+        "day": ["2024-01-31", "02/29/2024", "soon"],
+        "seen": ["2024-01-31T10:00:00+01:00", "2024-01-31 10:00", None],
+        "zip": [2134.0, None, 10001.0],
+    })
+    coercer = TypeCoercer(conn, "t")
+    
+    converted = coercer.coerce(frame, {name: name for name in frame.columns})
+    
+    # NOT NULL columns keep values that do not convert
+    assert converted["qty"].tolist() == [1, 2, "many"]
+    assert converted["price"].tolist()[0] == 1.5 and converted["price"].tolist()[1] is None
+    assert converted["active"].tolist() == [1, 0, None]
+    assert converted["day"].tolist() == ["2024-01-31", "2024-02-29", None]
+    assert converted["seen"].tolist() == ["2024-01-31 09:00:00", "2024-01-31 10:00:00", None]
+    assert converted["zip"].tolist() == ["2134", None, "10001"]
+    assert {column: entry["count"] for column, entry in coercer.report().items()} == {
+        "qty": 1, "price": 1, "active": 1, "day": 1,
+    }
+    assert coercer.report()["active"] == {"declared_type": "BOOLEAN", "count": 1, "examples": ["maybe"]}
+    
+    conn.execute("CREATE TABLE s (qty INTEGER) STRICT")
+    strict = TypeCoercer(conn, "s")
+    assert strict.coerce(pd.DataFrame({"qty": [1.0, 2.5]}), {"qty": "qty"})["qty"].tolist() == [1.0, None]
+    assert strict.report()["qty"]["examples"] == ["2.5"]
+
+
+def test_connection_pool_evicts_least_recently_used(test_db_dir):
+    """Test the query pool keeps only the most recently used databases open"""
+    import sqlite3
+    from app.services.query_service import ConnectionPool
+    
+    paths = []
+    for name in ("a", "b", "c"):
+        path = test_db_dir / f"{name}.db"
+        conn = sqlite3.connect(path)
+        conn.execute("CREATE TABLE t (x INTEGER)")
+        conn.close()
+        paths.append(str(path))
+    
+    pool = ConnectionPool(max_connections=2, max_databases=2, idle_timeout=60, mmap_size=0, cache_size_kb=1024)
+    for path in paths:
+        pool.release(path, pool.acquire(path))
+    
+    assert pool.stats() == {"open_databases": 2, "idle_connections": 2}
+    assert list(pool._idle) == paths[1:]
+    
+    conn = pool.acquire(paths[1])
+    with pytest.raises(sqlite3.OperationalError):
+        conn.execute("INSERT INTO t VALUES (1)")
+    pool.release(paths[1], conn)
+    
+    pool.idle_timeout = 0
+    pool.release(paths[2], pool.acquire(paths[2]))
+    assert pool.stats()["open_databases"] <= 1
+    pool.close()
+    assert pool.stats() == {"open_databases": 0, "idle_connections": 0}
+
+
+def test_connection_pool_sweeps_idle_databases_on_acquire(test_db_dir):
+    """Test idle databases are closed when connections are taken, not only returned"""
+    import sqlite3
+    from app.services.query_service import ConnectionPool, QueryService
+    
+    paths = []
+    for name in ("old", "new"):
+        path = test_db_dir / f"sweep_{name}.db"
+        sqlite3.connect(path).close()
+        paths.append(str(path))
+    
+    pool = ConnectionPool(max_connections=2, max_databases=4, idle_timeout=60, mmap_size=0, cache_size_kb=1024)
+    pool.release(paths[0], pool.acquire(paths[0]))
+    pool.idle_timeout = 0
+    conn = pool.acquire(paths[1])
+    
+    assert pool.stats() == {"open_databases": 0, "idle_connections": 0}
+    conn.close()
+    
+    service = QueryService(1, 2, 4, 60, 0, 1024)
+    service.pool.release(paths[0], service.pool.acquire(paths[0]))
+    service.invalidate("old", paths[0])
+    assert service.pool.stats()["idle_connections"] == 0
+    service.shutdown()
+
+
+def test_query_cache_evicts_by_size_and_expires():
+    """Test the result cache keeps recent results within its byte budget"""
+    from app.services.query_cache import QueryCache, result_size
+    
+    result = {"columns": ["x"], "rows": [[i] for i in range(100)]}
+    size = result_size(result)
+    cache = QueryCache(max_bytes=2 * size)
+    keys = [QueryCache.key("db", 0, f"SELECT {i}", None, 100) for i in range(3)]
+    
+    cache.put(keys[0], result)
+    cache.put(keys[1], result)
+    assert cache.get(keys[0]) is result
+    cache.put(keys[2], result)
+    
+    # keys[1] was the least recently used
+    assert cache.get(keys[1]) is None
+    assert cache.get(keys[0]) is result
+    assert cache.stats()["evictions"] == 1
+    assert cache.stats()["bytes"] == 2 * size
+    
+    assert QueryCache.key("db", 0, "SELECT  'a  b'\n;", None, 100)[2] == "SELECT 'a  b'"
+    assert QueryCache.key("db", 0, "SELECT random()", None, 100) is None
+    assert cache.invalidate("db") == 2
+    
+    cache = QueryCache(max_bytes=10 * size, ttl=0.01)
+    cache.put(keys[0], result)
+    time.sleep(0.02)
+    assert cache.get(keys[0]) is None
+
+
+def test_query_budget_stops_runaway_queries(test_db_dir):
+    """Test step budgets and cancellation interrupt a running statement"""
+    import sqlite3
+    import threading
+    from app.services.query_service import QueryService, QueryBudget, QueryInterruptedError
+    
+    db_path = str(test_db_dir / "budget.db")
+    sqlite3.connect(db_path).close()
+    runaway = "WITH RECURSIVE r(x) AS (SELECT 1 UNION ALL SELECT x + 1 FROM r) SELECT COUNT(*) FROM r"
+    service = QueryService(1, 1, 1, 60, 0, 1024)
+    
+    with pytest.raises(QueryInterruptedError) as error:
+        service.execute(db_path, runaway, budget=QueryBudget(max_steps=100_000))
+    assert error.value.reason == "step_limit"
+    
+    budget = QueryBudget()
+    threading.Timer(0.1, budget.cancel).start()
+    with pytest.raises(QueryInterruptedError) as error:
+        service.execute(db_path, runaway, budget=budget)
+    assert error.value.reason == "cancelled"
+    
+    # The pooled connection is usable again
+    assert service.execute(db_path, "SELECT 1")["rows"] == [[1]]
+    service.shutdown()
+
+
+async def test_admission_controller_limits_and_queues():
+    """Test queries beyond the limits wait in order or are refused"""
+    import asyncio
+    from app.services.admission import AdmissionController, DatabaseBusyError, QueryQueueFullError
+    
+    admission = AdmissionController(max_active=1, max_queued=1, max_per_database=2, queue_timeout=0.2)
+    
+    await admission.acquire("a")
+    waiting = asyncio.ensure_future(admission.acquire("b"))
+    await asyncio.sleep(0)
+    assert admission.stats() == {"active": 1, "queued": 1, "rejected": 0}
+    
+    # The queue is full
+    with pytest.raises(QueryQueueFullError):
+        await admission.acquire("c")
+    
+    # The slot is handed to the waiting query
+    admission.release("a")
+    await waiting
+    assert admission.stats()["active"] == 1
+    
+    # A query that does not get a slot in time is refused
+    with pytest.raises(QueryQueueFullError):
+        await admission.acquire("b")
+    
+    admission.max_queued = 10
+    late = [asyncio.ensure_future(admission.acquire("b")) for _ in range(2)]
+    await asyncio.sleep(0)
+    # "b" already has one query running and one waiting
+    assert late[1].done() and isinstance(late[1].exception(), DatabaseBusyError)
+    admission.release("b")
+    await late[0]
+    admission.release("b")
+    assert admission.stats() == {"active": 0, "queued": 0, "rejected": 3}
+
+
+def test_explain_resolves_aliases_and_finds_full_scans():
+    """Test full table scans are found through aliases, but not index scans or CTEs"""
+    import sqlite3
+    from app.services.slow_query_log import explain, SlowQueryLog
+    from app.services.index_advisor import indexable_names
+    
+    conn = sqlite3.connect(":memory:")
+    conn.executescript(
+        "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT, city TEXT);"
+        "CREATE INDEX idx_city ON people (city);"
+        "CREATE TABLE orders (id INTEGER PRIMARY KEY, person_id INTEGER, total REAL);"
+    )
+    
+    join = "SELECT p.name FROM people AS p JOIN orders o ON o.person_id = p.id WHERE o.total > ? ORDER BY p.name"
+    result = explain(conn, join, [5])
+    assert result["full_scans"] == [{"table": "orders", "estimated_rows": None}]
+    assert explain(conn, "SELECT city FROM people ORDER BY city")["full_scans"] == []
+    assert explain(conn, "WITH r(x) AS (SELECT 1) SELECT x FROM r")["full_scans"] == []
+    
+    # Only filter, join and sort clauses count; literals are skipped
+    assert indexable_names(join) == {"o", "person_id", "p", "id", "total", "name"}
+    assert indexable_names("SELECT city FROM people WHERE name = 'city'") == {"name"}
+    
+    log = SlowQueryLog(threshold=0.5, size=2)
+    assert not log.is_slow(0.1) and log.is_slow(0.5)
+    for sql in ("a", "b", "c"):
+        log.record("db", {"sql": sql})
+    assert [entry["sql"] for entry in log.entries("db")] == ["c", "b"]
+
+
+def test_job_workers_share_the_load_pool(test_db_dir, monkeypatch):
+    """Test a job worker whose share of load_workers is one process loads tables itself"""
+    import sqlite3
+    from app.services import job_manager, parallel_load
+    
+    monkeypatch.setattr(job_manager, "_job_workers", 4)
+    monkeypatch.setattr(parallel_load.settings, "load_workers", 6)
+    assert job_manager.worker_share(6) == 1
+    assert job_manager.worker_share(16) == 4
+    
+    def no_pool():
+        raise AssertionError("a job worker with a share of one must not start a pool")
+    monkeypatch.setattr(parallel_load, "_get_pool", no_pool)
+    
+    sources = {}
+    for name, text in (("people", "id,name\n1,Ann\n2,Bo\n"), ("pets", "id,owner\n1,1\n")):
+        csv_path = test_db_dir / f"{name}.csv"
+        csv_path.write_text(text)
+        sources[name] = {"file_path": str(csv_path), "columns": text.split("\n")[0].split(",")}
+    db_path = test_db_dir / "shared.db"
+    
+    result = parallel_load.load_tables(
+        db_path,
+        "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT);\n"
+        "CREATE TABLE pets (id INTEGER PRIMARY KEY, owner INTEGER);",
+        sources,
+    )
+    
+    assert result["row_counts"] == {"people": 2, "pets": 1}
+    conn = sqlite3.connect(db_path)
+    try:
+        assert conn.execute("SELECT name FROM people ORDER BY id").fetchall() == [("Ann",), ("Bo",)]
+    finally:
+        conn.close()
+
+
+def test_shutdown_services_leaves_unused_services_uncreated(monkeypatch):
+    """Test shutdown stops existing services and never creates new ones"""
+    from unittest.mock import MagicMock
+    from app.api import dependencies
+    
+    query_service = MagicMock()
+    monkeypatch.setattr(dependencies, "_job_manager", None)
+    monkeypatch.setattr(dependencies, "_query_service", query_service)
+    
+    dependencies.shutdown_services()
+    
+    query_service.shutdown.assert_called_once()
+    assert dependencies._job_manager is None
+
+
+def _crash_worker(progress=None):
+    """Job function that kills its worker, like the OOM killer would"""
+    import os
+    os._exit(1)
+
+
+def _answer(progress=None):
+    return 42
+
+
+def test_job_manager_replaces_a_broken_pool(tmp_path):
+    """Test a worker crash fails its job and the next job gets a new pool"""
+    from app.services.job_manager import JobManager
+    manager = JobManager(jobs_dir=tmp_path, max_workers=1)
+    try:
+        crashed = manager.submit("crash", _crash_worker)
+        deadline = time.monotonic() + 60
+        while manager.get_job(crashed["job_id"])["status"] != "failed":
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        
+        job = manager.submit("answer", _answer)
+        deadline = time.monotonic() + 60
+        while manager.get_job(job["job_id"])["status"] != "completed":
+            assert time.monotonic() < deadline
+            time.sleep(0.05)
+        assert manager.get_job(job["job_id"])["result"] == 42
+    finally:
+        manager.shutdown()
+
+
+def test_job_manager_records_jobs_that_could_not_be_queued(tmp_path, monkeypatch):
+    """Test a failed submit marks the job failed and runs on_failure"""
+    from concurrent.futures import Future
+    from app.services.job_manager import JobManager
+    manager = JobManager(jobs_dir=tmp_path, max_workers=1)
+    
+    class ShutDownPool:
+        def submit(self, *args, **kwargs):
+            raise RuntimeError("cannot schedule new futures after shutdown")
+    monkeypatch.setattr(manager, "_get_executor", lambda: ShutDownPool())
+    failures = []
+    
+    with pytest.raises(RuntimeError):
+        manager.submit("answer", _answer, on_failure=failures.append)
+    
+    (job_path,) = tmp_path.glob("*.json")
+    assert manager.get_job(job_path.stem)["status"] == "failed"
+    assert len(failures) == 1
+    
+    # A failing cleanup callback still leaves a final record
+    def broken_cleanup(error):
+        raise OSError("reservation already gone")
+    future = Future()
+    future.set_exception(ValueError("bad csv"))
+    manager._finish(None, job_path, future, None, broken_cleanup)
+    job = manager.get_job(job_path.stem)
+    assert job["status"] == "failed"
+    assert "bad csv" in job["error"] and "reservation already gone" in job["error"]
+
+
+def test_load_pool_is_replaced_after_a_worker_crash(test_db_dir, monkeypatch):
+    """Test a pool broken by a crashed worker is not reused by later builds"""
+    import os
+    from concurrent.futures.process import BrokenProcessPool
+    from app.services import parallel_load
+    
+    monkeypatch.setattr(parallel_load.settings, "load_workers", 2)
+    csv_path = test_db_dir / "crash_people.csv"
+    csv_path.write_text("id,name\n1,Ann\n")
+    sources = {"people": {"file_path": str(csv_path), "columns": ["id", "name"]}}
+    schema = "CREATE TABLE people (id INTEGER PRIMARY KEY, name TEXT);"
+    
+    broken = parallel_load._get_pool()
+    try:
+        with pytest.raises(BrokenProcessPool):
+            broken.submit(os._exit, 1).result()
+        with pytest.raises(BrokenProcessPool):
+            parallel_load.load_tables(test_db_dir / "crash_first.db", schema, sources)
+        
+        result = parallel_load.load_tables(test_db_dir / "crash_second.db", schema, sources)
+        assert result["row_counts"] == {"people": 1}
+        assert parallel_load._pool is not broken
+    finally:
+        parallel_load.shutdown_pool()